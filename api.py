@@ -0,0 +1,577 @@
+"""
+Headless ASGI API for workout plan generation, parsing and export.
+
+Run with: uvicorn api:app --host 0.0.0.0 --port 8080
+(set WARM_POOL_SCHEDULER=1 on one or more replicas to fill the warm pool off-peak)
+
+Endpoints:
+    GET  /health            liveness and worker pool status
+    POST /v1/plans          generate a plan and wait for it
+    POST /v1/rosters        generate plans for several profiles, batched into shared model calls
+    POST /v1/edits          apply a free-text edit to a plan's days through a JSON Patch from the model
+    POST /v1/jobs           queue a generation job, returns 202 with a job id
+    GET  /v1/jobs/{job_id}  job status and result
+    GET  /v1/usage          today's (or ?day=YYYY-MM-DD) usage ledger across replicas
+    POST /v1/parse          validate a raw model response into days
+    POST /v1/export         render days as the JSON or text download, JSON with every program week
+"""
+import os
+import json
+import time
+import asyncio
+import logging
+import threading
+import traceback
+from concurrent.futures import ThreadPoolExecutor
+from functools import lru_cache
+from typing import Dict, List, Optional, Tuple
+from urllib.parse import parse_qs
+from models import WorkoutPlanGenerator
+from token_budget import BudgetExceededError
+from cancellation import CancelToken, GenerationCancelled, cancellation_scope
+from plan_parser import PlanValidationError, salvage_plan, validate_day, personalize_calories
+from periodization import build_program
+from warm_pool import WarmPoolScheduler
+from utils import create_workout_json_output, create_text_format
+from event_log import log_event
+from shared_state import (
+    create_job as create_job_record, update_job, get_job as get_job_record, get_usage_totals, claim_job,
+    renew_job_claim, release_job_claim, REPLICA_ID
+)
+from config import (
+    API_WORKERS, API_MAX_PENDING, API_MAX_BODY_BYTES, JOB_HEARTBEAT_INTERVAL, EDIT_MAX_INSTRUCTION_CHARS,
+    FITNESS_LEVELS, GOAL_OPTIONS, TRAINING_DAYS_OPTIONS, PROGRAM_WEEK_OPTIONS
+)
+
+# Profile schema: field name -> (expected type, default value), None default means required
+PROFILE_SCHEMA = {
+    'name': (str, ''),
+    'age': (int, None),
+    'gender': (str, None),
+    'weight': (float, None),
+    'height': (float, None),
+    'fitness_level': (str, None),
+    'goal': (str, None),
+    'training_days_per_week': (int, None),
+    'session_duration': (int, None),
+    'target_areas': (list, []),
+    'available_equipment': (list, []),
+    'workout_preferences': (list, []),
+    'health_limitations': (str, ''),
+    'exercises_to_avoid': (str, ''),
+    'additional_notes': (str, ''),
+    'generation_mode': (str, 'detailed'),
+}
+
+# Allowed values for enumerated profile fields
+PROFILE_CHOICES = {
+    'fitness_level': FITNESS_LEVELS,
+    'goal': GOAL_OPTIONS,
+    'training_days_per_week': TRAINING_DAYS_OPTIONS,
+    'generation_mode': ['detailed', 'catalog'],
+}
+
+EXPORT_FORMATS = {
+    'json': 'application/json; charset=utf-8',
+    'text': 'text/plain; charset=utf-8',
+}
+
+
+class RequestValidationError(ValueError):
+    """Raised when a request body does not match its schema"""
+
+    def __init__(self, errors: List[str]):
+        super().__init__("; ".join(errors))
+        self.errors = errors
+
+
+class HTTPError(Exception):
+    """An error response with a status code"""
+
+    def __init__(self, status: int, message: str, headers: Optional[List[Tuple[bytes, bytes]]] = None):
+        super().__init__(message)
+        self.status = status
+        self.message = message
+        self.headers = headers or []
+
+
+def _check_type(field: str, value, expected_type, errors: List[str]):
+    """Coerce a profile value to its schema type, recording an error when it cannot be"""
+    if expected_type is list:
+        if isinstance(value, str):
+            return [item.strip() for item in value.split(',') if item.strip()]
+        if isinstance(value, list) and all(isinstance(item, str) for item in value):
+            return value
+    elif expected_type in (int, float):
+        if not isinstance(value, bool) and isinstance(value, (int, float)):
+            return expected_type(value)
+    elif isinstance(value, str):
+        return value
+    errors.append(f"'{field}' must be of type {expected_type.__name__}")
+    return None
+
+
+def validate_profile(payload) -> Dict:
+    """Validate a profile against PROFILE_SCHEMA and build the form_data the generator expects"""
+    if not isinstance(payload, dict):
+        raise RequestValidationError(["'profile' must be a JSON object"])
+
+    errors = []
+    profile = {}
+    for field, (expected_type, default) in PROFILE_SCHEMA.items():
+        value = payload.get(field)
+        if value is None:
+            if default is None:
+                errors.append(f"'{field}' is required")
+            profile[field] = list(default) if isinstance(default, list) else default
+            continue
+        profile[field] = _check_type(field, value, expected_type, errors)
+
+    for field, choices in PROFILE_CHOICES.items():
+        if profile.get(field) is not None and profile[field] not in choices:
+            errors.append(f"'{field}' must be one of {choices}")
+
+    if errors:
+        raise RequestValidationError(errors)
+
+    profile['gender'] = profile['gender'].lower()
+    # Keep backward compatibility with the generator's original keys
+    profile['weekly_frequency'] = profile['training_days_per_week']
+    profile['duration_per_session'] = profile['session_duration']
+    return profile
+
+
+def validate_profiles(payload) -> List[Dict]:
+    """Validate a non-empty list of profiles, reporting errors with each profile's position"""
+    if not isinstance(payload, list) or not payload:
+        raise RequestValidationError(["'profiles' must be a non-empty list of profile objects"])
+
+    errors = []
+    profiles = []
+    for position, profile in enumerate(payload):
+        try:
+            profiles.append(validate_profile(profile))
+        except RequestValidationError as e:
+            errors.extend(f"profiles[{position}]: {error}" for error in e.errors)
+    if errors:
+        raise RequestValidationError(errors)
+    return profiles
+
+
+def validate_days(payload, weight_kg: Optional[float] = None, numbered: bool = False) -> List[Dict]:
+    """
+    Validate a plan's days with the model response parser and rebuild their display records.
+
+    Days are numbered by position unless numbered requires each to carry its 'day' number;
+    display titles are kept, and calories are set from weight_kg.
+    """
+    if not isinstance(payload, list) or not payload or not all(
+            isinstance(day, dict) and isinstance(day.get('exercises'), list) for day in payload):
+        raise RequestValidationError(["'days' must be a non-empty list of day objects with 'exercises'"])
+
+    errors = []
+    days_data = []
+    for position, day in enumerate(payload):
+        day_number = day.get('day')
+        if isinstance(day_number, bool) or not isinstance(day_number, int):
+            if numbered:
+                errors.append(f"days[{position}]: must carry its 'day' number")
+                continue
+            day_number = position + 1
+        try:
+            day_data = validate_day(day_number, dict(day, day_name=day.get('day_name') or day.get('title')))
+        except PlanValidationError as e:
+            errors.append(f"days[{position}]: {e}")
+            continue
+        if not day_data['exercises']:
+            errors.append(f"days[{position}]: no exercise has an 'exercise_name'")
+            continue
+        days_data.append(day_data)
+
+    if errors:
+        raise RequestValidationError(errors)
+    return personalize_calories(days_data, weight_kg)
+
+
+class WorkerPool:
+    """Bounded thread pool for blocking model calls, rejecting work once the queue is full"""
+
+    def __init__(self, max_workers: int = API_WORKERS, max_pending: int = API_MAX_PENDING):
+        self.max_workers = max_workers
+        self.max_pending = max_pending
+        self.pending = 0
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="plan-worker")
+        self._lock = threading.Lock()
+
+    def _acquire(self):
+        with self._lock:
+            if self.pending >= self.max_pending:
+                raise HTTPError(503, "Generation queue is full, retry shortly", [(b"retry-after", b"5")])
+            self.pending += 1
+
+    def _release(self, _=None):
+        with self._lock:
+            self.pending -= 1
+
+    def submit(self, fn, *args):
+        """Queue work without waiting for it"""
+        self._acquire()
+        future = self._executor.submit(fn, *args)
+        future.add_done_callback(self._release)
+        return future
+
+    async def run(self, fn, *args):
+        """Run work on the pool and await its result"""
+        return await asyncio.wrap_future(self.submit(fn, *args))
+
+
+@lru_cache(maxsize=None)
+def get_generator() -> WorkoutPlanGenerator:
+    """Shared generator for the process"""
+    return WorkoutPlanGenerator()
+
+
+def generate_plan(profile: Dict, token: Optional[CancelToken] = None) -> Dict:
+    """Generate and post-process a plan for a validated profile (runs on a worker thread)"""
+    start_time = time.perf_counter()
+    token = token or CancelToken()
+    # Requests cancelled while queued give their worker straight back
+    token.raise_if_cancelled()
+    with cancellation_scope(token):
+        _, days_data = get_generator().create_workout_plan(profile)
+    return {
+        'days': days_data,
+        'generation_time': round(time.perf_counter() - start_time, 3),
+    }
+
+
+def generate_roster(profiles: List[Dict], token: Optional[CancelToken] = None) -> Dict:
+    """Generate plans for several validated profiles, in roster calls where none is stored (runs on a worker thread)"""
+    start_time = time.perf_counter()
+    token = token or CancelToken()
+    token.raise_if_cancelled()
+    with cancellation_scope(token):
+        results = get_generator().create_roster_plans(profiles)
+    return {
+        'plans': [{'days': result['days'], 'source': result['source'], 'usage': result['usage']}
+                  for result in results],
+        'generation_time': round(time.perf_counter() - start_time, 3),
+    }
+
+
+def edit_plan(profile: Dict, days_data: List[Dict], instruction: str, token: Optional[CancelToken] = None) -> Dict:
+    """Apply an edit instruction to a validated plan (runs on a worker thread)"""
+    start_time = time.perf_counter()
+    token = token or CancelToken()
+    token.raise_if_cancelled()
+    with cancellation_scope(token):
+        edited_days, summary = get_generator().edit_workout_plan(profile, days_data, instruction)
+    return {
+        'days': edited_days,
+        'edit': summary,
+        'generation_time': round(time.perf_counter() - start_time, 3),
+    }
+
+
+class JobHeartbeat(threading.Thread):
+    """Renews this replica's claims on its queued and running jobs, so other replicas only resume dead ones"""
+
+    def __init__(self, interval: float = JOB_HEARTBEAT_INTERVAL):
+        super().__init__(name="job-heartbeat", daemon=True)
+        self.interval = interval
+        self.jobs = set()
+        self._lock = threading.Lock()
+
+    def hold(self, job_id: str):
+        with self._lock:
+            self.jobs.add(job_id)
+            if not self.is_alive():
+                self.start()
+
+    def release(self, job_id: str):
+        with self._lock:
+            self.jobs.discard(job_id)
+        release_job_claim(job_id)
+
+    def is_holding(self, job_id: str) -> bool:
+        with self._lock:
+            return job_id in self.jobs
+
+    def run(self):
+        while True:
+            time.sleep(self.interval)
+            with self._lock:
+                jobs = list(self.jobs)
+            for job_id in jobs:
+                if not renew_job_claim(job_id):
+                    log_event('job_claim_lost', job_id=job_id)
+
+
+def run_job(job_id: str, profile: Dict):
+    """Run a generation job and record its outcome"""
+    update_job(job_id, status='running', replica=REPLICA_ID, updated_at=time.time())
+    try:
+        result = generate_plan(profile)
+    except Exception as e:
+        update_job(job_id, status='failed', error=str(e), updated_at=time.time())
+    else:
+        update_job(job_id, status='succeeded', result=result, updated_at=time.time())
+    finally:
+        heartbeat.release(job_id)
+
+
+def submit_job(job_id: str, profile: Dict):
+    """Queue a job this replica has claimed, keeping the claim alive until the job finishes"""
+    heartbeat.hold(job_id)
+    try:
+        pool.submit(run_job, job_id, profile)
+    except HTTPError:
+        heartbeat.release(job_id)
+        update_job(job_id, status='rejected', updated_at=time.time())
+        raise
+
+
+pool = WorkerPool()
+heartbeat = JobHeartbeat()
+scheduler = WarmPoolScheduler(WorkoutPlanGenerator())
+
+
+async def _read_json(receive) -> Dict:
+    """Read and decode the request body, enforcing API_MAX_BODY_BYTES"""
+    body = bytearray()
+    more_body = True
+    while more_body:
+        message = await receive()
+        body.extend(message.get('body', b''))
+        if len(body) > API_MAX_BODY_BYTES:
+            raise HTTPError(413, "Request body too large")
+        more_body = message.get('more_body', False)
+    try:
+        payload = json.loads(body or b'{}')
+    except ValueError:
+        raise HTTPError(400, "Request body must be valid JSON")
+    if not isinstance(payload, dict):
+        raise HTTPError(400, "Request body must be a JSON object")
+    return payload
+
+
+async def _wait_for_disconnect(receive):
+    """Return once the client disconnects (call only after the body has been read)"""
+    while (await receive())['type'] != 'http.disconnect':
+        pass
+
+
+async def _send(send, status: int, body: bytes, content_type: str,
+                headers: Optional[List[Tuple[bytes, bytes]]] = None):
+    await send({
+        'type': 'http.response.start',
+        'status': status,
+        'headers': [(b"content-type", content_type.encode()),
+                    (b"content-length", str(len(body)).encode())] + (headers or []),
+    })
+    await send({'type': 'http.response.body', 'body': body})
+
+
+async def _send_json(send, status: int, payload, headers: Optional[List[Tuple[bytes, bytes]]] = None):
+    body = json.dumps(payload, ensure_ascii=False).encode()
+    await _send(send, status, body, 'application/json; charset=utf-8', headers)
+
+
+async def health(request: Dict) -> Tuple[int, Dict]:
+    generator = get_generator()
+    return 200, {
+        'status': 'ok',
+        'backend_ready': generator.is_ready,
+        'workers': pool.max_workers,
+        'pending': pool.pending,
+    }
+
+
+async def _generate_until_disconnect(request: Dict, fn, *args) -> Tuple[int, Dict]:
+    """Run a generation on the pool, cancelling it if the client disconnects first"""
+    token = CancelToken()
+    generation = asyncio.ensure_future(pool.run(fn, *args, token))
+    disconnect = asyncio.ensure_future(request['disconnected']())
+    await asyncio.wait({generation, disconnect}, return_when=asyncio.FIRST_COMPLETED)
+    if not generation.done():
+        # Nobody will read the plan: stop the model call and free its worker
+        token.cancel('client_disconnected')
+        generation.add_done_callback(lambda task: task.exception())
+        return 499, {'error': 'Client closed request'}
+    disconnect.cancel()
+    try:
+        return 200, generation.result()
+    except HTTPError:
+        raise
+    except GenerationCancelled as e:
+        raise HTTPError(499, str(e))
+    except BudgetExceededError as e:
+        raise HTTPError(429, str(e))
+    except Exception as e:
+        raise HTTPError(502, str(e))
+
+
+async def create_plan(request: Dict) -> Tuple[int, Dict]:
+    profile = validate_profile((await request['body']()).get('profile'))
+    return await _generate_until_disconnect(request, generate_plan, profile)
+
+
+async def create_roster(request: Dict) -> Tuple[int, Dict]:
+    profiles = validate_profiles((await request['body']()).get('profiles'))
+    return await _generate_until_disconnect(request, generate_roster, profiles)
+
+
+async def create_edit(request: Dict) -> Tuple[int, Dict]:
+    payload = await request['body']()
+    profile = validate_profile(payload.get('profile'))
+    days_data = validate_days(payload.get('days'), profile['weight'], numbered=True)
+    instruction = payload.get('instruction')
+    if not isinstance(instruction, str) or not instruction.strip() or len(instruction) > EDIT_MAX_INSTRUCTION_CHARS:
+        raise RequestValidationError([f"'instruction' must be a non-empty string of at most "
+                                      f"{EDIT_MAX_INSTRUCTION_CHARS} characters"])
+    return await _generate_until_disconnect(request, edit_plan, profile, days_data, instruction)
+
+
+async def create_job(request: Dict) -> Tuple[int, Dict]:
+    profile = validate_profile((await request['body']()).get('profile'))
+    job_id = create_job_record({'profile': profile, 'updated_at': time.time()})
+    claim_job(job_id)
+    submit_job(job_id, profile)
+    return 202, {'job_id': job_id, 'status': 'queued', 'status_url': f"/v1/jobs/{job_id}"}
+
+
+async def get_job(request: Dict, job_id: str) -> Tuple[int, Dict]:
+    job = get_job_record(job_id)
+    if job is None:
+        raise HTTPError(404, f"Unknown job '{job_id}'")
+    # Resume jobs left behind by a replica that stopped renewing its claim; only the poll that wins the claim does
+    if job['status'] in ('queued', 'running') and not heartbeat.is_holding(job_id) and claim_job(job_id):
+        # The job may have finished and released its claim since it was read
+        job = get_job_record(job_id)
+        if job['status'] in ('queued', 'running'):
+            update_job(job_id, status='queued', replica=REPLICA_ID, updated_at=time.time())
+            submit_job(job_id, job['profile'])
+            job = get_job_record(job_id)
+        else:
+            release_job_claim(job_id)
+    job.pop('profile', None)
+    return 200, job
+
+
+async def usage(request: Dict) -> Tuple[int, Dict]:
+    day = parse_qs(request['scope']['query_string'].decode()).get('day', [None])[0]
+    return 200, {'day': day, 'totals': get_usage_totals(day)}
+
+
+async def parse(request: Dict) -> Tuple[int, Dict]:
+    payload = await request['body']()
+    plan = payload.get('plan')
+    if isinstance(plan, (dict, list)):
+        plan = json.dumps(plan)
+    if not isinstance(plan, str):
+        raise RequestValidationError(["'plan' must be the model response as a string or JSON object"])
+
+    weight = payload.get('weight')
+    if weight is not None and (isinstance(weight, bool) or not isinstance(weight, (int, float))):
+        raise RequestValidationError(["'weight' must be a number"])
+    expected_days = payload.get('expected_days') or []
+    if not isinstance(expected_days, int) and not isinstance(expected_days, list):
+        raise RequestValidationError(["'expected_days' must be a day count or list of day numbers"])
+    if isinstance(expected_days, int):
+        expected_days = range(1, expected_days + 1)
+
+    days_data, missing_days = salvage_plan(plan, expected_days, weight)
+    if not days_data:
+        raise HTTPError(422, "No valid days could be recovered from the plan")
+    return 200, {'days': days_data, 'missing_days': missing_days}
+
+
+async def export(request: Dict) -> Tuple[int, bytes, str]:
+    payload = await request['body']()
+    export_format = payload.get('format', 'json')
+    if export_format not in EXPORT_FORMATS:
+        raise RequestValidationError([f"'format' must be one of {list(EXPORT_FORMATS)}"])
+    num_weeks = payload.get('weeks', 1)
+    if num_weeks not in PROGRAM_WEEK_OPTIONS or isinstance(num_weeks, bool):
+        raise RequestValidationError([f"'weeks' must be one of {PROGRAM_WEEK_OPTIONS}"])
+    profile = validate_profile(payload.get('profile'))
+    days_data = validate_days(payload.get('days'), profile['weight'])
+
+    if export_format == 'json':
+        program = build_program(days_data, profile['fitness_level'], num_weeks, profile['weight'],
+                                profile['session_duration']) if num_weeks > 1 else None
+        content = create_workout_json_output(profile, days_data, program)
+    else:
+        content = create_text_format(days_data, profile)
+    return 200, content.encode('utf-8'), EXPORT_FORMATS[export_format]
+
+
+# Routes: (method, first path segments) -> handler, a trailing None matches one path parameter
+ROUTES = {
+    ('GET', ('health',)): health,
+    ('POST', ('v1', 'plans')): create_plan,
+    ('POST', ('v1', 'rosters')): create_roster,
+    ('POST', ('v1', 'edits')): create_edit,
+    ('POST', ('v1', 'jobs')): create_job,
+    ('GET', ('v1', 'jobs', None)): get_job,
+    ('GET', ('v1', 'usage')): usage,
+    ('POST', ('v1', 'parse')): parse,
+    ('POST', ('v1', 'export')): export,
+}
+
+
+def resolve_route(method: str, path: str):
+    """Find the handler and path parameters for a request, raising 404/405 when there is none"""
+    segments = tuple(segment for segment in path.split('/') if segment)
+    allowed = set()
+    for (route_method, pattern), handler in ROUTES.items():
+        if len(pattern) != len(segments):
+            continue
+        if all(part is None or part == segment for part, segment in zip(pattern, segments)):
+            if route_method == method:
+                params = [segment for part, segment in zip(pattern, segments) if part is None]
+                return handler, params
+            allowed.add(route_method)
+    if allowed:
+        raise HTTPError(405, "Method not allowed", [(b"allow", ", ".join(sorted(allowed)).encode())])
+    raise HTTPError(404, "Not found")
+
+
+async def app(scope, receive, send):
+    """ASGI entry point"""
+    if scope['type'] == 'lifespan':
+        while True:
+            message = await receive()
+            if message['type'] == 'lifespan.startup':
+                if os.getenv('WARM_POOL_SCHEDULER', '').lower() in ('1', 'true', 'yes'):
+                    scheduler.start()
+                await send({'type': 'lifespan.startup.complete'})
+            elif message['type'] == 'lifespan.shutdown':
+                scheduler.stop()
+                pool._executor.shutdown(wait=False, cancel_futures=True)
+                await send({'type': 'lifespan.shutdown.complete'})
+                return
+    if scope['type'] != 'http':
+        return
+
+    request = {'scope': scope, 'body': lambda: _read_json(receive), 'disconnected': lambda: _wait_for_disconnect(receive)}
+    try:
+        handler, params = resolve_route(scope['method'], scope['path'])
+        response = await handler(request, *params)
+        if len(response) == 3:
+            await _send(send, *response)
+        else:
+            await _send_json(send, *response)
+    except RequestValidationError as e:
+        await _send_json(send, 422, {'error': 'Invalid request', 'details': e.errors})
+    except HTTPError as e:
+        await _send_json(send, e.status, {'error': e.message}, e.headers)
+    except Exception as e:
+        log_event('request_failed', logging.ERROR, method=scope['method'], path=scope['path'],
+                  error=f"{type(e).__name__}: {e}", traceback=traceback.format_exc())
+        await _send_json(send, 500, {'error': 'Internal server error'})
+
+
+if __name__ == "__main__":
+    import uvicorn
+    uvicorn.run("api:app", host="0.0.0.0", port=8080)
@@ -0,0 +1,269 @@
+import os
+import json
+import time
+import hashlib
+import threading
+from abc import ABC, abstractmethod
+from typing import Dict, List, Optional
+from cancellation import CancelToken, GenerationCancelled
+from config import DEFAULT_BACKEND, DEFAULT_MODEL, LOCAL_BACKEND_DEFAULTS, DEFAULT_CASSETTE_MODE
+
+
+def _env_flag(name: str) -> bool:
+    """Read a boolean flag from the environment, falling back to LOCAL_BACKEND_DEFAULTS"""
+    return os.getenv(name, LOCAL_BACKEND_DEFAULTS[name]).strip().lower() in ('1', 'true', 'yes', 'on')
+
+
+def estimate_tokens(text: str) -> int:
+    """Rough token count for backends that do not report usage (~4 characters per token)"""
+    return max(1, len(text) // 4)
+
+
+class GenerationBackend(ABC):
+    """
+    Chat completion backend behind WorkoutPlanGenerator.
+
+    Subclasses implement complete(). Capabilities describe what the server supports:
+    json_mode (response_format json_object), streaming, usage_reporting (token counts in responses).
+    A cancel_token option makes streaming backends stop mid-response once it is cancelled.
+    """
+
+    name = "base"
+    requires_api_key = False
+
+    def __init__(self, capabilities: Optional[Dict[str, bool]] = None):
+        self.capabilities = {
+            'json_mode': True,
+            'streaming': True,
+            'usage_reporting': True,
+            **(capabilities or {})
+        }
+
+    def resolve_model(self, model: str) -> str:
+        """Map a MODEL_REGISTRY key to the registry key this backend will actually serve it with"""
+        return model
+
+    @abstractmethod
+    def complete(self, messages: List[Dict], model: str = DEFAULT_MODEL, **options) -> Dict:
+        """
+        Run one chat completion.
+
+        Returns:
+            Dict with 'content', 'model' (MODEL_REGISTRY key), 'input_tokens', 'output_tokens'
+            and 'finish_reason' ('length' when cut off at max_tokens)
+        """
+
+
+class OpenAIBackend(GenerationBackend):
+    """OpenAI API, or any OpenAI-compatible server when base_url is given"""
+
+    name = "openai"
+    requires_api_key = True
+
+    def __init__(self, api_key: Optional[str], base_url: Optional[str] = None,
+                 capabilities: Optional[Dict[str, bool]] = None):
+        super().__init__(capabilities)
+        self.api_key = api_key
+        self.base_url = base_url
+        self._client = None
+
+    @property
+    def client(self):
+        """OpenAI client, created on first use so the SDK import stays off the startup path"""
+        if self._client is None:
+            import openai
+            self._client = openai.OpenAI(api_key=self.api_key, base_url=self.base_url)
+        return self._client
+
+    def _request_options(self, messages: List[Dict], server_model: str, options: Dict) -> Dict:
+        """Build create() arguments, dropping features the server does not support"""
+        request = {'model': server_model, 'messages': messages}
+        if options.get('json_mode', True) and self.capabilities['json_mode']:
+            request['response_format'] = {"type": "json_object"}
+        if options.get('max_tokens'):
+            request['max_tokens'] = options['max_tokens']
+        return request
+
+    def _server_model(self, model: str) -> str:
+        """Model name sent to the server"""
+        return model
+
+    def complete(self, messages: List[Dict], model: str = DEFAULT_MODEL, **options) -> Dict:
+        cancel_token = options.get('cancel_token')
+        if cancel_token is not None and self.capabilities['streaming']:
+            return self._complete_streaming(messages, model, options, cancel_token)
+        
+        response = self.client.chat.completions.create(
+            **self._request_options(messages, self._server_model(model), options)
+        )
+        choice = response.choices[0]
+        content = choice.message.content or ''
+
+        usage = getattr(response, 'usage', None)
+        if self.capabilities['usage_reporting'] and usage is not None:
+            input_tokens, output_tokens = usage.prompt_tokens, usage.completion_tokens
+        else:
+            input_tokens = sum(estimate_tokens(message['content']) for message in messages)
+            output_tokens = estimate_tokens(content)
+
+        return {
+            'content': content,
+            'model': self.resolve_model(model),
+            'input_tokens': input_tokens,
+            'output_tokens': output_tokens,
+            'finish_reason': getattr(choice, 'finish_reason', None)
+        }
+
+    def _complete_streaming(self, messages: List[Dict], model: str, options: Dict, cancel_token: CancelToken) -> Dict:
+        """Stream the response, closing the connection as soon as the token is cancelled"""
+        request = self._request_options(messages, self._server_model(model), options)
+        request['stream'] = True
+        if self.capabilities['usage_reporting']:
+            request['stream_options'] = {'include_usage': True}
+        # The prompt is billed once the server has started on it, usage only arrives with the last chunk
+        input_tokens = sum(estimate_tokens(message['content']) for message in messages)
+        parts, usage, finish_reason = [], None, None
+
+        stream = self.client.chat.completions.create(**request)
+        try:
+            for chunk in stream:
+                if cancel_token.is_cancelled():
+                    # Closing the stream stops generation, and billing, on the server
+                    raise GenerationCancelled(cancel_token.reason, self.resolve_model(model),
+                                              input_tokens, estimate_tokens(''.join(parts)))
+                if getattr(chunk, 'usage', None) is not None:
+                    usage = chunk.usage
+                if chunk.choices:
+                    parts.append(chunk.choices[0].delta.content or '')
+                    finish_reason = chunk.choices[0].finish_reason or finish_reason
+        finally:
+            stream.close()
+
+        content = ''.join(parts)
+        if usage is not None:
+            input_tokens, output_tokens = usage.prompt_tokens, usage.completion_tokens
+        else:
+            output_tokens = estimate_tokens(content)
+        return {
+            'content': content,
+            'model': self.resolve_model(model),
+            'input_tokens': input_tokens,
+            'output_tokens': output_tokens,
+            'finish_reason': finish_reason
+        }
+
+
+class LocalOpenAICompatibleBackend(OpenAIBackend):
+    """Self-hosted OpenAI-compatible inference server serving a single model at no per-token cost"""
+
+    name = "local"
+    requires_api_key = False
+
+    def __init__(self, base_url: str, model_name: str, api_key: Optional[str] = None,
+                 capabilities: Optional[Dict[str, bool]] = None):
+        # The OpenAI SDK requires a non-empty key even when the server ignores it
+        super().__init__(api_key or "not-needed", base_url, capabilities)
+        self.model_name = model_name
+
+    def resolve_model(self, model: str) -> str:
+        return "local"
+
+    def _server_model(self, model: str) -> str:
+        return self.model_name
+
+
+class CassetteMissError(LookupError):
+    """A replayed request was never recorded in the cassette"""
+
+
+def request_fingerprint(messages: List[Dict], model: str) -> str:
+    """Key of a completion request in a cassette: the exact messages and requested model"""
+    encoded = json.dumps({'messages': messages, 'model': model}, sort_keys=True).encode('utf-8')
+    return hashlib.sha256(encoded).hexdigest()[:32]
+
+
+class CassetteBackend(GenerationBackend):
+    """
+    Records another backend's completions to a cassette file, or replays them without calling it.
+
+    A cassette is JSON lines of {'fingerprint', 'request', 'response', 'latency'}. Replay serves each
+    request by fingerprint, repeated requests in recorded order, and raises CassetteMissError for
+    requests that were never recorded. Results carry the recorded 'latency' in seconds in both modes.
+    """
+
+    name = "cassette"
+
+    def __init__(self, path: str, mode: str = DEFAULT_CASSETTE_MODE, backend: Optional[GenerationBackend] = None):
+        if mode not in ('record', 'replay'):
+            raise ValueError(f"Unknown cassette mode '{mode}', expected 'record' or 'replay'")
+        if mode == 'record' and backend is None:
+            raise ValueError("Recording a cassette needs a backend to record")
+        super().__init__(backend.capabilities if backend is not None and mode == 'record' else None)
+        self.path = path
+        self.mode = mode
+        self.backend = backend
+        self.requires_api_key = mode == 'record' and backend.requires_api_key
+        self._lock = threading.Lock()
+        self._recorded = {}
+        self._played = {}
+        if mode == 'replay':
+            with open(path, encoding='utf-8') as cassette:
+                for line in cassette:
+                    if line.strip():
+                        entry = json.loads(line)
+                        self._recorded.setdefault(entry['fingerprint'], []).append(entry)
+
+    def resolve_model(self, model: str) -> str:
+        return self.backend.resolve_model(model) if self.backend is not None else model
+
+    def complete(self, messages: List[Dict], model: str = DEFAULT_MODEL, **options) -> Dict:
+        fingerprint = request_fingerprint(messages, model)
+        if self.mode == 'replay':
+            with self._lock:
+                entries = self._recorded.get(fingerprint)
+                if not entries:
+                    raise CassetteMissError(f"Request {fingerprint} is not in cassette {self.path}")
+                played = self._played.get(fingerprint, 0)
+                self._played[fingerprint] = played + 1
+            entry = entries[played % len(entries)]
+            return dict(entry['response'], latency=entry['latency'])
+
+        start_time = time.perf_counter()
+        result = self.backend.complete(messages, model, **options)
+        latency = round(time.perf_counter() - start_time, 4)
+        entry = {
+            'fingerprint': fingerprint,
+            'request': {'messages': messages, 'model': model, 'max_tokens': options.get('max_tokens')},
+            'response': result,
+            'latency': latency,
+        }
+        with self._lock, open(self.path, 'a', encoding='utf-8') as cassette:
+            cassette.write(json.dumps(entry, ensure_ascii=False) + '\n')
+        return dict(result, latency=latency)
+
+
+def create_backend(api_key: Optional[str] = None) -> GenerationBackend:
+    """Build the backend selected by GENERATION_BACKEND, behind a cassette when GENERATION_CASSETTE is set"""
+    backend = _create_model_backend(api_key)
+    cassette_path = os.getenv('GENERATION_CASSETTE')
+    if cassette_path:
+        return CassetteBackend(cassette_path, os.getenv('GENERATION_CASSETTE_MODE', DEFAULT_CASSETTE_MODE), backend)
+    return backend
+
+
+def _create_model_backend(api_key: Optional[str] = None) -> GenerationBackend:
+    backend_name = os.getenv('GENERATION_BACKEND', DEFAULT_BACKEND).strip().lower()
+    if backend_name == "local":
+        return LocalOpenAICompatibleBackend(
+            base_url=os.getenv('LOCAL_LLM_BASE_URL', LOCAL_BACKEND_DEFAULTS['LOCAL_LLM_BASE_URL']),
+            model_name=os.getenv('LOCAL_LLM_MODEL', LOCAL_BACKEND_DEFAULTS['LOCAL_LLM_MODEL']),
+            api_key=os.getenv('LOCAL_LLM_API_KEY', LOCAL_BACKEND_DEFAULTS['LOCAL_LLM_API_KEY']) or None,
+            capabilities={
+                'json_mode': _env_flag('LOCAL_LLM_JSON_MODE'),
+                'streaming': _env_flag('LOCAL_LLM_STREAMING'),
+                'usage_reporting': _env_flag('LOCAL_LLM_USAGE_REPORTING')
+            }
+        )
+    if backend_name != "openai":
+        raise ValueError(f"Unknown GENERATION_BACKEND '{backend_name}', expected 'openai' or 'local'")
+    return OpenAIBackend(api_key=api_key)
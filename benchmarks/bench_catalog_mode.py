@@ -0,0 +1,89 @@
+"""Compare prompt/response size and cost of detailed vs catalog-ID generation for the same plan.
+
+Run from the repository root:
+    python benchmarks/bench_catalog_mode.py [--days 5] [--exercises 8]
+
+Token counts use tiktoken when installed, otherwise ~4 characters per token.
+"""
+import os
+import sys
+import json
+import time
+import argparse
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault("OPENAI_API_KEY", "sk-benchmark")
+
+from models import WorkoutPlanGenerator
+from plan_parser import parse_plan
+from exercise_library import filter_catalog, expand_catalog_exercise
+from utils import calculate_token_costs
+
+USER_DATA = {
+    'name': 'Benchmark', 'age': 30, 'gender': 'female', 'weight': 65.0, 'height': 168.0,
+    'fitness_level': 'Intermediate', 'goal': 'General Fitness', 'training_days_per_week': 5,
+    'session_duration': 60, 'target_areas': ['Legs', 'Core'], 'available_equipment': ['Dumbbells', 'Resistance Bands'],
+    'workout_preferences': ['Strength', 'HIIT/Circuit'], 'health_limitations': '', 'exercises_to_avoid': 'burpees',
+    'additional_notes': '', 'weekly_frequency': 5, 'duration_per_session': 60
+}
+
+
+def count_tokens(text: str) -> int:
+    """Count tokens with the GPT-4o encoding when available"""
+    try:
+        import tiktoken
+        return len(tiktoken.get_encoding("o200k_base").encode(text))
+    except ImportError:
+        return len(text) // 4
+
+
+def build_responses(num_days: int, num_exercises: int):
+    """Build the same plan as a detailed response and as a catalog-ID response"""
+    entries = filter_catalog(USER_DATA)
+    detailed, compact = {}, {}
+    for day in range(1, num_days + 1):
+        references = [
+            [entries[(day * num_exercises + i) % len(entries)]['id'], 3, "10-12", "60s"]
+            for i in range(num_exercises)
+        ]
+        header = {"day_name": f"Day {day}", "workout_type": "Strength Training", "workout_duration": 60}
+        compact[f"day_{day}"] = dict(header, exercises=references)
+        detailed[f"day_{day}"] = dict(header, exercises=[
+            dict(expand_catalog_exercise(reference), weight="Moderate", speed_level="Moderate",
+                 superset_indicator="None")
+            for reference in references
+        ])
+    return json.dumps({"workout_plan": detailed}, indent=2), json.dumps({"workout_plan": compact})
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--days", type=int, default=5)
+    parser.add_argument("--exercises", type=int, default=8)
+    args = parser.parse_args()
+
+    user_data = dict(USER_DATA, weekly_frequency=args.days, training_days_per_week=args.days)
+    generator = WorkoutPlanGenerator()
+    detailed_response, compact_response = build_responses(args.days, args.exercises)
+
+    rows = []
+    for mode, prompt, response in (
+        ("detailed", generator.create_prompt(user_data), detailed_response),
+        ("catalog", generator.create_catalog_prompt(user_data), compact_response),
+    ):
+        start = time.perf_counter()
+        days_data = parse_plan(response, user_data['weight'])
+        parse_ms = (time.perf_counter() - start) * 1000
+        input_tokens, output_tokens = count_tokens(prompt), count_tokens(response)
+        rows.append((mode, input_tokens, output_tokens,
+                     calculate_token_costs(input_tokens, output_tokens)['total_cost'],
+                     sum(len(day['exercises']) for day in days_data), parse_ms))
+
+    print(f"{'mode':<10}{'input tok':>10}{'output tok':>12}{'cost $':>10}{'exercises':>11}{'parse ms':>10}")
+    for mode, input_tokens, output_tokens, cost, exercises, parse_ms in rows:
+        print(f"{mode:<10}{input_tokens:>10}{output_tokens:>12}{cost:>10.4f}{exercises:>11}{parse_ms:>10.2f}")
+    print(f"Output tokens reduced {rows[0][2] / rows[1][2]:.1f}x; generation latency scales with output tokens.")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,272 @@
+"""Benchmark decode + validate of large workout plans against the baseline parse path.
+
+Both paths get the user's weight as an argument, so neither pays for session_state
+lookups. The validated parse is timed with the MET lookup cache cleared before every
+call (a plan's first parse) and warm (the same exercises parsed again).
+
+Run from the repository root:
+    python benchmarks/bench_parse.py [--days 14] [--exercises 25] [--repeat 200]
+"""
+import os
+import re
+import sys
+import json
+import time
+import argparse
+import streamlit as st
+from typing import Dict, List
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from plan_parser import parse_plan, orjson
+from utils import get_met_value
+from config import EXERCISE_MET_VALUES
+
+WEIGHT_KG = 75.0
+
+
+def build_plan(num_days: int, num_exercises: int) -> str:
+    """Build a synthetic model response with the prompt's JSON structure"""
+    plan = {}
+    for day in range(1, num_days + 1):
+        plan[f"day_{day}"] = {
+            "day_name": f"Day {day}",
+            "workout_type": "Strength Training",
+            "workout_duration": 60,
+            "exercises": [
+                {
+                    "exercise_name": f"Exercise {day}-{i}",
+                    "exercise_type": "Compound",
+                    "equipment_required": "Dumbbells",
+                    "target_muscle_group": "Chest, Triceps",
+                    "total_sets": 3,
+                    "reps": "8-12",
+                    "tempo": "3-1-2",
+                    "rest_time": "60s",
+                    "weight": "Moderate",
+                    "speed_level": "Moderate",
+                    "breathing_pattern": "Exhale on exertion",
+                    "superset_indicator": "None"
+                }
+                for i in range(num_exercises)
+            ]
+        }
+    return json.dumps({"workout_plan": plan})
+
+
+# Baseline parse path, copied verbatim (WorkoutPlanGenerator.parse_workout_plan and its utils
+# helpers, before the validated decode and the MET lookup cache) so the comparison is like for like;
+# only its read of the weight from st.session_state is replaced by the weight_kg argument
+
+def legacy_calculate_calories_burned(exercise_name: str, weight_kg: float, duration_minutes: float, 
+                                    exercise_type: str = "") -> float:
+    """
+    Calculate calories burned for an exercise using MET values.
+    
+    Formula: Calories = METs x 3.5 x Weight(kg) / 200 x Duration(minutes)
+    
+    Args:
+        exercise_name: Name of the exercise
+        weight_kg: User's weight in kilograms
+        duration_minutes: Duration of exercise in minutes
+        exercise_type: Type of exercise (optional, helps with classification)
+    
+    Returns:
+        Estimated calories burned (rounded to 1 decimal)
+    """
+    if not weight_kg or weight_kg <= 0:
+        return 0.0
+    
+    # Convert exercise name to lowercase for matching
+    exercise_lower = exercise_name.lower()
+    
+    # Try to find matching MET value
+    met_value = EXERCISE_MET_VALUES.get("default", 5.0)
+    
+    # Check for exact or partial matches
+    for key, value in EXERCISE_MET_VALUES.items():
+        if key in exercise_lower or exercise_lower in key:
+            met_value = value
+            break
+    
+    # Adjust based on exercise type if no match found
+    if met_value == EXERCISE_MET_VALUES["default"]:
+        exercise_type_lower = exercise_type.lower()
+        if "cardio" in exercise_type_lower or "hiit" in exercise_type_lower:
+            met_value = 8.0
+        elif "strength" in exercise_type_lower or "compound" in exercise_type_lower:
+            met_value = 6.0
+        elif "warm" in exercise_type_lower:
+            met_value = 3.0
+        elif "cool" in exercise_type_lower or "flexibility" in exercise_type_lower:
+            met_value = 2.5
+    
+    # Calculate calories: METs x 3.5 x Weight(kg) / 200 x Duration(minutes)
+    calories = met_value * 3.5 * weight_kg / 200 * duration_minutes
+    
+    return round(calories, 1)
+
+
+def legacy_estimate_exercise_duration(total_sets: int, reps: str, rest_time: str) -> float:
+    """
+    Estimate exercise duration in minutes based on sets, reps, and rest time.
+    
+    Args:
+        total_sets: Number of sets
+        reps: Rep count (can be a number or range like "10-12")
+        rest_time: Rest time between sets (e.g., "60s", "2min")
+    
+    Returns:
+        Estimated duration in minutes
+    """
+    # Parse reps - take average if it's a range
+    try:
+        if '-' in str(reps):
+            rep_parts = re.findall(r'\d+', str(reps))
+            avg_reps = sum(int(r) for r in rep_parts) / len(rep_parts) if rep_parts else 10
+        else:
+            avg_reps = float(re.findall(r'\d+', str(reps))[0]) if re.findall(r'\d+', str(reps)) else 10
+    except:
+        avg_reps = 10
+    
+    # Estimate time per rep (3 seconds average)
+    time_per_set = (avg_reps * 3) / 60  # Convert to minutes
+    
+    # Parse rest time
+    rest_minutes = 0
+    try:
+        rest_str = str(rest_time).lower()
+        if 'min' in rest_str:
+            rest_minutes = float(re.findall(r'\d+', rest_str)[0]) if re.findall(r'\d+', rest_str) else 1
+        elif 's' in rest_str:
+            rest_seconds = float(re.findall(r'\d+', rest_str)[0]) if re.findall(r'\d+', rest_str) else 60
+            rest_minutes = rest_seconds / 60
+        else:
+            rest_minutes = 1  # Default 1 minute
+    except:
+        rest_minutes = 1
+    
+    # Total duration: (time per set + rest) * number of sets
+    total_duration = (time_per_set + rest_minutes) * total_sets
+    
+    return round(total_duration, 2)
+
+
+def legacy_parse(workout_plan_json: str, weight_kg: float) -> List[Dict]:
+    """Parse the JSON workout plan into structured daily workout data"""
+    try:
+        # Parse JSON response
+        workout_data = json.loads(workout_plan_json)
+        
+        # Extract workout plan data
+        if "workout_plan" in workout_data:
+            plan_data = workout_data["workout_plan"]
+        else:
+            plan_data = workout_data
+        
+        days_data = []
+        
+        # Process each day
+        for day_key in sorted(plan_data.keys()):
+            day_info = plan_data[day_key]
+            
+            # Extract day number from key
+            day_number = int(re.findall(r'\d+', day_key)[0]) if re.findall(r'\d+', day_key) else len(days_data) + 1
+            
+            day_data = {
+                'day': day_number,
+                'title': day_info.get('day_name', f'Day {day_number}'),
+                'workout_type': day_info.get('workout_type', 'Workout'),
+                'workout_duration': day_info.get('workout_duration', 0),
+                'exercises': []
+            }
+            
+            # Process exercises for this day
+            # Inside the exercise loop in parse_workout_plan method
+            for exercise in day_info.get('exercises', []):
+                # Calculate estimated duration for this exercise
+                est_duration = legacy_estimate_exercise_duration(
+                    exercise.get('total_sets', 1),
+                    exercise.get('reps', '10'),
+                    exercise.get('rest_time', '60s')
+                )
+                
+                # Calculate calories burned (if user weight is available)
+                calories_burned = 0.0
+                if weight_kg:
+                    calories_burned = legacy_calculate_calories_burned(
+                        exercise.get('exercise_name', ''),
+                        weight_kg,
+                        est_duration,
+                        exercise.get('exercise_type', '')
+                    )
+                
+                exercise_data = {
+                    'exercise_name': exercise.get('exercise_name', ''),
+                    'exercise_type': exercise.get('exercise_type', ''),
+                    'equipment_required': exercise.get('equipment_required', ''),
+                    'target_muscle_group': exercise.get('target_muscle_group', ''),
+                    'total_sets': exercise.get('total_sets', 1),
+                    'reps': exercise.get('reps', ''),
+                    'tempo': exercise.get('tempo', ''),
+                    'rest_time': exercise.get('rest_time', ''),
+                    'weight': exercise.get('weight', ''),
+                    'speed_level': exercise.get('speed_level', ''),
+                    'breathing_pattern': exercise.get('breathing_pattern', ''),
+                    'superset_indicator': exercise.get('superset_indicator', 'None'),
+                    'estimated_duration': est_duration,
+                    'calories_burned': calories_burned
+                }
+
+                
+                # Only add exercise if it has required data
+                if exercise_data['exercise_name']:
+                    day_data['exercises'].append(exercise_data)
+            
+            # Only add day if it has exercises
+            if day_data['exercises']:
+                days_data.append(day_data)
+        
+        return days_data
+        
+    except json.JSONDecodeError as e:
+        st.error(f"Error parsing JSON response: {str(e)}")
+        return []
+    except Exception as e:
+        st.error(f"Error processing workout plan: {str(e)}")
+        return []
+
+
+def time_it(func, payload: str, repeat: int, cold_cache: bool = False) -> float:
+    """Return mean milliseconds per call, optionally clearing the MET lookup cache before each one"""
+    elapsed = 0.0
+    for _ in range(repeat):
+        if cold_cache:
+            get_met_value.cache_clear()
+        start = time.perf_counter()
+        func(payload, WEIGHT_KG)
+        elapsed += time.perf_counter() - start
+    return elapsed * 1000 / repeat
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--days", type=int, default=14)
+    parser.add_argument("--exercises", type=int, default=25)
+    parser.add_argument("--repeat", type=int, default=200)
+    args = parser.parse_args()
+
+    payload = build_plan(args.days, args.exercises)
+    legacy_ms = time_it(legacy_parse, payload, args.repeat)
+    cold_ms = time_it(parse_plan, payload, args.repeat, cold_cache=True)
+    warm_ms = time_it(parse_plan, payload, args.repeat)
+
+    print(f"Plan: {args.days} days x {args.exercises} exercises ({len(payload) / 1024:.1f} KiB)")
+    print(f"Decoder: {'orjson' if orjson else 'json (stdlib)'}")
+    print(f"Baseline parse:               {legacy_ms:8.3f} ms/plan")
+    print(f"Validated parse (cold cache): {cold_ms:8.3f} ms/plan ({legacy_ms / cold_ms:.2f}x)")
+    print(f"Validated parse (warm cache): {warm_ms:8.3f} ms/plan ({legacy_ms / warm_ms:.2f}x)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,141 @@
+"""Report latency saved versus plan fit of nearest-neighbour plan reuse on recorded traffic.
+
+Replays profiles (one form_data JSON object per line, as recorded for
+canonical_profile.py) in order through an empty plan index for each similarity
+threshold. Misses are "generated" with the mock server's canned plan and indexed;
+neighbours above the threshold are adapted locally. Each reuse saves the model
+latency minus the adaptation time, and its plan fit is the share of exercises kept.
+
+Run from the repository root:
+    python benchmarks/bench_plan_reuse.py [traffic.jsonl] [--synthetic 500] [--thresholds 0.8,0.9,0.95]
+                                          [--llm-latency 20]
+"""
+import os
+import sys
+import json
+import time
+import random
+import argparse
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+os.environ.setdefault("OPENAI_API_KEY", "sk-benchmark")
+
+from models import WorkoutPlanGenerator
+from plan_parser import parse_plan
+from duration_fit import fit_plan_durations
+from exercise_library import substitute_exercises
+from canonical_profile import canonicalize_profile, profile_cache_key
+from plan_index import PlanIndex, find_similar_plan
+from shared_state import cache_plan
+from mock_llm_server import build_plan
+from config import (
+    FITNESS_LEVELS, GOAL_OPTIONS, TRAINING_DAYS_OPTIONS, DURATION_OPTIONS, TARGET_AREA_OPTIONS,
+    EQUIPMENT_OPTIONS, PREFERENCE_OPTIONS, GENDER_OPTIONS
+)
+
+
+def synthetic_profiles(count: int, seed: int):
+    """Profiles skewed towards popular answers, so that near-duplicates occur as in real traffic"""
+    rng = random.Random(seed)
+    for number in range(count):
+        training_days = rng.choice(TRAINING_DAYS_OPTIONS[:3])
+        session_duration = rng.choice(DURATION_OPTIONS[:3])
+        yield {
+            'name': f'User {number}', 'age': rng.randint(18, 65), 'gender': rng.choice(GENDER_OPTIONS[:2]),
+            'weight': round(rng.uniform(50, 110), 1), 'height': round(rng.uniform(155, 195), 1),
+            'fitness_level': rng.choice(FITNESS_LEVELS), 'goal': rng.choice(GOAL_OPTIONS[:3]),
+            'training_days_per_week': training_days, 'session_duration': session_duration,
+            'weekly_frequency': training_days, 'duration_per_session': session_duration,
+            'target_areas': rng.sample(TARGET_AREA_OPTIONS, rng.choice([0, 0, 1, 2])),
+            'available_equipment': rng.sample(EQUIPMENT_OPTIONS[:4], rng.choice([1, 2, 2, 3])),
+            'workout_preferences': rng.sample(PREFERENCE_OPTIONS[:3], rng.choice([0, 1, 1])),
+            'health_limitations': '', 'exercises_to_avoid': rng.choice(['', '', '', 'burpees']),
+            'additional_notes': '', 'generation_mode': 'detailed',
+        }
+
+
+def generate_locally(generator: WorkoutPlanGenerator, profile: dict):
+    """Stand-in for a model call: the mock server's plan for the profile's prompt, prepared locally"""
+    workout_plan_json = build_plan(generator.build_generation_prompt(profile))
+    days_data = parse_plan(workout_plan_json, profile.get('weight'))
+    substitute_exercises(days_data, profile)
+    fit_plan_durations(days_data, profile)
+    return workout_plan_json, days_data
+
+
+def replay(profiles: list, threshold: float, llm_latency: float, generator: WorkoutPlanGenerator) -> dict:
+    index = PlanIndex()
+    seen_keys = set()
+    exact_hits = generated = 0
+    similarities, plan_fits, adapt_seconds = [], [], []
+    for profile in profiles:
+        plan_key, _ = profile_cache_key(profile)
+        if plan_key in seen_keys:
+            exact_hits += 1
+            continue
+        seen_keys.add(plan_key)
+
+        start = time.perf_counter()
+        similar = find_similar_plan(profile, index, threshold)
+        elapsed = time.perf_counter() - start
+        if similar is not None:
+            _, _, match = similar
+            similarities.append(match['similarity'])
+            plan_fits.append(match['plan_fit'])
+            adapt_seconds.append(elapsed)
+            continue
+
+        generated += 1
+        workout_plan_json, days_data = generate_locally(generator, profile)
+        canonical, _ = canonicalize_profile(profile)
+        cache_plan(plan_key, workout_plan_json, days_data, canonical)
+        index.insert(plan_key, canonical)
+
+    reused = len(similarities)
+    requests = len(profiles)
+    return {
+        'threshold': threshold,
+        'requests': requests,
+        'exact_hits': exact_hits,
+        'reused': reused,
+        'generated': generated,
+        'reuse_rate': reused / requests if requests else 0.0,
+        'latency_saved_s': sum(llm_latency - seconds for seconds in adapt_seconds),
+        'mean_adapt_ms': sum(adapt_seconds) / reused * 1000 if reused else 0.0,
+        'mean_similarity': sum(similarities) / reused if reused else None,
+        'mean_plan_fit': sum(plan_fits) / reused if reused else None,
+        'min_plan_fit': min(plan_fits) if plan_fits else None,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("traffic", nargs="?", help="Recorded form_data, one JSON object per line")
+    parser.add_argument("--synthetic", type=int, default=500, help="Synthetic profiles when no traffic is given")
+    parser.add_argument("--seed", type=int, default=7)
+    parser.add_argument("--thresholds", default="0.8,0.85,0.9,0.95,0.99", help="Comma-separated similarities")
+    parser.add_argument("--llm-latency", type=float, default=20.0, help="Seconds a generation takes (saved per reuse)")
+    args = parser.parse_args()
+
+    if args.traffic:
+        with open(args.traffic, encoding='utf-8') as traffic:
+            profiles = [json.loads(line) for line in traffic if line.strip()]
+    else:
+        profiles = list(synthetic_profiles(args.synthetic, args.seed))
+
+    generator = WorkoutPlanGenerator()
+    print(f"{len(profiles)} requests, {args.llm_latency:.0f}s per generation")
+    print(f"{'threshold':>9} {'exact':>6} {'reused':>7} {'generated':>9} {'saved/req':>10} "
+          f"{'adapt ms':>9} {'similarity':>10} {'plan fit':>9} {'min fit':>8}")
+    for threshold in [float(value) for value in args.thresholds.split(",")]:
+        result = replay(profiles, threshold, args.llm_latency, generator)
+        print(f"{threshold:>9.2f} {result['exact_hits']:>6} {result['reused']:>7} {result['generated']:>9} "
+              f"{result['latency_saved_s'] / result['requests']:>9.2f}s {result['mean_adapt_ms']:>9.2f} "
+              f"{result['mean_similarity'] or 0:>10.3f} {result['mean_plan_fit'] or 0:>9.3f} "
+              f"{result['min_plan_fit'] or 0:>8.3f}")
+
+
+if __name__ == "__main__":
+    main()
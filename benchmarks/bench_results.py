@@ -0,0 +1,112 @@
+"""Benchmark results page render time and markdown payload for a generated plan.
+
+Also compares a full-page rerun with the isolated reruns of the download and
+token-usage fragments, which is what changing those selectboxes now costs.
+
+Run from the repository root:
+    python benchmarks/bench_results.py [--days 7] [--exercises 10] [--reruns 20]
+"""
+import os
+import sys
+import json
+import time
+import argparse
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+os.chdir(ROOT)
+os.environ.setdefault("OPENAI_API_KEY", "sk-benchmark")
+
+from streamlit.testing.v1 import AppTest
+from plan_parser import parse_plan
+from bench_parse import build_plan
+
+FORM_DATA = {
+    'name': 'Benchmark', 'age': 30, 'gender': 'male', 'weight': 75.0, 'height': 180.0,
+    'fitness_level': 'Intermediate', 'goal': 'Muscle Gain', 'training_days_per_week': 7,
+    'session_duration': 60, 'target_areas': [], 'available_equipment': ['Dumbbells'],
+    'workout_preferences': ['Strength'], 'health_limitations': '', 'exercises_to_avoid': '',
+    'additional_notes': '', 'weekly_frequency': 7, 'duration_per_session': 60
+}
+
+
+def results_app(num_days: int, num_exercises: int) -> AppTest:
+    """AppTest positioned on the results page of a synthetic plan"""
+    workout_plan_json = build_plan(num_days, num_exercises)
+    at = AppTest.from_file(os.path.join(ROOT, "main.py"), default_timeout=60)
+    at.session_state.page = 'results'
+    at.session_state.form_data = dict(FORM_DATA, weekly_frequency=num_days, training_days_per_week=num_days)
+    at.session_state.workout_plan = workout_plan_json
+    at.session_state.days_data = parse_plan(workout_plan_json, FORM_DATA['weight'])
+    return at
+
+
+def _download_fragment():
+    from ui_components import display_download_controls
+    display_download_controls()
+
+
+def _usage_fragment():
+    from ui_components import display_usage_panel
+    display_usage_panel()
+
+
+def mean_rerun_ms(at: AppTest, reruns: int) -> float:
+    """Run once to warm up, then return mean milliseconds per rerun"""
+    at.run()
+    assert not at.exception, at.exception
+    start = time.perf_counter()
+    for _ in range(reruns):
+        at.run()
+    return (time.perf_counter() - start) * 1000 / reruns
+
+
+def fragment_app(func, source: AppTest) -> AppTest:
+    """AppTest running only a fragment body with the results page session state"""
+    at = AppTest.from_function(func, default_timeout=60)
+    for key in ('form_data', 'days_data'):
+        at.session_state[key] = source.session_state[key]
+    at.session_state.session_usage = {
+        'total_input_tokens': 0, 'total_output_tokens': 0, 'total_requests': 0, 'requests': []
+    }
+    at.session_state.download_format_select = "JSON (.json)"
+    return at
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--days", type=int, default=7)
+    parser.add_argument("--exercises", type=int, default=10)
+    parser.add_argument("--reruns", type=int, default=20)
+    parser.add_argument("--json", action="store_true", help="Print machine-readable results")
+    args = parser.parse_args()
+
+    at = results_app(args.days, args.exercises)
+    render_ms = mean_rerun_ms(at, args.reruns)
+    download_ms = mean_rerun_ms(fragment_app(_download_fragment, at), args.reruns)
+    usage_ms = mean_rerun_ms(fragment_app(_usage_fragment, at), args.reruns)
+
+    payload = sum(len(element.value) for element in at.markdown)
+    results = {
+        "days": args.days,
+        "exercises_per_day": args.exercises,
+        "render_mean_ms": round(render_ms, 2),
+        "download_fragment_rerun_ms": round(download_ms, 2),
+        "usage_fragment_rerun_ms": round(usage_ms, 2),
+        "markdown_elements": len(at.markdown),
+        "markdown_payload_bytes": payload,
+    }
+
+    if args.json:
+        print(json.dumps(results, indent=2))
+    else:
+        print(f"Plan: {args.days} days x {args.exercises} exercises")
+        print(f"Results rerun (mean):  {results['render_mean_ms']:.1f} ms")
+        print(f"Download fragment:     {results['download_fragment_rerun_ms']:.1f} ms")
+        print(f"Usage panel fragment:  {results['usage_fragment_rerun_ms']:.1f} ms")
+        print(f"Markdown elements:     {results['markdown_elements']}")
+        print(f"Markdown payload:      {payload / 1024:.1f} KiB")
+
+
+if __name__ == "__main__":
+    main()
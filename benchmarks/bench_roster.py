@@ -0,0 +1,110 @@
+"""Compare roster mode (several profiles in one model call) with one call per profile.
+
+Generates plans for groups of synthetic profiles both ways and reports input and
+output tokens, wall time and complete plans. By default it runs against the mock
+server started in-process, whose latency grows with output tokens like a real model;
+pass --backend to use the configured GENERATION_BACKEND instead.
+
+Run from the repository root:
+    python benchmarks/bench_roster.py [--sizes 2,4,6] [--llm-latency 0.5] [--token-latency 0.0005] [--backend]
+"""
+import os
+import sys
+import time
+import argparse
+import threading
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+os.environ.setdefault("OPENAI_API_KEY", "sk-benchmark")
+
+from models import WorkoutPlanGenerator
+from backends import GenerationBackend, LocalOpenAICompatibleBackend, create_backend
+from plan_parser import salvage_plan
+from mock_llm_server import start_server
+from bench_plan_reuse import synthetic_profiles
+
+
+class MeteredBackend(GenerationBackend):
+    """Counts the calls and tokens going through another backend"""
+
+    def __init__(self, backend: GenerationBackend):
+        super().__init__(backend.capabilities)
+        self.backend = backend
+        self.requires_api_key = backend.requires_api_key
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        self.calls = self.input_tokens = self.output_tokens = 0
+
+    def resolve_model(self, model: str) -> str:
+        return self.backend.resolve_model(model)
+
+    def complete(self, messages, model=None, **options):
+        result = self.backend.complete(messages, model, **options)
+        with self._lock:
+            self.calls += 1
+            self.input_tokens += result['input_tokens']
+            self.output_tokens += result['output_tokens']
+        return result
+
+
+def complete_plans(plans, profiles) -> int:
+    return sum(len(salvage_plan(plan, range(1, profile['weekly_frequency'] + 1))[1]) == 0
+               for plan, profile in zip(plans, profiles))
+
+
+def run_separate(generator: WorkoutPlanGenerator, backend: MeteredBackend, profiles: list) -> dict:
+    backend.reset()
+    start_time = time.perf_counter()
+    plans = [generator.generate_workout_plan(profile) for profile in profiles]
+    return {'seconds': time.perf_counter() - start_time, 'calls': backend.calls,
+            'input_tokens': backend.input_tokens, 'output_tokens': backend.output_tokens,
+            'complete': complete_plans(plans, profiles)}
+
+
+def run_roster(generator: WorkoutPlanGenerator, backend: MeteredBackend, profiles: list) -> dict:
+    backend.reset()
+    start_time = time.perf_counter()
+    plans = []
+    for batch in generator.roster_batches(profiles):
+        member_plans, _ = generator.generate_roster_plans([profiles[position] for position in batch])
+        plans.extend(member_plans)
+    return {'seconds': time.perf_counter() - start_time, 'calls': backend.calls,
+            'input_tokens': backend.input_tokens, 'output_tokens': backend.output_tokens,
+            'complete': complete_plans(plans, profiles)}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--sizes", default="2,4,6", help="Comma-separated group sizes")
+    parser.add_argument("--seed", type=int, default=11)
+    parser.add_argument("--llm-port", type=int, default=8021)
+    parser.add_argument("--llm-latency", type=float, default=0.5, help="Mock server seconds per completion")
+    parser.add_argument("--token-latency", type=float, default=0.0005, help="Mock server seconds per output token")
+    parser.add_argument("--backend", action="store_true", help="Use GENERATION_BACKEND instead of the mock server")
+    args = parser.parse_args()
+
+    if args.backend:
+        backend = MeteredBackend(create_backend(os.getenv('OPENAI_API_KEY')))
+    else:
+        start_server(args.llm_port, args.llm_latency, token_latency=args.token_latency)
+        backend = MeteredBackend(LocalOpenAICompatibleBackend(f"http://127.0.0.1:{args.llm_port}/v1", "local-model"))
+    generator = WorkoutPlanGenerator(backend=backend)
+
+    print(f"{'members':>7} {'mode':<9} {'calls':>5} {'in tok':>7} {'out tok':>8} {'wall s':>7} {'complete':>8}")
+    for size in [int(value) for value in args.sizes.split(",")]:
+        profiles = list(synthetic_profiles(size, args.seed + size))
+        separate = run_separate(generator, backend, profiles)
+        roster = run_roster(generator, backend, profiles)
+        for mode, result in (('separate', separate), ('roster', roster)):
+            print(f"{size:>7} {mode:<9} {result['calls']:>5} {result['input_tokens']:>7} {result['output_tokens']:>8} "
+                  f"{result['seconds']:>7.2f} {result['complete']:>5}/{size}")
+        print(f"{'':>7} saved     {1 - roster['input_tokens'] / separate['input_tokens']:>13.0%} input tokens, "
+              f"{1 - roster['seconds'] / separate['seconds']:.0%} wall time")
+
+
+if __name__ == "__main__":
+    main()
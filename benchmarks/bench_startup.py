@@ -0,0 +1,91 @@
+"""Benchmark cold start (process launch to first form render) and per-rerun overhead.
+
+Run from the repository root:
+    python benchmarks/bench_startup.py [--reruns 20] [--max-startup 5.0] [--max-rerun 0.5]
+
+Exits non-zero when a threshold is exceeded so startup regressions can be caught in CI.
+"""
+import os
+import sys
+import json
+import time
+import argparse
+import subprocess
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+CHILD_SCRIPT = """
+import sys, time, json
+from streamlit.testing.v1 import AppTest
+at = AppTest.from_file("main.py", default_timeout=60)
+at.run()
+rendered_at = time.time()
+assert not at.exception, at.exception
+assert len(at.number_input) > 0, "workout form did not render"
+modules = set(sys.modules)
+rerun_times = []
+for _ in range({reruns}):
+    start = time.perf_counter()
+    at.run()
+    rerun_times.append(time.perf_counter() - start)
+print(json.dumps({{
+    "rendered_at": rendered_at,
+    "rerun_times": rerun_times,
+    "openai_imported": "openai" in modules,
+}}))
+"""
+
+
+def run_child(reruns: int) -> dict:
+    """Launch a fresh interpreter, render the form once, then time reruns"""
+    env = dict(os.environ)
+    # The form only renders once an API key is available
+    env.setdefault("OPENAI_API_KEY", "sk-benchmark")
+    launched_at = time.time()
+    result = subprocess.run(
+        [sys.executable, "-c", CHILD_SCRIPT.format(reruns=reruns)],
+        cwd=ROOT, env=env, capture_output=True, text=True, check=True
+    )
+    report = json.loads(result.stdout.strip().splitlines()[-1])
+    report["startup_seconds"] = report["rendered_at"] - launched_at
+    return report
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--reruns", type=int, default=20)
+    parser.add_argument("--max-startup", type=float, default=None, help="Fail if cold start exceeds this (seconds)")
+    parser.add_argument("--max-rerun", type=float, default=None, help="Fail if mean rerun exceeds this (seconds)")
+    parser.add_argument("--json", action="store_true", help="Print machine-readable results")
+    args = parser.parse_args()
+
+    report = run_child(args.reruns)
+    rerun_times = sorted(report["rerun_times"])
+    mean_rerun = sum(rerun_times) / len(rerun_times) if rerun_times else 0.0
+    results = {
+        "startup_seconds": round(report["startup_seconds"], 4),
+        "rerun_mean_seconds": round(mean_rerun, 4),
+        "rerun_p95_seconds": round(rerun_times[int(len(rerun_times) * 0.95) - 1], 4) if rerun_times else 0.0,
+        "openai_imported_at_startup": report["openai_imported"],
+    }
+
+    if args.json:
+        print(json.dumps(results, indent=2))
+    else:
+        print(f"Launch to first form render: {results['startup_seconds']:.3f}s")
+        print(f"Rerun overhead (mean):       {results['rerun_mean_seconds'] * 1000:.1f} ms")
+        print(f"Rerun overhead (p95):        {results['rerun_p95_seconds'] * 1000:.1f} ms")
+        print(f"OpenAI SDK imported before first request: {results['openai_imported_at_startup']}")
+
+    failed = False
+    if args.max_startup is not None and results["startup_seconds"] > args.max_startup:
+        print(f"FAIL: startup {results['startup_seconds']:.3f}s exceeds {args.max_startup}s")
+        failed = True
+    if args.max_rerun is not None and results["rerun_mean_seconds"] > args.max_rerun:
+        print(f"FAIL: mean rerun {results['rerun_mean_seconds']:.3f}s exceeds {args.max_rerun}s")
+        failed = True
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == "__main__":
+    main()
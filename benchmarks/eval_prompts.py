@@ -0,0 +1,179 @@
+"""Evaluate prompt variants on a fixed profile suite: output tokens, latency, schema validity and duration fit.
+
+Every variant's prompt for every suite profile is sent through the generation backend
+(GENERATION_BACKEND), parsed with parse_workout_plan and checked against the session
+duration. Record real responses once, then replay them deterministically to compare
+runs without calling the model (latency is the recorded one).
+
+Run from the repository root:
+    python benchmarks/eval_prompts.py --record cassettes/prompts.jsonl [--variants baseline,catalog] [--repeats 3]
+    python benchmarks/eval_prompts.py --replay cassettes/prompts.jsonl [--json results.json]
+
+Candidate templates are functions (generator, user_data) -> prompt, added with
+--variant name=module:function (module relative to the repository root).
+"""
+import os
+import sys
+import json
+import time
+import argparse
+import importlib
+from datetime import datetime, timezone
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+os.environ.setdefault("OPENAI_API_KEY", "sk-benchmark")
+
+from models import WorkoutPlanGenerator, SYSTEM_PROMPT
+from backends import CassetteBackend, create_backend
+from duration_fit import day_duration, is_within_tolerance, fit_plan_durations
+from token_budget import predict_output_tokens, max_tokens_for
+from config import DEFAULT_MODEL
+
+BASE_PROFILE = {
+    'name': 'Eval', 'age': 34, 'gender': 'female', 'weight': 68.0, 'height': 168.0,
+    'target_areas': [], 'available_equipment': [], 'workout_preferences': [],
+    'health_limitations': '', 'exercises_to_avoid': '', 'additional_notes': '', 'generation_mode': 'detailed',
+}
+# Fixed suite covering levels, goals, week lengths, session durations and constraints
+PROFILE_SUITE = [
+    dict(BASE_PROFILE, fitness_level='Beginner', goal='Weight Loss', training_days_per_week=3, session_duration=30),
+    dict(BASE_PROFILE, fitness_level='Beginner', goal='General Fitness', training_days_per_week=4, session_duration=45,
+         available_equipment=['Resistance Bands', 'Yoga Mat'], exercises_to_avoid='burpees'),
+    dict(BASE_PROFILE, fitness_level='Intermediate', goal='Muscle Gain', training_days_per_week=5, session_duration=60,
+         available_equipment=['Dumbbells', 'Barbells'], target_areas=['Chest', 'Back'], workout_preferences=['Strength']),
+    dict(BASE_PROFILE, fitness_level='Intermediate', goal='Endurance', training_days_per_week=4, session_duration=45,
+         workout_preferences=['Cardio', 'HIIT/Circuit'], gender='male', age=45, weight=85.0, height=180.0),
+    dict(BASE_PROFILE, fitness_level='Advanced', goal='Strength Building', training_days_per_week=6, session_duration=75,
+         available_equipment=['Barbells', 'Gym Machine', 'Pull-up Bar'], health_limitations='Lower back stiffness'),
+    dict(BASE_PROFILE, fitness_level='Advanced', goal='Flexibility', training_days_per_week=7, session_duration=90,
+         workout_preferences=['Yoga', 'Pilates'], additional_notes='Training for a half marathon'),
+]
+for _profile in PROFILE_SUITE:
+    _profile.update(weekly_frequency=_profile['training_days_per_week'],
+                    duration_per_session=_profile['session_duration'])
+
+BUILTIN_VARIANTS = {
+    'baseline': lambda generator, user_data: generator.create_prompt(user_data),
+    'catalog': lambda generator, user_data: generator.create_catalog_prompt(user_data),
+}
+# Generation mode of variants whose responses are not detailed exercise objects (sets max_tokens)
+VARIANT_MODES = {'catalog': 'catalog'}
+
+
+def load_variant(spec: str):
+    """name=module:function -> (name, prompt function)"""
+    name, target = spec.split('=', 1)
+    module_name, function_name = target.split(':', 1)
+    return name, getattr(importlib.import_module(module_name), function_name)
+
+
+def percentile(values, fraction: float) -> float:
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(round(fraction * (len(ordered) - 1))))]
+
+
+def evaluate_call(generator: WorkoutPlanGenerator, prompt: str, user_data: dict, model: str) -> dict:
+    """Send one prompt and score the response"""
+    messages = [{"role": "system", "content": SYSTEM_PROMPT}, {"role": "user", "content": prompt}]
+    start_time = time.perf_counter()
+    result = generator.backend.complete(messages, model=model,
+                                        max_tokens=max_tokens_for(predict_output_tokens(user_data)))
+    latency = result.get('latency', time.perf_counter() - start_time)
+
+    days_data = generator.parse_workout_plan(result['content'], user_data['weight'])
+    target_minutes = user_data['session_duration']
+    in_tolerance = sum(is_within_tolerance(day_duration(day_data), target_minutes) for day_data in days_data)
+    unfit = fit_plan_durations(days_data, user_data) if days_data else []
+    return {
+        'input_tokens': result['input_tokens'],
+        'output_tokens': result['output_tokens'],
+        'latency': latency,
+        'truncated': result.get('finish_reason') == 'length',
+        'valid': len(days_data) == user_data['weekly_frequency'] and all(day['exercises'] for day in days_data),
+        'days': len(days_data),
+        'days_in_tolerance': in_tolerance,
+        'days_fitted_locally': len(days_data) - in_tolerance - len(unfit),
+    }
+
+
+def evaluate_variant(generator: WorkoutPlanGenerator, prompt_function, repeats: int, model: str,
+                     generation_mode: str = 'detailed') -> dict:
+    calls = []
+    for user_data in PROFILE_SUITE:
+        user_data = dict(user_data, generation_mode=generation_mode)
+        prompt = prompt_function(generator, user_data)
+        for _ in range(repeats):
+            calls.append(evaluate_call(generator, prompt, user_data, model))
+
+    output_tokens = [call['output_tokens'] for call in calls]
+    latencies = [call['latency'] for call in calls]
+    days = sum(call['days'] for call in calls)
+    return {
+        'calls': len(calls),
+        'input_tokens_mean': sum(call['input_tokens'] for call in calls) / len(calls),
+        'output_tokens_mean': sum(output_tokens) / len(calls),
+        'output_tokens_p95': percentile(output_tokens, 0.95),
+        'latency_p50_s': round(percentile(latencies, 0.5), 3),
+        'latency_p95_s': round(percentile(latencies, 0.95), 3),
+        'schema_valid_rate': sum(call['valid'] for call in calls) / len(calls),
+        'truncated_rate': sum(call['truncated'] for call in calls) / len(calls),
+        'duration_fit_rate': sum(call['days_in_tolerance'] for call in calls) / days if days else 0.0,
+        'local_fit_rate': sum(call['days_in_tolerance'] + call['days_fitted_locally'] for call in calls) / days
+        if days else 0.0,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    mode = parser.add_mutually_exclusive_group()
+    mode.add_argument("--record", metavar="CASSETTE", help="Call the backend and record responses to CASSETTE")
+    mode.add_argument("--replay", metavar="CASSETTE", help="Replay responses from CASSETTE instead of calling a model")
+    parser.add_argument("--variants", default="baseline,catalog", help="Comma-separated built-in variants")
+    parser.add_argument("--variant", action="append", default=[], metavar="NAME=MODULE:FUNCTION",
+                        help="Additional prompt variant")
+    parser.add_argument("--repeats", type=int, default=1, help="Calls per profile and variant")
+    parser.add_argument("--model", default=DEFAULT_MODEL)
+    parser.add_argument("--json", metavar="PATH", help="Write machine-readable results to PATH")
+    args = parser.parse_args()
+
+    if args.replay:
+        backend = CassetteBackend(args.replay, 'replay')
+    elif args.record:
+        os.makedirs(os.path.dirname(os.path.abspath(args.record)), exist_ok=True)
+        backend = CassetteBackend(args.record, 'record', create_backend(os.getenv('OPENAI_API_KEY')))
+    else:
+        backend = create_backend(os.getenv('OPENAI_API_KEY'))
+    generator = WorkoutPlanGenerator(backend=backend)
+
+    variants = {name: BUILTIN_VARIANTS[name] for name in args.variants.split(',') if name}
+    variants.update(load_variant(spec) for spec in args.variant)
+
+    results = {}
+    print(f"{len(PROFILE_SUITE)} profiles x {args.repeats} repeats per variant")
+    print(f"{'variant':<16} {'in tok':>7} {'out tok':>8} {'out p95':>8} {'p50 s':>7} {'p95 s':>7} "
+          f"{'valid':>6} {'trunc':>6} {'in tol':>7} {'fitted':>7}")
+    for name, prompt_function in variants.items():
+        result = evaluate_variant(generator, prompt_function, args.repeats, args.model,
+                                  VARIANT_MODES.get(name, 'detailed'))
+        results[name] = result
+        print(f"{name:<16} {result['input_tokens_mean']:>7.0f} {result['output_tokens_mean']:>8.0f} "
+              f"{result['output_tokens_p95']:>8.0f} {result['latency_p50_s']:>7.2f} {result['latency_p95_s']:>7.2f} "
+              f"{result['schema_valid_rate']:>6.0%} {result['truncated_rate']:>6.0%} "
+              f"{result['duration_fit_rate']:>7.0%} {result['local_fit_rate']:>7.0%}")
+
+    if args.json:
+        with open(args.json, "w") as output:
+            json.dump({
+                "timestamp": datetime.now(timezone.utc).isoformat(),
+                "cassette": args.replay or args.record,
+                "model": args.model,
+                "repeats": args.repeats,
+                "variants": results,
+            }, output, indent=2)
+
+
+if __name__ == "__main__":
+    main()
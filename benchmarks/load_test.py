@@ -0,0 +1,286 @@
+"""Load test: drive concurrent sessions through form -> generating -> results -> download.
+
+Starts `streamlit run main.py` against the mock OpenAI-compatible server (local backend)
+and speaks Streamlit's websocket protocol directly, so every simulated session is a real
+server session sharing one process, its script threads and caches. Reports throughput,
+p50/p95/p99 page latency, server memory per live session and error rate per concurrency level.
+
+Run from the repository root:
+    python benchmarks/load_test.py [--levels 1,4,16,32] [--iterations 2] [--llm-latency 1.0]
+                                   [--shared-profiles] [--json results.json]
+"""
+import os
+import sys
+import json
+import time
+import socket
+import asyncio
+import argparse
+import subprocess
+from datetime import datetime, timezone
+
+import websockets
+from streamlit.proto.BackMsg_pb2 import BackMsg
+from streamlit.proto.ForwardMsg_pb2 import ForwardMsg
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from mock_llm_server import start_server
+
+SUBMIT_LABEL = "🚀 Generate My Personalized Workout Plan"
+DOWNLOAD_LABEL = "📥 Download Plan"
+# ScriptFinishedStatus values that end a user-visible page load
+FINISHED_STATUSES = {ForwardMsg.FINISHED_SUCCESSFULLY, ForwardMsg.FINISHED_FRAGMENT_RUN_SUCCESSFULLY}
+
+
+class SessionError(Exception):
+    """A simulated session hit an exception, error message or missing widget"""
+
+
+class Session:
+    """One browser tab talking to the Streamlit server over its websocket"""
+
+    def __init__(self, url: str, timeout: float):
+        self.url = url
+        self.timeout = timeout
+        self.websocket = None
+        self.widgets = {}
+        self.errors = []
+
+    async def connect(self):
+        self.websocket = await websockets.connect(self.url, subprotocols=["streamlit"], max_size=None)
+
+    async def close(self):
+        if self.websocket is not None:
+            await self.websocket.close()
+
+    async def rerun(self, widget_values=None) -> float:
+        """Send a rerun with (widget id, value field, value) states and wait for the page, returning seconds"""
+        message = BackMsg()
+        message.rerun_script.query_string = ""
+        message.rerun_script.page_script_hash = ""
+        for widget_id, field, value in widget_values or []:
+            state = message.rerun_script.widget_states.widgets.add()
+            state.id = widget_id
+            setattr(state, field, value)
+
+        self.widgets.clear()
+        start = time.perf_counter()
+        await self.websocket.send(message.SerializeToString())
+        await asyncio.wait_for(self._read_until_finished(), self.timeout)
+        if self.errors:
+            raise SessionError(self.errors[0])
+        return time.perf_counter() - start
+
+    async def _read_until_finished(self):
+        while True:
+            forward = ForwardMsg()
+            forward.ParseFromString(await self.websocket.recv())
+            message_type = forward.WhichOneof("type")
+            if message_type == "delta" and forward.delta.WhichOneof("type") == "new_element":
+                self._record_element(forward.delta.new_element)
+            elif message_type == "script_finished":
+                if forward.script_finished == ForwardMsg.FINISHED_WITH_COMPILE_ERROR:
+                    raise SessionError("script compile error")
+                if forward.script_finished in FINISHED_STATUSES:
+                    return
+
+    def _record_element(self, element):
+        element_type = element.WhichOneof("type")
+        proto = getattr(element, element_type)
+        if element_type == "exception":
+            self.errors.append(f"{proto.type}: {proto.message}")
+        elif element_type == "alert" and proto.format == proto.ERROR:
+            self.errors.append(proto.body)
+        elif getattr(proto, "id", "") and getattr(proto, "label", ""):
+            self.widgets[proto.label] = proto
+
+    def widget_id(self, label: str) -> str:
+        if label not in self.widgets:
+            raise SessionError(f"widget '{label}' did not render")
+        return self.widgets[label].id
+
+
+async def run_session(url: str, session_number: int, shared_profiles: bool, timeout: float) -> tuple:
+    """One user journey, returning (step timings, open session kept for memory measurement)"""
+    session = Session(url, timeout)
+    await session.connect()
+    timings = [("form", await session.rerun())]
+
+    # Required profile fields start empty on the form
+    values = [
+        (session.widget_id("Age"), "int_value", 20 + session_number % 45),
+        (session.widget_id("Weight (kg)"), "double_value", 55.0 + session_number % 50),
+        (session.widget_id("Height (cm)"), "double_value", 155.0 + session_number % 40),
+        (session.widget_id(SUBMIT_LABEL), "trigger_value", True),
+    ]
+    if not shared_profiles:
+        # Distinct notes give every session its own cache key, so each one reaches the model
+        values.append((session.widget_id("Additional Information"), "string_value",
+                       f"Load test session {session_number}"))
+    timings.append(("generate", await session.rerun(values)))
+
+    download_id = session.widget_id(DOWNLOAD_LABEL)
+    timings.append(("download", await session.rerun([(download_id, "string_value", "JSON (.json)")])))
+    return timings, session
+
+
+def percentile(values, fraction: float) -> float:
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(round(fraction * (len(ordered) - 1))))]
+
+
+def rss_mb(pid: int) -> float:
+    """Resident set size of a process in MiB (Linux only, 0 elsewhere)"""
+    try:
+        with open(f"/proc/{pid}/status") as status:
+            for line in status:
+                if line.startswith("VmRSS:"):
+                    return int(line.split()[1]) / 1024
+    except OSError:
+        pass
+    return 0.0
+
+
+async def run_level(url: str, server_pid: int, concurrency: int, iterations: int,
+                    shared_profiles: bool, timeout: float, offset: int) -> dict:
+    """Run concurrency x iterations sessions with concurrency in flight at a time"""
+    sessions = concurrency * iterations
+    slots = asyncio.Semaphore(concurrency)
+    timings, errors, alive = [], [], []
+    rss_before = rss_mb(server_pid)
+
+    async def one(session_number):
+        async with slots:
+            try:
+                session_timings, session = await run_session(url, offset + session_number, shared_profiles, timeout)
+            except (SessionError, asyncio.TimeoutError, OSError, websockets.WebSocketException) as e:
+                errors.append(f"{type(e).__name__}: {e}")
+                return
+            timings.extend(session_timings)
+            alive.append(session)
+
+    start = time.perf_counter()
+    await asyncio.gather(*(one(number) for number in range(sessions)))
+    elapsed = time.perf_counter() - start
+    # Sessions stay connected until here so the server still holds their state
+    rss_after = rss_mb(server_pid)
+    for session in alive:
+        await session.close()
+
+    latencies = [seconds for _, seconds in timings]
+    steps = {}
+    for step in ("form", "generate", "download"):
+        step_latencies = [seconds for name, seconds in timings if name == step]
+        steps[step] = {"p50": round(percentile(step_latencies, 0.5), 4),
+                       "p95": round(percentile(step_latencies, 0.95), 4)}
+    return {
+        "concurrency": concurrency,
+        "sessions": sessions,
+        "completed": len(alive),
+        "error_rate": round(len(errors) / sessions, 4),
+        "errors": errors[:5],
+        "throughput_sessions_per_s": round(len(alive) / elapsed, 3),
+        "elapsed_s": round(elapsed, 3),
+        "page_latency_s": {
+            "p50": round(percentile(latencies, 0.5), 4),
+            "p95": round(percentile(latencies, 0.95), 4),
+            "p99": round(percentile(latencies, 0.99), 4),
+        },
+        "steps": steps,
+        "memory_per_session_mb": round((rss_after - rss_before) / len(alive), 2) if alive else None,
+        "server_rss_mb": round(rss_after, 1),
+    }
+
+
+def start_app(port: int, llm_port: int) -> subprocess.Popen:
+    """Launch the app on the local backend and wait until it accepts connections"""
+    env = dict(os.environ, GENERATION_BACKEND="local", LOCAL_LLM_BASE_URL=f"http://127.0.0.1:{llm_port}/v1")
+    process = subprocess.Popen(
+        [sys.executable, "-m", "streamlit", "run", "main.py", "--server.port", str(port),
+         "--server.headless", "true", "--browser.gatherUsageStats", "false"],
+        cwd=ROOT, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL
+    )
+    deadline = time.time() + 60
+    while time.time() < deadline:
+        try:
+            socket.create_connection(("127.0.0.1", port), timeout=1).close()
+            return process
+        except OSError:
+            time.sleep(0.2)
+    process.kill()
+    raise RuntimeError("Streamlit server did not start")
+
+
+def git_commit() -> str:
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=ROOT,
+                              capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return "unknown"
+
+
+async def run_levels(args, url: str, server_pid: int) -> list:
+    results = []
+    offset = 0
+    print(f"{'conc':>5} {'sessions':>8} {'thru/s':>8} {'p50':>7} {'p95':>7} {'p99':>7} {'MiB/sess':>9} {'errors':>7}")
+    for concurrency in [int(level) for level in args.levels.split(",")]:
+        result = await run_level(url, server_pid, concurrency, args.iterations,
+                                 args.shared_profiles, args.timeout, offset)
+        offset += result["sessions"]
+        results.append(result)
+        latency = result["page_latency_s"]
+        print(f"{concurrency:>5} {result['sessions']:>8} {result['throughput_sessions_per_s']:>8.2f} "
+              f"{latency['p50']:>7.3f} {latency['p95']:>7.3f} {latency['p99']:>7.3f} "
+              f"{result['memory_per_session_mb'] or 0:>9.2f} {result['error_rate']:>7.1%}")
+        for error in result["errors"]:
+            print(f"      {error}")
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--levels", default="1,4,16,32", help="Comma-separated concurrency levels")
+    parser.add_argument("--iterations", type=int, default=2, help="Sessions per concurrent slot at each level")
+    parser.add_argument("--llm-latency", type=float, default=1.0, help="Mock model latency per call (seconds)")
+    parser.add_argument("--llm-port", type=int, default=8011)
+    parser.add_argument("--port", type=int, default=8599, help="Port for the Streamlit server under test")
+    parser.add_argument("--shared-profiles", action="store_true",
+                        help="Let sessions share cached plans instead of forcing one model call each")
+    parser.add_argument("--timeout", type=float, default=120.0, help="Per-page timeout (seconds)")
+    parser.add_argument("--max-error-rate", type=float, default=None, help="Fail if any level exceeds this")
+    parser.add_argument("--json", metavar="PATH", help="Write machine-readable results to PATH")
+    args = parser.parse_args()
+
+    llm_server = start_server(args.llm_port, args.llm_latency)
+    app = start_app(args.port, args.llm_port)
+    try:
+        results = asyncio.run(run_levels(args, f"ws://127.0.0.1:{args.port}/_stcore/stream", app.pid))
+    finally:
+        app.terminate()
+        app.wait(timeout=10)
+        llm_server.shutdown()
+
+    if args.json:
+        report = {
+            "timestamp": datetime.now(timezone.utc).isoformat(),
+            "commit": git_commit(),
+            "config": {
+                "llm_latency_s": args.llm_latency,
+                "iterations": args.iterations,
+                "shared_profiles": args.shared_profiles,
+            },
+            "levels": results,
+        }
+        with open(args.json, "w") as output:
+            json.dump(report, output, indent=2)
+
+    if args.max_error_rate is not None and any(result["error_rate"] > args.max_error_rate for result in results):
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
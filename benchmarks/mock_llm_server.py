@@ -0,0 +1,214 @@
+"""OpenAI-compatible stand-in server returning canned workout plans.
+
+Serves POST /v1/chat/completions (plain and stream=true) so the local generation
+backend, benchmarks and load tests can run without the OpenAI API:
+
+    python benchmarks/mock_llm_server.py --port 8001 [--latency 0.5] [--token-latency 0.01] [--no-usage]
+    GENERATION_BACKEND=local LOCAL_LLM_BASE_URL=http://localhost:8001/v1 streamlit run main.py
+"""
+import re
+import sys
+import json
+import time
+import argparse
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+DAYS_PATTERN = re.compile(r'(\d+)-day')
+MISSING_DAYS_PATTERN = re.compile(r'"day_(\d+)"')
+ROSTER_MEMBER_PATTERN = re.compile(r'^(member_\d+):$.*?^- Training Days: (\d+)', re.MULTILINE | re.DOTALL)
+
+EXERCISES = [
+    ("Jumping Jacks", "Warm-up", "jumping_jack"),
+    ("Dumbbell Goblet Squat", "Compound", "goblet_squat"),
+    ("Push-Up", "Compound", "push_up"),
+    ("Single-Arm Dumbbell Row", "Compound", "dumbbell_row"),
+    ("Dumbbell Shoulder Press", "Compound", "dumbbell_shoulder_press"),
+    ("Glute Bridge", "Isolation", "glute_bridge"),
+    ("Plank", "Isolation", "plank"),
+    ("Seated Hamstring Stretch", "Cooldown", "hamstring_stretch"),
+]
+
+
+def requested_days(prompt: str):
+    """Day numbers the prompt asks for: the listed missing days, or 1..N for an N-day plan"""
+    if "Only these days are missing" in prompt:
+        missing = prompt.split("Only these days are missing", 1)[1].split("\n", 1)[0]
+        return [int(day) for day in MISSING_DAYS_PATTERN.findall(missing)]
+    match = DAYS_PATTERN.search(prompt)
+    return list(range(1, int(match.group(1)) + 1 if match else 4))
+
+
+def build_days(days, catalog_mode: bool) -> dict:
+    """Day key -> day object with the canned exercises"""
+    plan = {}
+    for day in days:
+        if catalog_mode:
+            exercises = [[catalog_id, 1 if kind in ("Warm-up", "Cooldown") else 3, "10-12", "60s"]
+                         for _, kind, catalog_id in EXERCISES]
+        else:
+            exercises = [{
+                "exercise_name": name,
+                "exercise_type": kind,
+                "equipment_required": "Dumbbells",
+                "target_muscle_group": "Full Body",
+                "total_sets": 1 if kind in ("Warm-up", "Cooldown") else 3,
+                "reps": "10-12",
+                "tempo": "2-1-2",
+                "rest_time": "60s",
+                "weight": "Moderate",
+                "speed_level": "Moderate",
+                "breathing_pattern": "Exhale on exertion",
+                "superset_indicator": "None"
+            } for name, kind, _ in EXERCISES]
+        plan[f"day_{day}"] = {
+            "day_name": f"Day {day}",
+            "workout_type": "Full Body Strength",
+            "workout_duration": 45,
+            "exercises": exercises
+        }
+    return plan
+
+
+def build_patch(prompt: str) -> str:
+    """Edit prompts: replace the first exercise named in the request (else day 1's second) with a wall sit"""
+    plan = json.loads(prompt.split("PLAN:\n", 1)[1].split("\n", 1)[0])
+    request = prompt.split("REQUEST: ", 1)[1].split("\n", 1)[0].lower()
+    path = "/day_1/exercises/1"
+    for day_key, day in plan.items():
+        for index, exercise in enumerate(day["exercises"]):
+            if any(word in request for word in exercise["exercise_name"].lower().split() if len(word) > 3):
+                path = f"/{day_key}/exercises/{index}"
+                break
+        else:
+            continue
+        break
+    value = {"exercise_name": "Wall Sit", "exercise_type": "Isolation", "equipment_required": "Bodyweight",
+             "target_muscle_group": "Quads", "total_sets": 3, "reps": "30s", "rest_time": "60s"}
+    return json.dumps({"patch": [{"op": "replace", "path": path, "value": value}]})
+
+
+def build_plan(prompt: str) -> str:
+    """Build the response the prompt asks for: a plan (detailed objects or catalog ids), a roster or an edit patch"""
+    if "RFC 6902" in prompt:
+        return build_patch(prompt)
+    members = ROSTER_MEMBER_PATTERN.findall(prompt)
+    if members:
+        return json.dumps({"roster": {member_key: build_days(range(1, int(days) + 1), False)
+                                      for member_key, days in members}}, indent=2)
+    return json.dumps({"workout_plan": build_days(requested_days(prompt), "catalog_id" in prompt)}, indent=2)
+
+
+class MockLLMHandler(BaseHTTPRequestHandler):
+    latency = 0.0
+    token_latency = 0.0
+    report_usage = True
+    request_count = 0
+    lock = threading.Lock()
+
+    def log_message(self, format, *args):
+        pass
+
+    def _send_json(self, status: int, payload: dict):
+        body = json.dumps(payload).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_GET(self):
+        if self.path.rstrip("/").endswith("/models"):
+            self._send_json(200, {"object": "list", "data": [{"id": "local-model", "object": "model"}]})
+        else:
+            self._send_json(404, {"error": {"message": "not found"}})
+
+    def do_POST(self):
+        if not self.path.rstrip("/").endswith("/chat/completions"):
+            self._send_json(404, {"error": {"message": "not found"}})
+            return
+
+        request = json.loads(self.rfile.read(int(self.headers.get("Content-Length", 0))) or b"{}")
+        with MockLLMHandler.lock:
+            MockLLMHandler.request_count += 1
+
+        prompt = request["messages"][-1]["content"]
+        content = build_plan(prompt)
+        input_tokens = sum(len(message["content"]) for message in request["messages"]) // 4
+        output_tokens = len(content) // 4
+        usage = {"prompt_tokens": input_tokens, "completion_tokens": output_tokens,
+                 "total_tokens": input_tokens + output_tokens}
+
+        # Like a real model, longer responses take longer
+        latency = self.latency + self.token_latency * output_tokens
+        if request.get("stream"):
+            self._stream(request, content, usage, latency)
+            return
+
+        time.sleep(latency)
+        payload = {
+            "id": "chatcmpl-mock",
+            "object": "chat.completion",
+            "created": int(time.time()),
+            "model": request.get("model", "local-model"),
+            "choices": [{"index": 0, "finish_reason": "stop",
+                         "message": {"role": "assistant", "content": content}}],
+        }
+        if self.report_usage:
+            payload["usage"] = usage
+        self._send_json(200, payload)
+
+    def _stream(self, request: dict, content: str, usage: dict, latency: float):
+        """Send the content as server-sent event chunks spread over the configured latency"""
+        self.send_response(200)
+        self.send_header("Content-Type", "text/event-stream")
+        self.end_headers()
+        chunks = [content[i:i + 200] for i in range(0, len(content), 200)] or [""]
+        base = {"id": "chatcmpl-mock", "object": "chat.completion.chunk", "created": int(time.time()),
+                "model": request.get("model", "local-model")}
+        try:
+            for chunk in chunks:
+                time.sleep(latency / len(chunks))
+                event = dict(base, choices=[{"index": 0, "delta": {"content": chunk}, "finish_reason": None}])
+                self.wfile.write(f"data: {json.dumps(event)}\n\n".encode())
+                self.wfile.flush()
+            final = dict(base, choices=[{"index": 0, "delta": {}, "finish_reason": "stop"}])
+            if self.report_usage and request.get("stream_options", {}).get("include_usage"):
+                self.wfile.write(f"data: {json.dumps(final)}\n\n".encode())
+                final = dict(base, choices=[], usage=usage)
+            self.wfile.write(f"data: {json.dumps(final)}\n\ndata: [DONE]\n\n".encode())
+        except (BrokenPipeError, ConnectionResetError):
+            # Client cancelled the stream
+            pass
+
+
+def start_server(port: int = 8001, latency: float = 0.0, report_usage: bool = True,
+                 token_latency: float = 0.0) -> ThreadingHTTPServer:
+    """Start the stand-in server on a background thread and return it"""
+    MockLLMHandler.latency = latency
+    MockLLMHandler.token_latency = token_latency
+    MockLLMHandler.report_usage = report_usage
+    server = ThreadingHTTPServer(("127.0.0.1", port), MockLLMHandler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--port", type=int, default=8001)
+    parser.add_argument("--latency", type=float, default=0.0, help="Seconds per completion")
+    parser.add_argument("--token-latency", type=float, default=0.0, help="Additional seconds per output token")
+    parser.add_argument("--no-usage", action="store_true", help="Omit token usage like some local servers")
+    args = parser.parse_args()
+
+    server = start_server(args.port, args.latency, not args.no_usage, args.token_latency)
+    print(f"Mock LLM server listening on http://127.0.0.1:{args.port}/v1", file=sys.stderr)
+    try:
+        threading.Event().wait()
+    except KeyboardInterrupt:
+        server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
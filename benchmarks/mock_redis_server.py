@@ -0,0 +1,177 @@
+"""Redis-protocol stand-in implementing the commands the shared state layer uses.
+
+Lets several replicas share state in tests without a Redis install:
+
+    python benchmarks/mock_redis_server.py --port 6390
+    STATE_BACKEND=redis REDIS_URL=redis://localhost:6390/0 uvicorn api:app
+"""
+import sys
+import time
+import argparse
+import threading
+import socketserver
+
+
+class RedisState:
+    """Strings and hashes with expiry, guarded by one lock"""
+
+    def __init__(self):
+        self.data = {}
+        self.expires = {}
+        self.lock = threading.RLock()
+
+    def get(self, key):
+        expires_at = self.expires.get(key)
+        if expires_at is not None and expires_at <= time.time():
+            self.data.pop(key, None)
+            self.expires.pop(key, None)
+        return self.data.get(key)
+
+
+def encode(value, protocol: int = 2) -> bytes:
+    """Encode a reply in RESP2, or RESP3 after HELLO 3 (maps and nulls differ)"""
+    if isinstance(value, dict):
+        if protocol == 3:
+            return f"%{len(value)}\r\n".encode() + b"".join(
+                encode(key, protocol) + encode(item, protocol) for key, item in value.items())
+        value = [item for pair in value.items() for item in pair]
+    if value is None:
+        return b"_\r\n" if protocol == 3 else b"$-1\r\n"
+    if isinstance(value, Exception):
+        return f"-ERR {value}\r\n".encode()
+    if isinstance(value, bool):
+        return b"+OK\r\n" if value else encode(None, protocol)
+    if isinstance(value, int):
+        return f":{value}\r\n".encode()
+    if isinstance(value, list):
+        return f"*{len(value)}\r\n".encode() + b"".join(encode(item, protocol) for item in value)
+    if isinstance(value, str):
+        value = value.encode()
+    return b"$%d\r\n%s\r\n" % (len(value), value)
+
+
+def execute(state: RedisState, args):
+    command = args[0].decode().upper()
+    args = args[1:]
+    with state.lock:
+        if command == "PING":
+            return "PONG"
+        if command in ("SELECT", "CLIENT"):
+            return True
+        if command == "FLUSHDB":
+            state.data.clear()
+            state.expires.clear()
+            return True
+        if command == "GET":
+            value = state.get(args[0])
+            return value if value is None or isinstance(value, bytes) else Exception("WRONGTYPE")
+        if command == "SET":
+            key, value = args[0], args[1]
+            options = [arg.decode().upper() for arg in args[2:]]
+            if "NX" in options and state.get(key) is not None:
+                return None
+            state.data[key] = value
+            state.expires.pop(key, None)
+            for flag, scale in (("EX", 1), ("PX", 0.001)):
+                if flag in options:
+                    state.expires[key] = time.time() + float(options[options.index(flag) + 1]) * scale
+            return True
+        if command == "DEL":
+            removed = 0
+            for key in args:
+                removed += state.get(key) is not None
+                state.data.pop(key, None)
+                state.expires.pop(key, None)
+            return removed
+        if command == "EXPIRE":
+            if state.get(args[0]) is None:
+                return 0
+            state.expires[args[0]] = time.time() + int(args[1])
+            return 1
+        if command == "HINCRBYFLOAT":
+            fields = state.get(args[0])
+            if fields is None:
+                fields = state.data[args[0]] = {}
+            fields[args[1]] = fields.get(args[1], 0.0) + float(args[2])
+            return repr(fields[args[1]])
+        if command == "HGETALL":
+            return {field: repr(value) for field, value in (state.get(args[0]) or {}).items()}
+    return Exception(f"unknown command '{command}'")
+
+
+class RedisHandler(socketserver.StreamRequestHandler):
+    def read_command(self):
+        line = self.rfile.readline()
+        if not line:
+            return None
+        if not line.startswith(b"*"):
+            # Inline command
+            return line.split()
+        args = []
+        for _ in range(int(line[1:])):
+            length = int(self.rfile.readline()[1:])
+            args.append(self.rfile.read(length + 2)[:-2])
+        return args
+
+    def handle(self):
+        protocol = 2
+        transaction = None
+        while True:
+            try:
+                args = self.read_command()
+            except (ConnectionError, ValueError):
+                return
+            if not args:
+                return
+            name = args[0].upper()
+            if name == b"HELLO":
+                protocol = int(args[1]) if len(args) > 1 else protocol
+                reply = {"server": "redis", "version": "7.2.0", "proto": protocol, "mode": "standalone"}
+            elif name == b"MULTI":
+                transaction = []
+                reply = True
+            elif name == b"EXEC" and transaction is not None:
+                # Run the queued commands atomically
+                with self.server.state.lock:
+                    reply = [execute(self.server.state, queued) for queued in transaction]
+                transaction = None
+            elif transaction is not None:
+                transaction.append(args)
+                self.wfile.write(b"+QUEUED\r\n")
+                continue
+            else:
+                reply = execute(self.server.state, args)
+            self.wfile.write(encode(reply, protocol))
+
+
+class RedisServer(socketserver.ThreadingTCPServer):
+    allow_reuse_address = True
+    daemon_threads = True
+
+    def __init__(self, address):
+        super().__init__(address, RedisHandler)
+        self.state = RedisState()
+
+
+def start_server(port: int = 6390) -> RedisServer:
+    """Start the stand-in server on a background thread and return it"""
+    server = RedisServer(("127.0.0.1", port))
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--port", type=int, default=6390)
+    args = parser.parse_args()
+
+    server = start_server(args.port)
+    print(f"Mock Redis server listening on redis://127.0.0.1:{args.port}/0", file=sys.stderr)
+    try:
+        threading.Event().wait()
+    except KeyboardInterrupt:
+        server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,285 @@
+"""
+Bulk export of stored plans for analytics, one row per exercise.
+
+Plans are read one at a time from the shared state (generated and warm plans) or
+from JSON lines files of {'profile': form data, 'days': days_data} records, and
+written in batches of EXPORT_BATCH_ROWS rows, so memory stays bounded however many
+plans are exported. Sets, reps, rest, duration and calories are exported as numbers.
+Days read from files are rebuilt by the plan parser first; records it rejects are skipped.
+Parquet and Arrow IPC need pyarrow; without it rows are streamed as CSV.
+
+Run with: python bulk_export.py plans.parquet [--format parquet|arrow|csv] [--input plans.jsonl ...]
+"""
+import os
+import re
+import csv
+import sys
+import json
+import time
+import argparse
+from abc import ABC, abstractmethod
+from typing import Dict, Iterable, Iterator, List, Optional
+from canonical_profile import canonicalize_profile
+from duration_fit import parse_rest_seconds
+from plan_parser import PlanValidationError, validate_day, personalize_calories
+from warm_pool import base_profile
+from shared_state import get_indexed_plan_keys, get_cached_plan, get_demand, get_warm_plan
+from config import EXPORT_BATCH_ROWS
+
+# Optional columnar writers, only needed for Parquet and Arrow IPC output
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except ImportError:
+    pa = pq = None
+
+NUMBER_PATTERN = re.compile(r'\d+')
+
+# Output columns and their types
+EXPORT_COLUMNS = {
+    'plan_key': 'string',
+    'source': 'string',
+    'fitness_level': 'string',
+    'goal': 'string',
+    'training_days_per_week': 'int',
+    'session_duration': 'int',
+    'generation_mode': 'string',
+    'day': 'int',
+    'day_title': 'string',
+    'workout_type': 'string',
+    'exercise_index': 'int',
+    'exercise_name': 'string',
+    'exercise_type': 'string',
+    'equipment_required': 'string',
+    'target_muscle_group': 'string',
+    'sets': 'int',
+    'reps': 'string',
+    'reps_min': 'int',
+    'reps_max': 'int',
+    'tempo': 'string',
+    'rest_seconds': 'int',
+    'duration_minutes': 'float',
+    'calories_burned': 'float',
+    'substituted_for': 'string',
+}
+FORMAT_EXTENSIONS = {'.parquet': 'parquet', '.arrow': 'arrow', '.feather': 'arrow', '.csv': 'csv'}
+
+
+def iter_stored_plans() -> Iterator[Dict]:
+    """Plans in the shared state, one at a time: generated plans, then warm pool plans"""
+    for plan_key in get_indexed_plan_keys():
+        cached = get_cached_plan(plan_key)
+        if cached is not None and cached.get('profile'):
+            yield {'plan_key': plan_key, 'source': 'generated', 'profile': cached['profile'], 'days': cached['days']}
+    for combination in get_demand():
+        warm = get_warm_plan(combination)
+        if warm is not None:
+            profile, _ = canonicalize_profile(base_profile(combination))
+            yield {'plan_key': combination, 'source': 'warm_pool', 'profile': profile, 'days': warm['days']}
+
+
+def validate_file_days(days, weight_kg: Optional[float]) -> List[Dict]:
+    """Rebuild the display days of a file record with the plan parser, keeping titles and substitutions"""
+    if not isinstance(days, list) or not all(isinstance(day, dict) for day in days):
+        raise PlanValidationError("'days' must be a list of day objects")
+
+    days_data = []
+    for position, day in enumerate(days):
+        day_number = day.get('day')
+        if isinstance(day_number, bool) or not isinstance(day_number, int):
+            day_number = position + 1
+        day_data = validate_day(day_number, dict(day, day_name=day.get('day_name') or day.get('title')))
+        substitutions = {exercise.get('exercise_name'): exercise['substituted_for']
+                         for exercise in day['exercises']
+                         if isinstance(exercise, dict) and isinstance(exercise.get('substituted_for'), str)}
+        for exercise in day_data['exercises']:
+            if exercise['exercise_name'] in substitutions:
+                exercise['substituted_for'] = substitutions[exercise['exercise_name']]
+        days_data.append(day_data)
+    return personalize_calories(days_data, weight_kg)
+
+
+def iter_plan_files(paths: Iterable[str]) -> Iterator[Dict]:
+    """Plans from JSON lines files of {'profile': form data, 'days': days_data} records, skipping invalid ones"""
+    for path in paths:
+        with open(path, encoding='utf-8') as plans:
+            for line_number, line in enumerate(plans, 1):
+                if not line.strip():
+                    continue
+                try:
+                    record = json.loads(line)
+                    profile, personal = canonicalize_profile(record['profile'])
+                    weight = personal.get('weight')
+                    if isinstance(weight, bool) or not isinstance(weight, (int, float)):
+                        weight = None
+                    days_data = validate_file_days(record['days'], weight)
+                except (KeyError, TypeError, ValueError) as e:
+                    print(f"Skipping {path}:{line_number}: {e}", file=sys.stderr)
+                    continue
+                yield {'plan_key': record.get('plan_key', f"{os.path.basename(path)}:{line_number}"),
+                       'source': 'file', 'profile': profile, 'days': days_data}
+
+
+def parse_reps(reps) -> tuple:
+    """Lowest and highest rep count in a reps value like '10-12' or '8', None when it has no number"""
+    numbers = [int(number) for number in NUMBER_PATTERN.findall(str(reps or ''))]
+    return (min(numbers), max(numbers)) if numbers else (None, None)
+
+
+def exercise_rows(plan: Dict) -> Iterator[Dict]:
+    """One export row per exercise of a plan"""
+    profile = plan['profile']
+    plan_fields = {
+        'plan_key': plan['plan_key'],
+        'source': plan['source'],
+        'fitness_level': profile.get('fitness_level'),
+        'goal': profile.get('goal'),
+        'training_days_per_week': profile.get('training_days_per_week'),
+        'session_duration': profile.get('session_duration'),
+        'generation_mode': profile.get('generation_mode'),
+    }
+    for day_data in plan['days']:
+        for index, exercise in enumerate(day_data['exercises']):
+            reps_min, reps_max = parse_reps(exercise.get('reps'))
+            row = dict(plan_fields)
+            row.update({
+                'day': day_data.get('day'),
+                'day_title': day_data.get('title'),
+                'workout_type': day_data.get('workout_type'),
+                'exercise_index': index,
+                'exercise_name': exercise.get('exercise_name'),
+                'exercise_type': exercise.get('exercise_type'),
+                'equipment_required': exercise.get('equipment_required'),
+                'target_muscle_group': exercise.get('target_muscle_group'),
+                'sets': exercise.get('total_sets'),
+                'reps': exercise.get('reps'),
+                'reps_min': reps_min,
+                'reps_max': reps_max,
+                'tempo': exercise.get('tempo'),
+                'rest_seconds': parse_rest_seconds(exercise['rest_time']) if exercise.get('rest_time') else None,
+                'duration_minutes': exercise.get('estimated_duration'),
+                'calories_burned': exercise.get('calories_burned'),
+                'substituted_for': exercise.get('substituted_for'),
+            })
+            yield row
+
+
+class RowWriter(ABC):
+    """Writes batches of export rows to one output file"""
+
+    @abstractmethod
+    def write_batch(self, rows: List[Dict]):
+        """Write one batch of rows"""
+
+    @abstractmethod
+    def close(self):
+        """Flush and close the output file"""
+
+
+class CsvRowWriter(RowWriter):
+    def __init__(self, path: str):
+        self._file = open(path, 'w', encoding='utf-8', newline='')
+        self._writer = csv.DictWriter(self._file, fieldnames=list(EXPORT_COLUMNS))
+        self._writer.writeheader()
+
+    def write_batch(self, rows: List[Dict]):
+        self._writer.writerows(rows)
+
+    def close(self):
+        self._file.close()
+
+
+class ArrowRowWriter(RowWriter):
+    """Parquet (one row group per batch) or Arrow IPC file (one record batch per batch)"""
+
+    def __init__(self, path: str, export_format: str):
+        types = {'string': pa.string(), 'int': pa.int64(), 'float': pa.float64()}
+        self.schema = pa.schema([(column, types[kind]) for column, kind in EXPORT_COLUMNS.items()])
+        if export_format == 'parquet':
+            self._writer = pq.ParquetWriter(path, self.schema)
+        else:
+            self._sink = pa.OSFile(path, 'wb')
+            self._writer = pa.ipc.new_file(self._sink, self.schema)
+
+    def write_batch(self, rows: List[Dict]):
+        batch = pa.RecordBatch.from_pylist(rows, schema=self.schema)
+        if isinstance(self._writer, pq.ParquetWriter):
+            self._writer.write_table(pa.Table.from_batches([batch]))
+        else:
+            self._writer.write_batch(batch)
+
+    def close(self):
+        self._writer.close()
+        if not isinstance(self._writer, pq.ParquetWriter):
+            self._sink.close()
+
+
+def open_writer(path: str, export_format: str) -> RowWriter:
+    if export_format == 'csv':
+        return CsvRowWriter(path)
+    if export_format not in ('parquet', 'arrow'):
+        raise ValueError(f"Unknown export format '{export_format}', expected 'parquet', 'arrow' or 'csv'")
+    if pa is None:
+        raise ImportError(f"{export_format} export requires the 'pyarrow' package")
+    return ArrowRowWriter(path, export_format)
+
+
+def export_plans(plans: Iterable[Dict], path: str, export_format: str,
+                 batch_rows: int = EXPORT_BATCH_ROWS) -> Dict:
+    """
+    Stream plans into an export file, holding at most batch_rows rows in memory.
+
+    Args:
+        plans: Plans as {'plan_key', 'source', 'profile': canonical profile, 'days'}
+        path: Output file
+        export_format: 'parquet', 'arrow' or 'csv'
+        batch_rows: Rows buffered before each write
+
+    Returns:
+        Summary with plans and rows written
+    """
+    writer = open_writer(path, export_format)
+    summary = {'plans': 0, 'rows': 0}
+    batch = []
+    try:
+        for plan in plans:
+            summary['plans'] += 1
+            for row in exercise_rows(plan):
+                batch.append(row)
+                if len(batch) >= batch_rows:
+                    writer.write_batch(batch)
+                    summary['rows'] += len(batch)
+                    batch = []
+        if batch:
+            writer.write_batch(batch)
+            summary['rows'] += len(batch)
+    finally:
+        writer.close()
+    return summary
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Export stored plans with one row per exercise")
+    parser.add_argument("output", help="Output file, the format follows its extension unless --format is given")
+    parser.add_argument("--format", choices=['parquet', 'arrow', 'csv'], help="Output format")
+    parser.add_argument("--input", nargs='+', metavar="PLANS_JSONL",
+                        help="Export plans from these files instead of the shared state")
+    parser.add_argument("--batch-rows", type=int, default=EXPORT_BATCH_ROWS, help="Rows buffered per write")
+    args = parser.parse_args()
+
+    output = args.output
+    export_format = args.format or FORMAT_EXTENSIONS.get(os.path.splitext(output)[1].lower(), 'parquet')
+    if export_format != 'csv' and pa is None:
+        output = os.path.splitext(output)[0] + '.csv'
+        print(f"pyarrow is not installed, writing CSV to {output}", file=sys.stderr)
+        export_format = 'csv'
+
+    start_time = time.perf_counter()
+    plans = iter_plan_files(args.input) if args.input else iter_stored_plans()
+    summary = export_plans(plans, output, export_format, args.batch_rows)
+    print(f"Exported {summary['rows']} exercises from {summary['plans']} plans to {output} "
+          f"({export_format}) in {time.perf_counter() - start_time:.1f}s")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,99 @@
+"""
+Cancellation of in-flight generations whose requester has gone away.
+
+A CancelToken is set by the UI (Cancel button or other rerun, session closed) or
+the API (client disconnected) and checked by WorkoutPlanGenerator before each model
+call and by streaming backends between chunks, so abandoned calls stop instead of
+running to completion. The token's periodic check can also run a poll callback on
+the generating thread; the UI uses it as a Streamlit yield point, so a rerun (the
+Cancel button) or stop request interrupts the generation and is then re-raised.
+"""
+import time
+import threading
+import contextvars
+from contextlib import contextmanager
+from typing import Callable, Optional
+from streamlit.runtime.scriptrunner import RerunException, StopException
+from config import CANCEL_DISCONNECT_GRACE, CANCEL_LIVENESS_INTERVAL
+
+_current_token = contextvars.ContextVar('current_cancel_token', default=None)
+
+
+class GenerationCancelled(Exception):
+    """A generation was cancelled; carries the tokens already spent on the interrupted call"""
+
+    def __init__(self, reason: str, model: Optional[str] = None, input_tokens: int = 0, output_tokens: int = 0):
+        super().__init__(f"Generation cancelled ({reason})")
+        self.reason = reason
+        self.model = model
+        self.input_tokens = input_tokens
+        self.output_tokens = output_tokens
+
+
+class CancelToken:
+    """Cancellation flag for one generation, optionally tied to the liveness of its requester"""
+
+    def __init__(self, liveness: Optional[Callable[[], bool]] = None, poll: Optional[Callable[[], None]] = None,
+                 grace: float = CANCEL_DISCONNECT_GRACE):
+        self.liveness = liveness
+        self.poll = poll
+        self.grace = grace
+        self.reason = None
+        self.interruption = None
+        self._event = threading.Event()
+        self._dead_since = None
+        self._last_check = 0.0
+
+    def cancel(self, reason: str = 'cancelled'):
+        if not self._event.is_set():
+            self.reason = reason
+            self._event.set()
+
+    def is_cancelled(self) -> bool:
+        """Whether the generation should stop; a requester gone for longer than grace cancels it"""
+        if self._event.is_set():
+            return True
+        now = time.monotonic()
+        if now - self._last_check < CANCEL_LIVENESS_INTERVAL:
+            return False
+        self._last_check = now
+        if self.poll is not None:
+            try:
+                self.poll()
+            except (RerunException, StopException) as e:
+                # Streamlit's rerun and stop requests, kept to re-raise once the call is closed
+                self.interruption = e
+                self.cancel('interrupted')
+                return True
+        if self.liveness is not None:
+            if self.liveness():
+                self._dead_since = None
+            elif self._dead_since is None:
+                self._dead_since = now
+            elif now - self._dead_since >= self.grace:
+                self.cancel('session_closed')
+        return self._event.is_set()
+
+    def raise_if_cancelled(self):
+        if self.is_cancelled():
+            raise GenerationCancelled(self.reason)
+
+    def raise_interruption(self):
+        """Re-raise the request that interrupted the generation from poll, if any"""
+        if self.interruption is not None:
+            raise self.interruption
+
+
+def current_token() -> Optional[CancelToken]:
+    """Token of the generation running on this thread, None when it cannot be cancelled"""
+    return _current_token.get()
+
+
+@contextmanager
+def cancellation_scope(token: CancelToken):
+    """Make token the current one for the model calls made inside"""
+    context_token = _current_token.set(token)
+    try:
+        yield token
+    finally:
+        _current_token.reset(context_token)
@@ -0,0 +1,138 @@
+"""
+Profile canonicalization for the shared plan cache.
+
+Profiles that should get the same plan map to the same key: multiselects are
+sorted and lowercased, free text is normalized and empty answers dropped, and
+age, weight and height are bucketed into bands. Weight is returned separately
+because calories are personalized locally on a cache hit.
+
+Report the hit-rate on recorded traffic (one form_data JSON object per line) with:
+    python canonical_profile.py traffic.jsonl
+"""
+import re
+import sys
+import json
+import hashlib
+from typing import Dict, Iterable, Optional, Tuple
+from exercise_library import parse_avoid_terms
+from config import AGE_BANDS, WEIGHT_BAND_KG, HEIGHT_BAND_CM, EMPTY_TEXT_VALUES
+
+WHITESPACE_PATTERN = re.compile(r'\s+')
+
+MULTISELECT_FIELDS = ['target_areas', 'available_equipment', 'workout_preferences']
+TEXT_FIELDS = ['health_limitations', 'additional_notes']
+# Fields the cached plan does not depend on, applied to it on every hit instead
+PERSONAL_FIELDS = ['name', 'weight']
+
+
+def normalize_text(value) -> str:
+    """Lowercase and collapse whitespace, mapping 'None'-style answers to empty"""
+    text = WHITESPACE_PATTERN.sub(' ', str(value or '')).strip().lower().rstrip('.!')
+    return '' if text in EMPTY_TEXT_VALUES else text
+
+
+def normalize_multiselect(values) -> list:
+    if isinstance(values, str):
+        values = values.split(',')
+    return sorted({normalize_text(value) for value in values or []} - {''})
+
+
+def age_band(age) -> str:
+    """Band label for an age, e.g. '30-39', using AGE_BANDS lower bounds"""
+    age = int(age)
+    if age < AGE_BANDS[0]:
+        return f"<{AGE_BANDS[0]}"
+    for lower, upper in zip(AGE_BANDS, AGE_BANDS[1:]):
+        if age < upper:
+            return f"{lower}-{upper - 1}"
+    return f"{AGE_BANDS[-1]}+"
+
+
+def band(value, width: float) -> Optional[str]:
+    """Fixed-width band label for a measurement, e.g. 70 kg in 10 kg bands -> '70-80'"""
+    if value in (None, ''):
+        return None
+    lower = int(float(value) // width * width)
+    return f"{lower}-{lower + int(width)}"
+
+
+def canonicalize_profile(user_data: Dict) -> Tuple[Dict, Dict]:
+    """
+    Split a profile into its canonical plan-shaping form and the fields personalized locally.
+
+    Args:
+        user_data: Form data as collected by the UI or API
+
+    Returns:
+        Tuple of (canonical profile, personal fields)
+    """
+    training_days = user_data.get('training_days_per_week', user_data.get('weekly_frequency'))
+    session_duration = user_data.get('session_duration', user_data.get('duration_per_session'))
+    canonical = {
+        'fitness_level': normalize_text(user_data.get('fitness_level')),
+        'goal': normalize_text(user_data.get('goal')),
+        'training_days_per_week': int(training_days),
+        'session_duration': int(session_duration),
+        'gender': normalize_text(user_data.get('gender')),
+        'age': age_band(user_data['age']) if user_data.get('age') is not None else None,
+        'weight': band(user_data.get('weight'), WEIGHT_BAND_KG),
+        'height': band(user_data.get('height'), HEIGHT_BAND_CM),
+        'exercises_to_avoid': sorted(set(parse_avoid_terms(normalize_text(user_data.get('exercises_to_avoid'))))),
+        'generation_mode': user_data.get('generation_mode') or 'detailed',
+    }
+    for field in MULTISELECT_FIELDS:
+        canonical[field] = normalize_multiselect(user_data.get(field))
+    for field in TEXT_FIELDS:
+        canonical[field] = normalize_text(user_data.get(field))
+
+    personal = {field: user_data.get(field) for field in PERSONAL_FIELDS}
+    return canonical, personal
+
+
+def profile_cache_key(user_data: Dict) -> Tuple[str, Dict]:
+    """Stable cache key for a profile plus the personal fields to apply to a cached plan"""
+    canonical, personal = canonicalize_profile(user_data)
+    encoded = json.dumps(canonical, sort_keys=True).encode('utf-8')
+    return hashlib.sha256(encoded).hexdigest()[:32], personal
+
+
+def exact_cache_key(user_data: Dict) -> str:
+    """Key of the raw profile, for comparison with the canonical key"""
+    encoded = json.dumps(user_data, sort_keys=True, default=str).encode('utf-8')
+    return hashlib.sha256(encoded).hexdigest()[:32]
+
+
+def replay_hit_rate(profiles: Iterable[Dict]) -> Dict:
+    """Replay recorded profiles through an empty cache, comparing exact and canonical keys"""
+    seen_exact, seen_canonical = set(), set()
+    requests = exact_hits = canonical_hits = 0
+    for profile in profiles:
+        requests += 1
+        exact_key = exact_cache_key(profile)
+        canonical_key, _ = profile_cache_key(profile)
+        exact_hits += exact_key in seen_exact
+        canonical_hits += canonical_key in seen_canonical
+        seen_exact.add(exact_key)
+        seen_canonical.add(canonical_key)
+    return {
+        'requests': requests,
+        'exact_keys': len(seen_exact),
+        'canonical_keys': len(seen_canonical),
+        'exact_hit_rate': exact_hits / requests if requests else 0.0,
+        'canonical_hit_rate': canonical_hits / requests if requests else 0.0,
+    }
+
+
+def main():
+    if len(sys.argv) != 2:
+        print("Usage: python canonical_profile.py traffic.jsonl", file=sys.stderr)
+        sys.exit(2)
+    with open(sys.argv[1], encoding='utf-8') as traffic:
+        report = replay_hit_rate(json.loads(line) for line in traffic if line.strip())
+    print(f"Requests:        {report['requests']}")
+    print(f"Exact keys:      {report['exact_keys']} (hit rate {report['exact_hit_rate']:.1%})")
+    print(f"Canonical keys:  {report['canonical_keys']} (hit rate {report['canonical_hit_rate']:.1%})")
+
+
+if __name__ == "__main__":
+    main()
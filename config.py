@@ -2,6 +2,156 @@
 GPT4O_INPUT_COST_PER_MILLION = 2.5  # $2.5 per 1M input tokens
 GPT4O_OUTPUT_COST_PER_MILLION = 10.0  # $10.0 per 1M output tokens
 
+# Model registry: per-model pricing (per 1M tokens) and the request complexity it is routed for
+DEFAULT_MODEL = "gpt-4o"
+MODEL_REGISTRY = {
+    "gpt-4o": {
+        "label": "GPT-4o",
+        "input_cost_per_million": GPT4O_INPUT_COST_PER_MILLION,
+        "output_cost_per_million": GPT4O_OUTPUT_COST_PER_MILLION,
+        "tier": "complex"
+    },
+    "gpt-4o-mini": {
+        "label": "GPT-4o mini",
+        "input_cost_per_million": 0.15,
+        "output_cost_per_million": 0.6,
+        "tier": "simple"
+    },
+    # Self-hosted OpenAI-compatible server, no per-token cost
+    "local": {
+        "label": "Self-hosted",
+        "input_cost_per_million": 0.0,
+        "output_cost_per_million": 0.0,
+        "tier": "complex"
+    }
+}
+
+# Generation backend, selected with the GENERATION_BACKEND environment variable ("openai" or "local").
+# The local backend talks to any OpenAI-compatible server (vLLM, llama.cpp, Ollama, ...) and is
+# configured with the environment variables below.
+DEFAULT_BACKEND = "openai"
+LOCAL_BACKEND_DEFAULTS = {
+    "LOCAL_LLM_BASE_URL": "http://localhost:8001/v1",
+    "LOCAL_LLM_MODEL": "local-model",
+    "LOCAL_LLM_API_KEY": "",
+    "LOCAL_LLM_JSON_MODE": "true",
+    "LOCAL_LLM_STREAMING": "true",
+    "LOCAL_LLM_USAGE_REPORTING": "true"
+}
+# Set GENERATION_CASSETTE to a file to record the backend's completions there (GENERATION_CASSETTE_MODE=record)
+# or to replay them without calling a model (the default mode), e.g. for prompt evaluations
+DEFAULT_CASSETTE_MODE = "replay"
+
+# Requests with at most this many training days and no limitations are routed to "simple" tier models
+ROUTING_SIMPLE_MAX_DAYS = 4
+# Number of recent calls per model kept for latency stats, and seconds before a sample is aged out
+LATENCY_WINDOW = 50
+LATENCY_MAX_AGE = 900
+# Share of simple requests sent to a simple tier model even when it looks slower, so its stats stay fresh
+ROUTING_EXPLORATION_RATE = 0.05
+
+# Output token prediction for max_tokens: tokens per exercise field by generation mode, fields per
+# catalog exercise, per-day and per-plan JSON overhead, session minutes per main exercise plus the
+# warm-up / cool-down exercises, and the headroom and bounds applied to the prediction
+OUTPUT_TOKENS_PER_FIELD = {"detailed": 12, "catalog": 6}
+CATALOG_EXERCISE_FIELDS = 4
+OUTPUT_TOKENS_PER_DAY = 40
+OUTPUT_TOKENS_PER_PLAN = 20
+MINUTES_PER_EXERCISE = 7
+WARMUP_COOLDOWN_EXERCISES = 2
+MAX_TOKENS_HEADROOM = 1.5
+MAX_TOKENS_FLOOR = 512
+MAX_TOKENS_CEILING = 16384
+
+# Roster mode: most profiles packed into one model call; a roster is also split so that its
+# predicted output, with headroom, stays under MAX_TOKENS_CEILING
+ROSTER_MAX_MEMBERS = 6
+
+# Targeted plan edits: longest accepted edit instruction, and the predicted output tokens of the
+# JSON Patch response (a few operations, far below a full plan)
+EDIT_MAX_INSTRUCTION_CHARS = 500
+EDIT_OUTPUT_TOKENS = 300
+
+# Spend budgets in USD, overridable with the environment variables of the same name (0 disables):
+# per browser session, and per day across all replicas through the shared usage ledger
+SESSION_SPEND_BUDGET = 0.50
+DAILY_SPEND_BUDGET = 25.0
+
+# Cancellation of abandoned generations: seconds a session may be disconnected before its generation
+# is cancelled (covers reconnects), and how often a running generation checks for cancellation
+CANCEL_DISCONNECT_GRACE = 5.0
+CANCEL_LIVENESS_INTERVAL = 0.5
+
+# Structured event log: level, queued events before new ones are dropped, fraction of requests whose
+# prompt and response are logged in full, and profile fields never logged verbatim (age, weight and
+# height are logged as bands)
+LOG_LEVEL = "INFO"
+LOG_QUEUE_SIZE = 10000
+LOG_PAYLOAD_SAMPLE_RATE = 0.01
+REDACTED_FIELDS = ['name', 'health_limitations', 'exercises_to_avoid', 'additional_notes']
+
+# Bulk analytics export: rows buffered in memory before each write to the output file
+EXPORT_BATCH_ROWS = 10000
+
+# Headless API: worker threads for blocking model calls, queued requests before 503, request size and job retention
+API_WORKERS = 8
+API_MAX_PENDING = 64
+API_MAX_BODY_BYTES = 1024 * 1024
+
+# Shared state: "local" keeps it in-process, "redis" shares it across replicas through REDIS_URL
+DEFAULT_STATE_BACKEND = "local"
+STATE_KEY_PREFIX = "workout"
+# Seconds to keep cached plans, job records, in-flight claims and daily usage ledgers
+PLAN_CACHE_TTL = 7 * 24 * 3600
+JOB_TTL = 24 * 3600
+INFLIGHT_TTL = 180
+INFLIGHT_POLL_INTERVAL = 0.5
+# A job is resumed elsewhere only once its replica stops renewing its claim, every JOB_HEARTBEAT_INTERVAL seconds
+JOB_CLAIM_TTL = 60
+JOB_HEARTBEAT_INTERVAL = 15
+USAGE_LEDGER_TTL = 90 * 24 * 3600
+
+# Profile canonicalization: age band lower bounds, weight/height band widths and answers treated as empty
+AGE_BANDS = [18, 40, 60]
+WEIGHT_BAND_KG = 20
+HEIGHT_BAND_CM = 25
+EMPTY_TEXT_VALUES = {"", "none", "n/a", "na", "no", "nothing", "nil", "-"}
+
+# Nearest-neighbour plan reuse: minimum cosine similarity for the closest stored plan of another profile
+# to be adapted locally instead of generating (PLAN_REUSE_SIMILARITY environment variable, above 1 disables),
+# neighbours tried per request, weight of each profile feature and seconds between syncs of plans indexed
+# by other replicas
+PLAN_REUSE_SIMILARITY = 0.9
+PLAN_REUSE_CANDIDATES = 3
+PLAN_INDEX_WEIGHTS = {
+    'available_equipment': 1.0,
+    'target_areas': 1.0,
+    'workout_preferences': 1.0,
+    'session_duration': 2.0,
+    'gender': 0.5,
+    'age': 0.5,
+    'weight': 0.25,
+    'height': 0.25,
+}
+PLAN_INDEX_SYNC_INTERVAL = 60
+
+# Warm pool: plans pre-generated off-peak for the most requested level/goal/days/duration combinations
+WARM_POOL_OFF_PEAK_HOURS = (1, 6)  # Local hours [start, end)
+WARM_POOL_TOKEN_BUDGET = 200000
+WARM_POOL_MAX_PLANS = 50
+WARM_POOL_MIN_REQUESTS = 3
+WARM_POOL_LOOKBACK_DAYS = 7
+WARM_POOL_TTL = 7 * 24 * 3600
+WARM_POOL_CHECK_INTERVAL = 900
+# Person-specific fields for warm plans, calories are recomputed from the requester's weight
+WARM_POOL_BASE_PROFILE = {
+    'name': '',
+    'age': 30,
+    'gender': 'other',
+    'weight': 70,
+    'height': 170,
+}
+
 # Streamlit page configuration
 PAGE_CONFIG = {
     "page_title": "AI Workout Plan Generator",
@@ -31,6 +181,28 @@ FITNESS_LEVEL_DESCRIPTIONS = {
     "Advanced": "Experienced with complex exercises and training principles"
 }
 
+# Multi-week program options
+PROGRAM_WEEK_OPTIONS = [1, 4, 6, 8, 12]
+
+# Progression rules applied locally to later weeks of a program
+# rep_step: reps added per build week, max_rep_increase: reps added before a set is added instead,
+# max_sets: cap on working sets, deload_every: every Nth week is a deload,
+# deload_volume: fraction of base sets kept in a deload week
+PROGRESSION_SETTINGS = {
+    "Beginner": {"rep_step": 1, "max_rep_increase": 3, "max_sets": 4, "deload_every": 4, "deload_volume": 0.6},
+    "Intermediate": {"rep_step": 1, "max_rep_increase": 2, "max_sets": 5, "deload_every": 4, "deload_volume": 0.6},
+    "Advanced": {"rep_step": 1, "max_rep_increase": 2, "max_sets": 6, "deload_every": 3, "deload_volume": 0.5}
+}
+
+# Session duration fitting: allowed deviation from session_duration as a fraction,
+# and the set / rest (seconds) bounds the local fitter may adjust within per level
+DURATION_TOLERANCE = 0.15
+DURATION_FIT_BOUNDS = {
+    "Beginner": {"min_sets": 1, "max_sets": 4, "min_rest": 45, "max_rest": 120},
+    "Intermediate": {"min_sets": 2, "max_sets": 5, "min_rest": 30, "max_rest": 90},
+    "Advanced": {"min_sets": 2, "max_sets": 6, "min_rest": 20, "max_rest": 90}
+}
+
 # Gender options
 GENDER_OPTIONS = ["Male", "Female", "Other"]
 
@@ -0,0 +1,126 @@
+import re
+from typing import Dict, List, Optional
+from config import DURATION_FIT_BOUNDS, DURATION_TOLERANCE
+from utils import calculate_calories_burned, estimate_exercise_duration
+
+NUMBER_PATTERN = re.compile(r'\d+')
+REST_STEP_SECONDS = 15
+FIXED_TYPES = ('warm', 'cool', 'stretch', 'mobility', 'flexibility')
+MAX_FIT_STEPS = 200
+
+
+def parse_rest_seconds(rest_time) -> int:
+    """Parse a rest time like '60s', '90 seconds' or '2 min' into seconds"""
+    rest_str = str(rest_time).lower()
+    match = NUMBER_PATTERN.search(rest_str)
+    if not match:
+        return 60
+    value = int(match.group())
+    return value * 60 if 'min' in rest_str else value
+
+
+def day_duration(day_data: Dict) -> float:
+    """Sum of estimated exercise durations for a day, in minutes"""
+    return round(sum(exercise.get('estimated_duration', 0) for exercise in day_data['exercises']), 2)
+
+
+def is_within_tolerance(duration: float, target_minutes: float, tolerance: float = DURATION_TOLERANCE) -> bool:
+    """Check whether a day's duration is close enough to the session duration"""
+    return abs(duration - target_minutes) <= target_minutes * tolerance
+
+
+def _refresh_exercise(exercise: Dict, weight_kg: Optional[float]):
+    """Recompute duration and calories after sets or rest were changed"""
+    exercise['estimated_duration'] = estimate_exercise_duration(
+        exercise['total_sets'],
+        exercise.get('reps') or '10',
+        exercise.get('rest_time') or '60s'
+    )
+    if weight_kg:
+        exercise['calories_burned'] = calculate_calories_burned(
+            exercise.get('exercise_name', ''),
+            weight_kg,
+            exercise['estimated_duration'],
+            exercise.get('exercise_type', '')
+        )
+
+
+def _adjust_once(exercises: List[Dict], bounds: Dict, too_long: bool) -> Optional[Dict]:
+    """
+    Make the single smallest useful adjustment and return the exercise changed.
+
+    Rest is tightened (or extended) in REST_STEP_SECONDS steps before sets are changed,
+    starting with the longest exercise when shortening and the shortest when lengthening.
+    """
+    ordered = sorted(exercises, key=lambda exercise: exercise.get('estimated_duration', 0), reverse=too_long)
+
+    for exercise in ordered:
+        rest_seconds = parse_rest_seconds(exercise.get('rest_time', '60s'))
+        if too_long and rest_seconds - REST_STEP_SECONDS >= bounds['min_rest']:
+            exercise['rest_time'] = f"{rest_seconds - REST_STEP_SECONDS}s"
+            return exercise
+        if not too_long and rest_seconds + REST_STEP_SECONDS <= bounds['max_rest']:
+            exercise['rest_time'] = f"{rest_seconds + REST_STEP_SECONDS}s"
+            return exercise
+
+    for exercise in ordered:
+        total_sets = exercise.get('total_sets', 1)
+        if too_long and total_sets > bounds['min_sets']:
+            exercise['total_sets'] = total_sets - 1
+            return exercise
+        if not too_long and total_sets < bounds['max_sets']:
+            exercise['total_sets'] = total_sets + 1
+            return exercise
+
+    return None
+
+
+def fit_day_duration(day_data: Dict, target_minutes: float, fitness_level: str,
+                     weight_kg: Optional[float] = None) -> bool:
+    """
+    Adjust sets and rest of a day's main exercises until it matches the session duration.
+
+    Warm-up, cooldown and stretching work is left untouched. The day is updated in place,
+    starting with fresh estimates so timed sets count as their work time.
+
+    Returns:
+        True if the day is within tolerance of target_minutes afterwards
+    """
+    bounds = DURATION_FIT_BOUNDS.get(fitness_level, DURATION_FIT_BOUNDS["Beginner"])
+    adjustable = [
+        exercise for exercise in day_data['exercises']
+        if not any(kind in str(exercise.get('exercise_type', '')).lower() for kind in FIXED_TYPES)
+    ]
+
+    for exercise in day_data['exercises']:
+        _refresh_exercise(exercise, weight_kg)
+    duration = day_duration(day_data)
+    for _ in range(MAX_FIT_STEPS):
+        if is_within_tolerance(duration, target_minutes):
+            return True
+        too_long = duration > target_minutes
+        changed = _adjust_once(adjustable, bounds, too_long)
+        if changed is None:
+            return False
+        previous = changed['estimated_duration']
+        _refresh_exercise(changed, weight_kg)
+        duration += changed['estimated_duration'] - previous
+
+    return is_within_tolerance(duration, target_minutes)
+
+
+def fit_plan_durations(days_data: List[Dict], user_data: Dict) -> List[int]:
+    """
+    Check every day against session_duration and fix misses locally.
+
+    Returns:
+        Day numbers that could not be fitted within the level's set and rest bounds
+    """
+    target_minutes = user_data.get('session_duration', user_data.get('duration_per_session'))
+    if not target_minutes:
+        return []
+
+    return [
+        day_data['day'] for day_data in days_data
+        if not fit_day_duration(day_data, target_minutes, user_data.get('fitness_level', ''), user_data.get('weight'))
+    ]
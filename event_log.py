@@ -0,0 +1,160 @@
+"""
+Structured event log for the generation path.
+
+Events are JSON lines on stderr, one per stage of a request (cache lookup, model
+call, parse, repair, ...), correlated by request_id. Callers only build a LogRecord
+and put it on a bounded queue; formatting and writing happen on a listener thread,
+and events are dropped rather than blocking when the queue is full. Full prompt and
+response payloads are logged for a sampled fraction of requests only, rendered
+from a profile with personal fields redacted or banded.
+"""
+import os
+import sys
+import json
+import time
+import uuid
+import queue
+import random
+import atexit
+import logging
+import contextvars
+from contextlib import contextmanager
+from datetime import datetime, timezone
+from functools import lru_cache
+from logging.handlers import QueueHandler, QueueListener
+from typing import Callable, Dict, Optional
+from canonical_profile import age_band, band
+from config import (
+    LOG_LEVEL, LOG_QUEUE_SIZE, LOG_PAYLOAD_SAMPLE_RATE, REDACTED_FIELDS, WEIGHT_BAND_KG, HEIGHT_BAND_CM
+)
+
+LOGGER_NAME = "workout"
+REDACTED = "[redacted]"
+
+# Request the current thread is working on: {'request_id': ..., 'sampled': bool, 'user_data': profile}
+_current_request = contextvars.ContextVar('current_request', default=None)
+
+
+class JsonFormatter(logging.Formatter):
+    """One JSON object per event: timestamp, level, event name and its fields"""
+
+    def format(self, record: logging.LogRecord) -> str:
+        entry = {
+            'ts': datetime.fromtimestamp(record.created, timezone.utc).isoformat(timespec='milliseconds'),
+            'level': record.levelname.lower(),
+            'event': record.msg,
+        }
+        entry.update(getattr(record, 'fields', {}))
+        return json.dumps(entry, ensure_ascii=False, default=str)
+
+
+class DroppingQueueHandler(QueueHandler):
+    """Queue handler that never blocks the caller: events are dropped and counted when the queue is full"""
+
+    def __init__(self, log_queue: queue.Queue):
+        super().__init__(log_queue)
+        self.dropped = 0
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        # Records carry their fields as a dict, formatting is left to the listener thread
+        return record
+
+    def enqueue(self, record: logging.LogRecord):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+
+
+@lru_cache(maxsize=None)
+def get_logger() -> logging.Logger:
+    """Process-wide event logger, writing through a background listener thread"""
+    log_queue = queue.Queue(maxsize=LOG_QUEUE_SIZE)
+    stream_handler = logging.StreamHandler(sys.stderr)
+    stream_handler.setFormatter(JsonFormatter())
+    listener = QueueListener(log_queue, stream_handler)
+    listener.start()
+    # Flush queued events on interpreter exit
+    atexit.register(listener.stop)
+
+    logger = logging.getLogger(LOGGER_NAME)
+    logger.setLevel(os.getenv('LOG_LEVEL', LOG_LEVEL).upper())
+    logger.addHandler(DroppingQueueHandler(log_queue))
+    logger.propagate = False
+    return logger
+
+
+def payload_sample_rate() -> float:
+    return float(os.getenv('LOG_PAYLOAD_SAMPLE_RATE', LOG_PAYLOAD_SAMPLE_RATE))
+
+
+def redact_profile(user_data: Dict) -> Dict:
+    """Copy of a profile safe to log: free-text personal fields redacted, body measurements banded"""
+    redacted = dict(user_data)
+    for field in REDACTED_FIELDS:
+        if redacted.get(field):
+            redacted[field] = REDACTED
+    if redacted.get('age') is not None:
+        redacted['age'] = age_band(redacted['age'])
+    redacted['weight'] = band(redacted.get('weight'), WEIGHT_BAND_KG)
+    redacted['height'] = band(redacted.get('height'), HEIGHT_BAND_CM)
+    return redacted
+
+
+def redact_text(text: str, user_data: Optional[Dict]) -> str:
+    """Replace verbatim occurrences of the profile's free-text personal fields in text"""
+    for field in REDACTED_FIELDS:
+        value = str((user_data or {}).get(field) or '').strip()
+        if len(value) > 1:
+            text = text.replace(value, REDACTED)
+    return text
+
+
+@contextmanager
+def request_context(user_data: Optional[Dict] = None, request_id: Optional[str] = None):
+    """Correlate the events logged inside with one request, deciding once whether its payloads are sampled"""
+    token = _current_request.set({
+        'request_id': request_id or uuid.uuid4().hex[:16],
+        'sampled': random.random() < payload_sample_rate(),
+        'user_data': user_data,
+    })
+    try:
+        yield _current_request.get()
+    finally:
+        _current_request.reset(token)
+
+
+def log_event(event: str, level: int = logging.INFO, payload: Optional[Callable[[], Dict]] = None, **fields):
+    """
+    Log one event with its fields, tagged with the current request id.
+
+    Args:
+        event: Event name, e.g. 'model_call'
+        level: Logging level
+        payload: Callable returning large fields (prompt, response), only called for sampled
+            requests; string values are redacted against the request's profile
+        **fields: Small JSON-serializable fields logged with every event
+    """
+    logger = get_logger()
+    if not logger.isEnabledFor(level):
+        return
+    request = _current_request.get()
+    if request is not None:
+        fields['request_id'] = request['request_id']
+        if payload is not None and request['sampled']:
+            for name, value in payload().items():
+                fields[name] = redact_text(value, request['user_data']) if isinstance(value, str) else value
+    logger.log(level, event, extra={'fields': fields})
+
+
+@contextmanager
+def log_stage(stage: str, **fields):
+    """Log a stage with its duration, as 'ok' or 'error' depending on how the block exits"""
+    start_time = time.perf_counter()
+    try:
+        yield fields
+    except Exception as e:
+        log_event(stage, logging.WARNING, status='error', error=f"{type(e).__name__}: {e}",
+                  duration_ms=round((time.perf_counter() - start_time) * 1000, 2), **fields)
+        raise
+    log_event(stage, status='ok', duration_ms=round((time.perf_counter() - start_time) * 1000, 2), **fields)
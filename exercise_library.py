@@ -0,0 +1,445 @@
+import re
+from functools import lru_cache
+from typing import Dict, Iterable, List, Optional, Set, Tuple
+from utils import calculate_calories_burned
+
+# Exercise catalog aligned with EQUIPMENT_OPTIONS and TARGET_AREA_OPTIONS in config.py
+# Columns: (id, name, exercise_type, equipment required (all of), muscle groups (primary first),
+#           target muscles description, aliases)
+# An empty equipment tuple means the exercise needs only bodyweight
+EXERCISE_CATALOG = [
+    # Chest
+    ("barbell_bench_press", "Barbell Bench Press", "Compound", ("Barbells",), ("Chest", "Arms"), "Chest, Triceps, Front Delts", ("bench press", "flat bench press")),
+    ("dumbbell_bench_press", "Dumbbell Bench Press", "Compound", ("Dumbbells",), ("Chest", "Arms"), "Chest, Triceps, Front Delts", ("dumbbell press", "db bench press")),
+    ("incline_dumbbell_press", "Incline Dumbbell Press", "Compound", ("Dumbbells",), ("Chest", "Shoulders"), "Upper Chest, Front Delts, Triceps", ("incline press", "incline bench press")),
+    ("chest_press_machine", "Machine Chest Press", "Compound", ("Gym Machine",), ("Chest", "Arms"), "Chest, Triceps", ("chest press", "seated chest press")),
+    ("band_chest_press", "Resistance Band Chest Press", "Compound", ("Resistance Bands",), ("Chest", "Arms"), "Chest, Triceps", ("band chest press", "banded chest press")),
+    ("push_up", "Push-Up", "Compound", (), ("Chest", "Arms", "Core"), "Chest, Triceps, Core", ("push up", "pushup", "push ups", "pushups")),
+    ("knee_push_up", "Knee Push-Up", "Compound", (), ("Chest", "Arms"), "Chest, Triceps", ("modified push up", "kneeling push up")),
+    ("stability_ball_push_up", "Stability Ball Push-Up", "Compound", ("Stability Ball",), ("Chest", "Core"), "Chest, Triceps, Core", ("ball push up",)),
+    ("dumbbell_fly", "Dumbbell Fly", "Isolation", ("Dumbbells",), ("Chest",), "Chest", ("chest fly", "dumbbell flye", "flyes")),
+    ("cable_fly", "Cable Fly", "Isolation", ("Gym Machine",), ("Chest",), "Chest", ("cable crossover", "pec deck", "machine fly")),
+    ("band_chest_fly", "Resistance Band Chest Fly", "Isolation", ("Resistance Bands",), ("Chest",), "Chest", ("band fly",)),
+    # Back
+    ("deadlift", "Barbell Deadlift", "Compound", ("Barbells",), ("Back", "Legs", "Glutes"), "Lower Back, Hamstrings, Glutes", ("deadlift", "conventional deadlift")),
+    ("barbell_row", "Barbell Bent-Over Row", "Compound", ("Barbells",), ("Back", "Arms"), "Lats, Rhomboids, Biceps", ("barbell row", "bent over row")),
+    ("dumbbell_row", "Single-Arm Dumbbell Row", "Compound", ("Dumbbells",), ("Back", "Arms"), "Lats, Rhomboids, Biceps", ("dumbbell row", "one arm dumbbell row", "db row")),
+    ("pull_up", "Pull-Up", "Compound", ("Pull-up Bar",), ("Back", "Arms"), "Lats, Biceps, Upper Back", ("pull up", "pullup", "pull ups")),
+    ("chin_up", "Chin-Up", "Compound", ("Pull-up Bar",), ("Back", "Arms"), "Lats, Biceps", ("chin up", "chinup")),
+    ("lat_pulldown", "Lat Pulldown", "Compound", ("Gym Machine",), ("Back", "Arms"), "Lats, Biceps", ("lat pull down", "pulldown")),
+    ("seated_cable_row", "Seated Cable Row", "Compound", ("Gym Machine",), ("Back", "Arms"), "Mid Back, Lats, Biceps", ("cable row", "seated row")),
+    ("band_row", "Resistance Band Row", "Compound", ("Resistance Bands",), ("Back", "Arms"), "Mid Back, Lats, Biceps", ("band row", "banded row")),
+    ("superman", "Superman Hold", "Isolation", (), ("Back", "Glutes"), "Lower Back, Glutes", ("superman", "supermans", "back extension")),
+    ("dumbbell_pullover", "Dumbbell Pullover", "Isolation", ("Dumbbells",), ("Back", "Chest"), "Lats, Chest", ("pullover",)),
+    # Shoulders
+    ("overhead_press", "Barbell Overhead Press", "Compound", ("Barbells",), ("Shoulders", "Arms"), "Delts, Triceps", ("overhead press", "military press", "barbell shoulder press")),
+    ("dumbbell_shoulder_press", "Dumbbell Shoulder Press", "Compound", ("Dumbbells",), ("Shoulders", "Arms"), "Delts, Triceps", ("shoulder press", "seated dumbbell press", "dumbbell overhead press")),
+    ("arnold_press", "Arnold Press", "Compound", ("Dumbbells",), ("Shoulders",), "Front and Side Delts", ("arnold press",)),
+    ("kettlebell_press", "Kettlebell Overhead Press", "Compound", ("Kettlebells",), ("Shoulders", "Arms"), "Delts, Triceps", ("kettlebell press",)),
+    ("machine_shoulder_press", "Machine Shoulder Press", "Compound", ("Gym Machine",), ("Shoulders", "Arms"), "Delts, Triceps", ("machine press",)),
+    ("pike_push_up", "Pike Push-Up", "Compound", (), ("Shoulders", "Arms"), "Delts, Triceps", ("pike push up", "pike pushup")),
+    ("lateral_raise", "Dumbbell Lateral Raise", "Isolation", ("Dumbbells",), ("Shoulders",), "Side Delts", ("lateral raise", "side raise", "lateral raises")),
+    ("band_lateral_raise", "Resistance Band Lateral Raise", "Isolation", ("Resistance Bands",), ("Shoulders",), "Side Delts", ("band lateral raise",)),
+    ("face_pull", "Band Face Pull", "Isolation", ("Resistance Bands",), ("Shoulders", "Back"), "Rear Delts, Upper Back", ("face pull", "face pulls")),
+    # Arms
+    ("dumbbell_curl", "Dumbbell Bicep Curl", "Isolation", ("Dumbbells",), ("Arms",), "Biceps", ("bicep curl", "biceps curl", "dumbbell curl")),
+    ("barbell_curl", "Barbell Curl", "Isolation", ("Barbells",), ("Arms",), "Biceps", ("barbell bicep curl",)),
+    ("hammer_curl", "Hammer Curl", "Isolation", ("Dumbbells",), ("Arms",), "Biceps, Forearms", ("hammer curl",)),
+    ("band_curl", "Resistance Band Curl", "Isolation", ("Resistance Bands",), ("Arms",), "Biceps", ("band curl", "band bicep curl")),
+    ("overhead_tricep_extension", "Overhead Dumbbell Tricep Extension", "Isolation", ("Dumbbells",), ("Arms",), "Triceps", ("tricep extension", "overhead tricep extension", "triceps extension")),
+    ("cable_pushdown", "Cable Tricep Pushdown", "Isolation", ("Gym Machine",), ("Arms",), "Triceps", ("tricep pushdown", "triceps pushdown", "rope pushdown")),
+    ("band_pushdown", "Resistance Band Tricep Pushdown", "Isolation", ("Resistance Bands",), ("Arms",), "Triceps", ("band pushdown", "band tricep pushdown")),
+    ("bench_dip", "Bench Dip", "Compound", (), ("Arms", "Chest"), "Triceps, Chest", ("tricep dip", "triceps dip", "chair dip", "dips")),
+    ("diamond_push_up", "Diamond Push-Up", "Compound", (), ("Arms", "Chest"), "Triceps, Chest", ("diamond push up", "close grip push up")),
+    # Core
+    ("plank", "Plank", "Isolation", (), ("Core",), "Core, Shoulders", ("plank", "planks", "front plank", "forearm plank")),
+    ("side_plank", "Side Plank", "Isolation", (), ("Core",), "Obliques, Core", ("side plank",)),
+    ("crunch", "Crunch", "Isolation", (), ("Core",), "Abdominals", ("crunch", "crunches", "sit up", "sit ups")),
+    ("bicycle_crunch", "Bicycle Crunch", "Isolation", (), ("Core",), "Abdominals, Obliques", ("bicycle crunch", "bicycle crunches")),
+    ("dead_bug", "Dead Bug", "Isolation", (), ("Core",), "Deep Core, Abdominals", ("dead bug", "dead bugs")),
+    ("bird_dog", "Bird Dog", "Isolation", (), ("Core", "Back"), "Core, Lower Back", ("bird dog", "bird dogs")),
+    ("russian_twist", "Russian Twist", "Isolation", (), ("Core",), "Obliques", ("russian twist", "russian twists")),
+    ("hanging_leg_raise", "Hanging Leg Raise", "Isolation", ("Pull-up Bar",), ("Core",), "Lower Abdominals, Hip Flexors", ("hanging leg raise", "leg raise")),
+    ("stability_ball_crunch", "Stability Ball Crunch", "Isolation", ("Stability Ball",), ("Core",), "Abdominals", ("ball crunch", "swiss ball crunch")),
+    # Legs
+    ("barbell_back_squat", "Barbell Back Squat", "Compound", ("Barbells",), ("Legs", "Glutes"), "Quads, Glutes, Hamstrings", ("back squat", "barbell squat", "squat", "squats")),
+    ("goblet_squat", "Dumbbell Goblet Squat", "Compound", ("Dumbbells",), ("Legs", "Glutes"), "Quads, Glutes", ("goblet squat", "dumbbell squat")),
+    ("kettlebell_goblet_squat", "Kettlebell Goblet Squat", "Compound", ("Kettlebells",), ("Legs", "Glutes"), "Quads, Glutes", ("kettlebell squat",)),
+    ("bodyweight_squat", "Bodyweight Squat", "Compound", (), ("Legs", "Glutes"), "Quads, Glutes", ("air squat", "bodyweight squats", "air squats")),
+    ("band_squat", "Resistance Band Squat", "Compound", ("Resistance Bands",), ("Legs", "Glutes"), "Quads, Glutes", ("band squat", "banded squat")),
+    ("leg_press", "Leg Press", "Compound", ("Gym Machine",), ("Legs", "Glutes"), "Quads, Glutes", ("leg press", "machine leg press")),
+    ("walking_lunge", "Walking Lunge", "Compound", (), ("Legs", "Glutes"), "Quads, Glutes, Hamstrings", ("lunge", "lunges", "walking lunges", "forward lunge")),
+    ("dumbbell_lunge", "Dumbbell Reverse Lunge", "Compound", ("Dumbbells",), ("Legs", "Glutes"), "Quads, Glutes", ("dumbbell lunge", "reverse lunge")),
+    ("step_up", "Step-Up", "Compound", (), ("Legs", "Glutes"), "Quads, Glutes", ("step up", "step ups", "box step up")),
+    ("bulgarian_split_squat", "Bulgarian Split Squat", "Compound", (), ("Legs", "Glutes"), "Quads, Glutes", ("split squat", "bulgarian split squats")),
+    ("romanian_deadlift", "Barbell Romanian Deadlift", "Compound", ("Barbells",), ("Legs", "Glutes", "Back"), "Hamstrings, Glutes", ("romanian deadlift", "rdl")),
+    ("dumbbell_romanian_deadlift", "Dumbbell Romanian Deadlift", "Compound", ("Dumbbells",), ("Legs", "Glutes", "Back"), "Hamstrings, Glutes", ("dumbbell rdl",)),
+    ("leg_extension", "Leg Extension", "Isolation", ("Gym Machine",), ("Legs",), "Quads", ("leg extension", "leg extensions")),
+    ("leg_curl", "Lying Leg Curl", "Isolation", ("Gym Machine",), ("Legs",), "Hamstrings", ("leg curl", "hamstring curl")),
+    ("stability_ball_hamstring_curl", "Stability Ball Hamstring Curl", "Isolation", ("Stability Ball",), ("Legs", "Glutes"), "Hamstrings, Glutes", ("ball hamstring curl", "ball leg curl")),
+    ("wall_sit", "Wall Sit", "Isolation", (), ("Legs",), "Quads", ("wall sit", "wall squat")),
+    ("calf_raise", "Standing Calf Raise", "Isolation", (), ("Legs",), "Calves", ("calf raise", "calf raises")),
+    # Glutes
+    ("glute_bridge", "Glute Bridge", "Isolation", (), ("Glutes", "Legs"), "Glutes, Hamstrings", ("glute bridge", "hip bridge", "bridges")),
+    ("band_glute_bridge", "Banded Glute Bridge", "Isolation", ("Resistance Bands",), ("Glutes",), "Glutes, Hip Abductors", ("band glute bridge",)),
+    ("hip_thrust", "Barbell Hip Thrust", "Compound", ("Barbells",), ("Glutes", "Legs"), "Glutes, Hamstrings", ("hip thrust", "hip thrusts")),
+    ("dumbbell_hip_thrust", "Dumbbell Hip Thrust", "Compound", ("Dumbbells",), ("Glutes", "Legs"), "Glutes, Hamstrings", ("dumbbell hip thrust",)),
+    ("donkey_kick", "Donkey Kick", "Isolation", (), ("Glutes",), "Glutes", ("donkey kick", "donkey kicks")),
+    ("band_lateral_walk", "Band Lateral Walk", "Isolation", ("Resistance Bands",), ("Glutes",), "Glute Medius, Hip Abductors", ("lateral band walk", "monster walk")),
+    # Full body and cardio
+    ("kettlebell_swing", "Kettlebell Swing", "Compound", ("Kettlebells",), ("Full Body", "Glutes", "Back"), "Glutes, Hamstrings, Core", ("kettlebell swing", "kb swing", "kettlebell swings")),
+    ("dumbbell_thruster", "Dumbbell Thruster", "Compound", ("Dumbbells",), ("Full Body", "Legs", "Shoulders"), "Quads, Glutes, Shoulders", ("thruster", "thrusters")),
+    ("burpee", "Burpee", "Cardio", (), ("Full Body",), "Full Body", ("burpee", "burpees")),
+    ("jumping_jack", "Jumping Jacks", "Cardio", (), ("Full Body",), "Full Body", ("jumping jack", "jumping jacks", "star jumps")),
+    ("high_knees", "High Knees", "Cardio", (), ("Full Body", "Legs"), "Hip Flexors, Quads, Calves", ("high knee", "high knees")),
+    ("mountain_climber", "Mountain Climbers", "Cardio", (), ("Full Body", "Core"), "Core, Shoulders, Hip Flexors", ("mountain climber", "mountain climbers")),
+    ("squat_jump", "Squat Jump", "Cardio", (), ("Full Body", "Legs"), "Quads, Glutes, Calves", ("jump squat", "jump squats", "squat jumps")),
+    ("shadow_boxing", "Shadow Boxing", "Cardio", (), ("Full Body", "Shoulders"), "Shoulders, Core", ("shadow boxing",)),
+    ("rowing_machine", "Rowing Machine", "Cardio", ("Gym Machine",), ("Full Body", "Back"), "Back, Legs, Arms", ("rowing", "rower", "row machine", "indoor rowing")),
+    ("treadmill_run", "Treadmill Run", "Cardio", ("Gym Machine",), ("Full Body", "Legs"), "Legs, Cardiovascular System", ("treadmill", "running", "jogging", "treadmill jog")),
+    ("stationary_bike", "Stationary Bike", "Cardio", ("Gym Machine",), ("Full Body", "Legs"), "Legs, Cardiovascular System", ("cycling", "bike", "exercise bike", "spin bike")),
+    # Warm-up
+    ("arm_circles", "Arm Circles", "Warm-up", (), ("Shoulders", "Full Body"), "Shoulders", ("arm circle", "arm circles")),
+    ("leg_swings", "Leg Swings", "Warm-up", (), ("Legs", "Full Body"), "Hips, Hamstrings", ("leg swing", "leg swings")),
+    ("hip_circles", "Hip Circles", "Warm-up", (), ("Glutes", "Full Body"), "Hips", ("hip circle", "hip circles")),
+    ("inchworm", "Inchworm", "Warm-up", (), ("Full Body", "Core"), "Hamstrings, Core, Shoulders", ("inchworm", "inchworms")),
+    ("march_in_place", "March in Place", "Warm-up", (), ("Full Body",), "Legs, Cardiovascular System", ("marching", "march in place", "light cardio")),
+    ("band_pull_apart", "Band Pull-Apart", "Warm-up", ("Resistance Bands",), ("Shoulders", "Back"), "Rear Delts, Upper Back", ("band pull apart", "pull aparts")),
+    ("worlds_greatest_stretch", "World's Greatest Stretch", "Warm-up", (), ("Full Body", "Legs"), "Hips, Thoracic Spine, Hamstrings", ("worlds greatest stretch",)),
+    # Cooldown and flexibility
+    ("childs_pose", "Child's Pose", "Cooldown", (), ("Back", "Full Body"), "Lower Back, Hips", ("child pose", "childs pose")),
+    ("hamstring_stretch", "Seated Hamstring Stretch", "Cooldown", (), ("Legs",), "Hamstrings", ("hamstring stretch", "seated forward fold", "forward fold")),
+    ("quad_stretch", "Standing Quad Stretch", "Cooldown", (), ("Legs",), "Quads", ("quad stretch", "quadriceps stretch")),
+    ("chest_stretch", "Doorway Chest Stretch", "Cooldown", (), ("Chest", "Shoulders"), "Chest, Front Delts", ("chest stretch", "doorway stretch")),
+    ("cobra_stretch", "Cobra Stretch", "Cooldown", (), ("Core", "Back"), "Abdominals, Lower Back", ("cobra", "cobra pose", "cobra stretch")),
+    ("pigeon_pose", "Pigeon Pose", "Flexibility", (), ("Glutes", "Legs"), "Glutes, Hip Flexors", ("pigeon pose", "pigeon stretch")),
+    ("cat_cow", "Cat-Cow", "Flexibility", (), ("Back", "Core"), "Spine, Core", ("cat cow", "cat camel")),
+    ("downward_dog", "Downward Dog", "Flexibility", (), ("Full Body", "Legs"), "Hamstrings, Calves, Shoulders", ("downward dog", "down dog")),
+    ("triceps_stretch", "Overhead Triceps Stretch", "Cooldown", (), ("Arms", "Shoulders"), "Triceps, Shoulders", ("tricep stretch", "triceps stretch")),
+]
+
+BREATHING_PATTERNS = {
+    "Compound": "Exhale on exertion, inhale on the return",
+    "Isolation": "Exhale on exertion, inhale on the return",
+    "Cardio": "Steady, rhythmic breathing",
+    "Warm-up": "Breathe naturally and steadily",
+    "Cooldown": "Slow, deep breaths; exhale into the stretch",
+    "Flexibility": "Slow, deep breaths; exhale into the stretch",
+}
+
+# Keywords used to infer equipment from free-text 'equipment_required' values
+EQUIPMENT_KEYWORDS = {
+    "Dumbbells": ("dumbbell",),
+    "Barbells": ("barbell", "ez bar"),
+    "Kettlebells": ("kettlebell",),
+    "Resistance Bands": ("band",),
+    "Pull-up Bar": ("pull-up bar", "pullup bar", "pull up bar", "chin-up bar"),
+    "Gym Machine": ("machine", "cable", "treadmill", "rower", "bike", "smith", "leg press"),
+    "Stability Ball": ("stability ball", "swiss ball", "exercise ball"),
+}
+
+# Keywords used to infer the primary muscle group from 'target_muscle_group' text
+MUSCLE_KEYWORDS = {
+    "Chest": ("chest", "pec"),
+    "Back": ("back", "lat", "rhomboid", "trap"),
+    "Shoulders": ("shoulder", "delt"),
+    "Arms": ("bicep", "tricep", "arm", "forearm"),
+    "Core": ("core", "ab", "oblique"),
+    "Glutes": ("glute",),
+    "Legs": ("quad", "hamstring", "calf", "calves", "leg"),
+    "Full Body": ("full body", "total body", "cardio"),
+}
+
+EXERCISE_TYPES = ("Compound", "Isolation", "Cardio", "Warm-up", "Cooldown", "Flexibility")
+
+# Default tempo for catalog exercises, the compact catalog format does not carry one
+DEFAULT_TEMPOS = {
+    "Compound": "2-1-2",
+    "Isolation": "2-1-2",
+}
+
+NON_WORD_PATTERN = re.compile(r'[^a-z0-9]+')
+AVOID_SPLIT_PATTERN = re.compile(r'[,;\n/]|\band\b|\bor\b')
+
+
+def normalize_name(name: str) -> str:
+    """Normalize an exercise name for matching: lowercase, no punctuation, singular words"""
+    words = NON_WORD_PATTERN.sub(' ', str(name).lower()).split()
+    return ' '.join(word[:-1] if len(word) > 3 and word.endswith('s') and not word.endswith('ss') else word
+                    for word in words)
+
+
+def normalize_exercise_type(exercise_type: str) -> str:
+    """Map a free-text exercise type onto the catalog's exercise types"""
+    type_lower = str(exercise_type).lower()
+    if 'warm' in type_lower:
+        return "Warm-up"
+    if 'cool' in type_lower:
+        return "Cooldown"
+    if 'flex' in type_lower or 'stretch' in type_lower or 'mobility' in type_lower or 'yoga' in type_lower:
+        return "Flexibility"
+    if 'cardio' in type_lower or 'hiit' in type_lower or 'plyo' in type_lower:
+        return "Cardio"
+    if 'isolation' in type_lower:
+        return "Isolation"
+    return "Compound"
+
+
+def infer_equipment(equipment_text: str) -> Set[str]:
+    """Infer the EQUIPMENT_OPTIONS an exercise needs from its free-text equipment field"""
+    text = str(equipment_text).lower()
+    return {option for option, keywords in EQUIPMENT_KEYWORDS.items()
+            if any(keyword in text for keyword in keywords)}
+
+
+def infer_muscle_group(target_text: str) -> str:
+    """Infer the primary TARGET_AREA_OPTIONS muscle group from free-text target muscles"""
+    text = str(target_text).lower()
+    best_group, best_position = "Full Body", len(text) + 1
+    for group, keywords in MUSCLE_KEYWORDS.items():
+        for keyword in keywords:
+            position = text.find(keyword)
+            if 0 <= position < best_position:
+                best_group, best_position = group, position
+    return best_group
+
+
+def matches_avoid_terms(names: Iterable[str], avoid_terms: List[str]) -> bool:
+    """Check whether any normalized name contains an avoid term as whole words"""
+    return any(f' {term} ' in f' {name} ' for term in avoid_terms for name in names)
+
+
+def parse_avoid_terms(exercises_to_avoid: str) -> List[str]:
+    """Split the free-text 'exercises to avoid' field into normalized terms"""
+    if not exercises_to_avoid or str(exercises_to_avoid).strip().lower() in ('none', 'n/a', 'na'):
+        return []
+    terms = (normalize_name(term) for term in AVOID_SPLIT_PATTERN.split(str(exercises_to_avoid).lower()))
+    return [term for term in terms if term]
+
+
+class ExerciseLibrary:
+    """Exercise catalog indexed by name alias, equipment, muscle group and exercise type"""
+
+    def __init__(self, catalog: Iterable[Tuple] = EXERCISE_CATALOG):
+        self.exercises = {}
+        self.alias_index = {}
+        self.equipment_index = {}
+        self.muscle_index = {}
+        self.type_index = {}
+        self.bucket_index = {}
+
+        for exercise_id, name, exercise_type, equipment, muscles, target, aliases in catalog:
+            entry = {
+                'id': exercise_id,
+                'exercise_name': name,
+                'exercise_type': exercise_type,
+                'equipment': frozenset(equipment),
+                'muscle_groups': muscles,
+                'equipment_required': ', '.join(equipment) or 'Bodyweight',
+                'target_muscle_group': target,
+                'breathing_pattern': BREATHING_PATTERNS.get(exercise_type, BREATHING_PATTERNS["Compound"]),
+                'aliases': tuple(normalize_name(alias) for alias in (name,) + tuple(aliases)),
+            }
+            self.exercises[exercise_id] = entry
+
+            for alias in entry['aliases']:
+                self.alias_index.setdefault(alias, exercise_id)
+            for option in equipment or ("Bodyweight Only",):
+                self.equipment_index.setdefault(option, []).append(exercise_id)
+            for muscle in muscles:
+                self.muscle_index.setdefault(muscle, []).append(exercise_id)
+            self.type_index.setdefault(exercise_type, []).append(exercise_id)
+            # Substitution buckets are keyed by primary muscle group and exercise type
+            self.bucket_index.setdefault((muscles[0], exercise_type), []).append(exercise_id)
+
+    def get(self, exercise_id: str) -> Optional[Dict]:
+        """Look up a catalog entry by id"""
+        return self.exercises.get(exercise_id)
+
+    def find(self, exercise_name: str) -> Optional[Dict]:
+        """Look up a catalog entry by exercise name or alias"""
+        exercise_id = self.alias_index.get(normalize_name(exercise_name))
+        return self.exercises.get(exercise_id) if exercise_id else None
+
+    def by_equipment(self, equipment: str) -> List[Dict]:
+        """Catalog entries usable with the given EQUIPMENT_OPTIONS value"""
+        return [self.exercises[exercise_id] for exercise_id in self.equipment_index.get(equipment, [])]
+
+    def by_muscle_group(self, muscle_group: str) -> List[Dict]:
+        """Catalog entries working the given TARGET_AREA_OPTIONS value"""
+        return [self.exercises[exercise_id] for exercise_id in self.muscle_index.get(muscle_group, [])]
+
+    def by_type(self, exercise_type: str) -> List[Dict]:
+        """Catalog entries of the given exercise type"""
+        return [self.exercises[exercise_id] for exercise_id in self.type_index.get(exercise_type, [])]
+
+    def is_allowed(self, entry: Dict, available_equipment: Optional[Set[str]], avoid_terms: List[str]) -> bool:
+        """Check a catalog entry against the user's equipment and avoid list"""
+        if available_equipment is not None and not entry['equipment'] <= available_equipment:
+            return False
+        return not matches_avoid_terms(entry['aliases'], avoid_terms)
+
+    def find_substitute(self, muscle_group: str, exercise_type: str, available_equipment: Optional[Set[str]],
+                        avoid_terms: List[str], exclude: Set[str] = frozenset()) -> Optional[Dict]:
+        """Find an allowed catalog exercise for the same muscle group and exercise type"""
+        fallback_keys = [(muscle_group, exercise_type)]
+        if exercise_type in ("Compound", "Isolation"):
+            fallback_keys.append((muscle_group, "Isolation" if exercise_type == "Compound" else "Compound"))
+        fallback_keys.append(("Full Body", exercise_type))
+
+        for key in fallback_keys:
+            for exercise_id in self.bucket_index.get(key, []):
+                entry = self.exercises[exercise_id]
+                if exercise_id not in exclude and self.is_allowed(entry, available_equipment, avoid_terms):
+                    return entry
+        return None
+
+
+@lru_cache(maxsize=None)
+def get_exercise_library() -> ExerciseLibrary:
+    """Shared exercise library, indexed once per process"""
+    return ExerciseLibrary()
+
+
+def get_available_equipment(user_data: Dict) -> Optional[Set[str]]:
+    """Equipment the user has, or None when they did not restrict it"""
+    equipment = user_data.get('available_equipment') or []
+    if not equipment:
+        return None
+    return set(equipment) - {"Bodyweight Only"}
+
+
+def violates_constraints(exercise: Dict, entry: Optional[Dict], available_equipment: Optional[Set[str]],
+                         avoid_terms: List[str]) -> bool:
+    """Check whether a parsed exercise breaks the user's equipment or avoid list"""
+    names = entry['aliases'] if entry else (normalize_name(exercise.get('exercise_name', '')),)
+    if matches_avoid_terms(names, avoid_terms):
+        return True
+    if available_equipment is None:
+        return False
+    required = entry['equipment'] if entry else infer_equipment(exercise.get('equipment_required', ''))
+    return not required <= available_equipment
+
+
+def substitute_exercises(days_data: List[Dict], user_data: Dict,
+                         library: Optional[ExerciseLibrary] = None,
+                         indices: Optional[Iterable[int]] = None) -> List[Dict]:
+    """
+    Swap exercises that use unavailable equipment or are on the avoid list for catalog equivalents.
+
+    Sets, reps, tempo and rest are kept from the original exercise. Days are updated in place.
+    With indices, only exercises at those positions of each day are swapped, though the
+    whole day still counts against duplicate substitutes.
+
+    Returns:
+        List of swaps made, each with day, original and replacement exercise names
+    """
+    library = library or get_exercise_library()
+    available_equipment = get_available_equipment(user_data)
+    avoid_terms = parse_avoid_terms(user_data.get('exercises_to_avoid', ''))
+    if available_equipment is None and not avoid_terms:
+        return []
+
+    swaps = []
+    indices = set(indices) if indices is not None else None
+    for day_data in days_data:
+        used_ids = set()
+        for exercise in day_data['exercises']:
+            entry = library.find(exercise.get('exercise_name', ''))
+            if entry:
+                used_ids.add(entry['id'])
+
+        for index, exercise in enumerate(day_data['exercises']):
+            if indices is not None and index not in indices:
+                continue
+            entry = library.find(exercise.get('exercise_name', ''))
+            if not violates_constraints(exercise, entry, available_equipment, avoid_terms):
+                continue
+
+            muscle_group = entry['muscle_groups'][0] if entry else infer_muscle_group(exercise.get('target_muscle_group', ''))
+            exercise_type = entry['exercise_type'] if entry else normalize_exercise_type(exercise.get('exercise_type', ''))
+            substitute = library.find_substitute(muscle_group, exercise_type, available_equipment, avoid_terms, used_ids)
+            if substitute is None:
+                continue
+
+            used_ids.add(substitute['id'])
+            day_data['exercises'][index] = hydrate_exercise(substitute, exercise, user_data.get('weight'))
+            day_data['exercises'][index]['substituted_for'] = exercise.get('exercise_name', '')
+            swaps.append({
+                'day': day_data['day'],
+                'original': exercise.get('exercise_name', ''),
+                'replacement': substitute['exercise_name']
+            })
+
+    return swaps
+
+
+def hydrate_exercise(entry: Dict, exercise: Dict, weight_kg: Optional[float] = None) -> Dict:
+    """Build a display exercise from a catalog entry, keeping the prescription of 'exercise'"""
+    hydrated = dict(exercise)
+    hydrated.update({
+        'exercise_name': entry['exercise_name'],
+        'exercise_type': entry['exercise_type'],
+        'equipment_required': entry['equipment_required'],
+        'target_muscle_group': entry['target_muscle_group'],
+        'breathing_pattern': entry['breathing_pattern'],
+    })
+    hydrated['calories_burned'] = calculate_calories_burned(
+        hydrated['exercise_name'],
+        weight_kg,
+        hydrated.get('estimated_duration', 0),
+        hydrated['exercise_type']
+    ) if weight_kg else 0.0
+    return hydrated
+
+
+def filter_catalog(user_data: Dict, library: Optional[ExerciseLibrary] = None) -> List[Dict]:
+    """Catalog entries allowed for a user, target areas first, for the catalog-ID prompt"""
+    library = library or get_exercise_library()
+    available_equipment = get_available_equipment(user_data)
+    avoid_terms = parse_avoid_terms(user_data.get('exercises_to_avoid', ''))
+    target_areas = set(user_data.get('target_areas') or [])
+
+    allowed = [entry for entry in library.exercises.values()
+               if library.is_allowed(entry, available_equipment, avoid_terms)]
+    return sorted(allowed, key=lambda entry: not target_areas.intersection(entry['muscle_groups']))
+
+
+def format_catalog(entries: List[Dict]) -> str:
+    """Compact one-line-per-exercise catalog listing: id: type, muscle groups"""
+    return "\n".join(
+        f"{entry['id']}: {entry['exercise_type']}, {'/'.join(entry['muscle_groups'])}" for entry in entries
+    )
+
+
+def expand_catalog_exercise(reference, library: Optional[ExerciseLibrary] = None) -> Dict:
+    """
+    Expand a compact catalog reference into a full exercise object.
+
+    Accepts [id, sets, reps, rest] arrays or {"id", "sets", "reps", "rest"} objects.
+    Unknown ids expand to an exercise without a name, which the parser drops.
+    """
+    library = library or get_exercise_library()
+    if isinstance(reference, dict):
+        exercise_id = reference.get('id')
+        prescription = [reference.get('sets'), reference.get('reps'), reference.get('rest')]
+    else:
+        exercise_id, *prescription = list(reference) or [None]
+        prescription = (prescription + [None, None, None])[:3]
+
+    entry = library.get(str(exercise_id))
+    if entry is None:
+        return {}
+
+    total_sets, reps, rest_time = prescription
+    return {
+        'exercise_name': entry['exercise_name'],
+        'exercise_type': entry['exercise_type'],
+        'equipment_required': entry['equipment_required'],
+        'target_muscle_group': entry['target_muscle_group'],
+        'total_sets': total_sets,
+        'reps': reps,
+        'tempo': DEFAULT_TEMPOS.get(entry['exercise_type'], ''),
+        'rest_time': rest_time,
+        'breathing_pattern': entry['breathing_pattern'],
+    }
@@ -1,13 +1,22 @@
 import streamlit as st
 import time as time_module
-from config import PAGE_CONFIG, GPT4O_INPUT_COST_PER_MILLION, GPT4O_OUTPUT_COST_PER_MILLION
+from config import PAGE_CONFIG
 from models import WorkoutPlanGenerator
-from ui_components import load_css, display_loading_animation, display_form, display_results
-from utils import initialize_session_usage, calculate_token_costs
+from cancellation import GenerationCancelled, cancellation_scope
+from ui_components import (
+    load_css, display_loading_animation, display_form, display_results, display_usage_panel,
+    generation_cancel_token
+)
+from utils import initialize_session_usage
 
 # Set page configuration
 st.set_page_config(**PAGE_CONFIG)
 
+@st.cache_resource
+def get_generator() -> WorkoutPlanGenerator:
+    """Shared generator for the process, built once instead of on every rerun"""
+    return WorkoutPlanGenerator()
+
 def main():
     # Load custom CSS
     load_css()
@@ -15,7 +24,7 @@ def main():
     # Initialize session usage tracking
     initialize_session_usage()
     
-    generator = WorkoutPlanGenerator()
+    generator = get_generator()
     
     # Main Header
     st.markdown("""
@@ -32,15 +41,26 @@ def main():
     # Sidebar configuration
     with st.sidebar:
         st.markdown("### 🔑 OpenAI Configuration")
-        api_key_available = bool(generator.api_key)
-        if api_key_available:
+        api_key_available = generator.is_ready
+        backend = generator.backend
+        if backend.name == "cassette" and not backend.requires_api_key:
+            # Replaying, or recording a self-hosted model: the cassette wrapper has no base_url of its own
+            action = "Replaying" if backend.mode == "replay" else "Recording"
+            st.success(f"✅ {action} cassette {backend.path}")
+        elif not backend.requires_api_key:
+            st.success(f"✅ Using self-hosted model at {backend.base_url}")
+        elif api_key_available:
             st.success("✅ API key loaded from environment")
         else:
             st.warning("⚠️ OPENAI_API_KEY not found")
             api_key = st.text_input("OpenAI API Key:", type="password", 
                                   help="Enter your OpenAI API key.")
             if api_key:
-                generator.set_api_key(api_key)
+                # Keep a user-entered key on a per-session generator, never the shared one
+                session_generator = st.session_state.get('session_generator')
+                if session_generator is None or session_generator.api_key != api_key:
+                    st.session_state.session_generator = WorkoutPlanGenerator(api_key=api_key)
+                generator = st.session_state.session_generator
                 api_key_available = True
                 st.success("✅ API key configured")
         
@@ -61,56 +81,7 @@ def main():
         
         # Token Usage & Cost Tracking
         st.markdown("---")
-        st.markdown("### 💰 Token Usage & Costs")
-        
-        # Token usage dropdown
-        usage_view = st.selectbox(
-            "📊 Usage Information",
-            options=["Latest Request", "Session Total", "Request History"],
-            help="View token usage and cost information"
-        )
-        
-        if usage_view == "Latest Request" and 'latest_usage' in st.session_state:
-            latest = st.session_state.latest_usage
-            st.metric("Input Tokens", f"{latest['input_tokens']:,}")
-            st.metric("Output Tokens", f"{latest['output_tokens']:,}")
-            st.metric("Total Tokens", f"{latest['total_tokens']:,}")
-            st.metric("Input Cost", f"${latest['costs']['input_cost']:.4f}")
-            st.metric("Output Cost", f"${latest['costs']['output_cost']:.4f}")
-            st.metric("Total Cost", f"${latest['costs']['total_cost']:.4f}")
-        
-        elif usage_view == "Session Total" and st.session_state.session_usage['total_requests'] > 0:
-            session = st.session_state.session_usage
-            total_costs = calculate_token_costs(
-                session['total_input_tokens'], 
-                session['total_output_tokens']
-            )
-            
-            st.metric("Total Requests", session['total_requests'])
-            st.metric("Total Input Tokens", f"{session['total_input_tokens']:,}")
-            st.metric("Total Output Tokens", f"{session['total_output_tokens']:,}")
-            st.metric("Total Tokens", f"{session['total_input_tokens'] + session['total_output_tokens']:,}")
-            st.metric("Session Input Cost", f"${total_costs['input_cost']:.4f}")
-            st.metric("Session Output Cost", f"${total_costs['output_cost']:.4f}")
-            st.metric("Session Total Cost", f"${total_costs['total_cost']:.4f}")
-        
-        elif usage_view == "Request History" and st.session_state.session_usage['requests']:
-            st.markdown("**Request History:**")
-            for i, req in enumerate(reversed(st.session_state.session_usage['requests'][-5:])):  # Show last 5
-                with st.expander(f"Request {len(st.session_state.session_usage['requests']) - i}"):
-                    st.write(f"**Time:** {req['timestamp']}")
-                    st.write(f"**Type:** {req['type']}")
-                    st.write(f"**Tokens:** {req['total_tokens']:,} ({req['input_tokens']:,} in + {req['output_tokens']:,} out)")
-                    st.write(f"**Cost:** ${req['total_cost']:.4f}")
-        
-        elif st.session_state.session_usage['total_requests'] == 0:
-            st.info("No usage data yet. Generate a workout plan to see token usage and costs.")
-        
-        # Pricing information
-        st.markdown("---")
-        st.markdown("### 💳 GPT-4o Pricing")
-        st.write(f"**Input:** ${GPT4O_INPUT_COST_PER_MILLION}/1M tokens")
-        st.write(f"**Output:** ${GPT4O_OUTPUT_COST_PER_MILLION}/1M tokens")
+        display_usage_panel()
 
     if not api_key_available:
         st.error("❌ OpenAI API key is required. Please set it in your environment variables or enter it in the sidebar.")
@@ -124,26 +95,37 @@ def main():
         display_form(generator, is_edit=True)
     
     elif st.session_state.page == 'generating':
-        display_loading_animation()
+        if display_loading_animation():
+            st.session_state.page = 'edit' if 'days_data' in st.session_state else 'form'
+            st.rerun()
         
+        # Stops the model call when Cancel is clicked or the session goes away
+        cancel_token = generation_cancel_token(st.empty())
         try:
             # Start timing for workout plan generation
             start_time = time_module.time()
-            workout_plan_json = generator.generate_workout_plan(st.session_state.form_data)
+            with cancellation_scope(cancel_token):
+                workout_plan_json, days_data = generator.create_workout_plan(st.session_state.form_data)
             end_time = time_module.time()
             
             # Store generation time
             st.session_state.generation_time = end_time - start_time
-
-            days_data = generator.parse_workout_plan(workout_plan_json)
             
             st.session_state.workout_plan = workout_plan_json
             st.session_state.days_data = days_data
+            st.session_state.pop('selected_day', None)
+            st.session_state.pop('selected_week', None)
+            st.session_state.pop('last_edit', None)
             st.session_state.page = 'results'
             
             time_module.sleep(1)  # Brief pause to allow user to see success before rerun
             st.rerun()
 
+        except GenerationCancelled:
+            # Let Streamlit carry on with the rerun or stop that interrupted the generation
+            cancel_token.raise_interruption()
+            st.session_state.page = 'form'
+            st.rerun()
         except Exception as e:
             st.error(f"❌ Error: {str(e)}")
             st.session_state.page = 'form'
@@ -151,7 +133,7 @@ def main():
                 st.rerun()
 
     elif st.session_state.page == 'results':
-        display_results()
+        display_results(generator)
 
 if __name__ == "__main__":
     main()
@@ -0,0 +1,93 @@
+import time
+import random
+import threading
+from collections import deque
+from functools import lru_cache
+from typing import Dict, List, Optional
+from config import (
+    DEFAULT_MODEL, LATENCY_WINDOW, LATENCY_MAX_AGE, MODEL_REGISTRY, ROUTING_SIMPLE_MAX_DAYS, ROUTING_EXPLORATION_RATE
+)
+
+
+def is_simple_request(user_data: Dict) -> bool:
+    """Few training days and no limitations, notes or exercises to avoid"""
+    free_text = (user_data.get(field) or '' for field in ('health_limitations', 'exercises_to_avoid', 'additional_notes'))
+    return (
+        int(user_data.get('weekly_frequency', 0)) <= ROUTING_SIMPLE_MAX_DAYS
+        and not any(str(text).strip() for text in free_text)
+    )
+
+
+class ModelRouter:
+    """Routes requests between registry models using request complexity and observed latency"""
+
+    def __init__(self, registry: Dict = MODEL_REGISTRY, default_model: str = DEFAULT_MODEL,
+                 exploration_rate: float = ROUTING_EXPLORATION_RATE):
+        self.registry = registry
+        self.default_model = default_model
+        self.exploration_rate = exploration_rate
+        # model -> (recorded at, seconds, output tokens) of recent calls
+        self._latencies = {model: deque(maxlen=LATENCY_WINDOW) for model in registry}
+        self._lock = threading.Lock()
+
+    def record_latency(self, model: str, seconds: float, output_tokens: int = 0):
+        """Record the wall time and output size of one completed call"""
+        with self._lock:
+            self._latencies.setdefault(model, deque(maxlen=LATENCY_WINDOW)).append(
+                (time.monotonic(), seconds, output_tokens))
+
+    def _recent_samples(self, model: str) -> List[tuple]:
+        """Samples younger than LATENCY_MAX_AGE, dropping older ones"""
+        cutoff = time.monotonic() - LATENCY_MAX_AGE
+        with self._lock:
+            samples = self._latencies.get(model)
+            if samples is None:
+                return []
+            while samples and samples[0][0] < cutoff:
+                samples.popleft()
+            return list(samples)
+
+    def latency_stats(self, model: str) -> Dict[str, Optional[float]]:
+        """Recent call count, p50 and p95 latency in seconds, and p50 seconds per output token for a model"""
+        samples = self._recent_samples(model)
+        if not samples:
+            return {'calls': 0, 'p50': None, 'p95': None, 'p50_per_token': None}
+        seconds = sorted(sample[1] for sample in samples)
+        per_token = sorted(sample[1] / sample[2] for sample in samples if sample[2])
+        return {
+            'calls': len(seconds),
+            'p50': seconds[len(seconds) // 2],
+            'p95': seconds[min(len(seconds) - 1, int(len(seconds) * 0.95))],
+            'p50_per_token': per_token[len(per_token) // 2] if per_token else None,
+        }
+
+    def choose_model(self, user_data: Dict) -> str:
+        """
+        Pick the model for a request.
+
+        Simple requests go to the cheapest "simple" tier model unless its recent p50 latency
+        per output token is worse than the default model's (raw latency would compare small
+        plans with large ones). A few requests go to it regardless, so that a model that was
+        slow for a while is measured again. Everything else uses the default model.
+        """
+        if not is_simple_request(user_data):
+            return self.default_model
+
+        candidates = sorted(
+            (model for model, info in self.registry.items() if info['tier'] == 'simple'),
+            key=lambda model: self.registry[model]['output_cost_per_million']
+        )
+        if candidates and random.random() < self.exploration_rate:
+            return candidates[0]
+        default_per_token = self.latency_stats(self.default_model)['p50_per_token']
+        for model in candidates:
+            per_token = self.latency_stats(model)['p50_per_token']
+            if per_token is None or default_per_token is None or per_token <= default_per_token:
+                return model
+        return self.default_model
+
+
+@lru_cache(maxsize=None)
+def get_model_router() -> ModelRouter:
+    """Shared router so latency stats accumulate across sessions in the process"""
+    return ModelRouter()
@@ -1,28 +1,59 @@
 import os
-import re
+import copy
 import json
-import openai
+import time
 import streamlit as st
-from typing import Dict, List
-from dotenv import load_dotenv
-from utils import update_session_usage, calculate_token_costs,calculate_calories_burned,estimate_exercise_duration
-from config import FITNESS_LEVEL_DESCRIPTIONS
+from functools import lru_cache
+from streamlit.runtime.scriptrunner import get_script_run_ctx
+from typing import Dict, List, Optional, Tuple
+from utils import update_session_usage, calculate_token_costs
+from plan_parser import EXERCISE_SCHEMA, parse_plan, salvage_plan, splice_days, personalize_calories, split_roster
+from exercise_library import filter_catalog, format_catalog, substitute_exercises
+from duration_fit import fit_plan_durations, day_duration
+from warm_pool import track_request, find_warm_plan
+from plan_index import find_similar_plan, index_plan
+from plan_edits import COMPACT_FIELDS, compact_plan, parse_patch, apply_plan_edit
+from model_router import get_model_router
+from backends import GenerationBackend, create_backend, estimate_tokens
+from shared_state import (
+    get_cached_plan, cache_plan, claim_generation, release_generation, wait_for_plan, record_usage,
+    record_cache_lookup, record_cancellation
+)
+from canonical_profile import profile_cache_key, canonicalize_profile
+from cancellation import GenerationCancelled, current_token
+from event_log import request_context, redact_profile, log_event, log_stage
+from token_budget import (
+    BudgetExceededError, predict_output_tokens, max_tokens_for, estimate_call_cost, check_budget, record_prediction,
+    meter_usage
+)
+from config import (
+    DEFAULT_MODEL, FITNESS_LEVEL_DESCRIPTIONS, ROSTER_MAX_MEMBERS, MAX_TOKENS_CEILING, MAX_TOKENS_HEADROOM,
+    EDIT_MAX_INSTRUCTION_CHARS, EDIT_OUTPUT_TOKENS, DURATION_TOLERANCE
+)
 
-# Load environment variables
-load_dotenv()
+SYSTEM_PROMPT = "You are a certified personal trainer and exercise physiologist with over 15 years of experience in creating personalized workout plans. You specialize in strength training, cardiovascular fitness, functional movement, and injury prevention. Always provide specific exercise parameters including sets, reps, tempo, and rest periods. Always respond in valid JSON format."
+
+@lru_cache(maxsize=None)
+def load_environment():
+    """Load environment variables from .env once per process"""
+    from dotenv import load_dotenv
+    load_dotenv()
 
 class WorkoutPlanGenerator:
-    def __init__(self):
-        self.client = None
-        self.api_key = os.getenv('OPENAI_API_KEY')
-        if self.api_key:
-            openai.api_key = self.api_key
-            self.client = openai
+    def __init__(self, api_key: Optional[str] = None, backend: Optional[GenerationBackend] = None):
+        load_environment()
+        self.api_key = api_key or os.getenv('OPENAI_API_KEY')
+        self.backend = backend or create_backend(self.api_key)
+    
+    @property
+    def is_ready(self) -> bool:
+        """Whether the backend has the credentials it needs"""
+        return bool(self.api_key) or not self.backend.requires_api_key
     
     def set_api_key(self, api_key: str):
         """Set OpenAI API key"""
-        openai.api_key = api_key
-        self.client = openai
+        self.api_key = api_key
+        self.backend = create_backend(api_key)
     
     def get_fitness_level_description(self, level: str) -> str:
         """Get fitness level description"""
@@ -142,125 +173,595 @@ Workout Type Distribution for {user_data['weekly_frequency']} days:
         
         return prompt
     
+    def create_catalog_prompt(self, user_data: Dict) -> str:
+        """Create a compact prompt where the model picks exercises by catalog ID"""
+        session_duration = user_data.get('session_duration', user_data['duration_per_session'])
+        catalog_text = format_catalog(filter_catalog(user_data))
+        
+        return f"""Create a {user_data['weekly_frequency']}-day workout plan using ONLY exercises from the catalog below.
+
+PROFILE:
+- Age: {user_data['age']}, Gender: {user_data['gender']}
+- Fitness Level: {user_data['fitness_level']}
+- Goal: {user_data['goal']}
+- Session Duration: {session_duration} minutes
+- Preferred Exercise Types: {', '.join(user_data.get('workout_preferences') or []) or 'Any'}
+- Target Areas: {', '.join(user_data.get('target_areas') or []) or 'Balanced'}
+- Health Limitations: {user_data.get('health_limitations') or 'None'}
+- Additional Notes: {user_data.get('additional_notes') or 'None'}
+
+EXERCISE CATALOG (id: type, muscle groups):
+{catalog_text}
+
+Return JSON where each exercise is [catalog_id, sets, reps, rest]:
+{{"workout_plan": {{"day_1": {{"day_name": "Day 1 - Monday", "workout_type": "Strength Training", "workout_duration": {session_duration}, "exercises": [["goblet_squat", 3, "8-12", "60s"]]}}}}}}
+
+Guidelines:
+- Beginner: 8-12 reps, more rest; Intermediate: 10-15 reps; Advanced: 12-20 reps
+- Start each day with a Warm-up and end with a Cooldown exercise
+- Balance muscle groups across the week and match the session duration"""
+    
+    def build_generation_prompt(self, user_data: Dict) -> str:
+        """Prompt for the profile's generation mode"""
+        if user_data.get('generation_mode') == 'catalog':
+            return self.create_catalog_prompt(user_data)
+        return self.create_prompt(user_data)
+    
+    def estimate_plan_tokens(self, user_data: Dict) -> int:
+        """Expected input + output tokens of generating a plan for user_data, before calling the model"""
+        return estimate_tokens(SYSTEM_PROMPT + self.build_generation_prompt(user_data)) + predict_output_tokens(user_data)
+    
+    def create_repair_prompt(self, user_data: Dict, days_data: List[Dict], missing_days: List[int],
+                             missed_durations: Optional[Dict[int, float]] = None) -> str:
+        """Create a short prompt re-requesting only the missing days, or days (day -> minutes) that missed the duration"""
+        session_duration = user_data.get('session_duration', user_data['duration_per_session'])
+        day_keys = ", ".join(f'"day_{day_number}"' for day_number in missing_days)
+        existing_days = "; ".join(
+            f"Day {day['day']}: {day['workout_type']}" for day in days_data
+        ) or "None"
+        exercise_format = "{" + ", ".join(EXERCISE_SCHEMA) + "}"
+        catalog_text = ""
+        if user_data.get('generation_mode') == 'catalog':
+            exercise_format = "[catalog_id, sets, reps, rest]"
+            catalog_text = f"\n\nEXERCISE CATALOG (use only these ids):\n{format_catalog(filter_catalog(user_data))}"
+        duration_text = ""
+        if missed_durations:
+            misses = ", ".join(f"Day {day_number}: {minutes:.0f} min" for day_number, minutes in sorted(missed_durations.items()))
+            duration_text = (f"\n\nThe previous versions of these days missed the {session_duration}-minute session "
+                             f"(allowed within {DURATION_TOLERANCE:.0%}): {misses}. Choose the number of exercises, "
+                             f"sets and rest so that each day fits.")
+        
+        return f"""Complete a {user_data['weekly_frequency']}-day workout plan. Only these days are missing: {day_keys}.
+
+PROFILE:
+- Fitness Level: {user_data['fitness_level']}
+- Goal: {user_data['goal']}
+- Session Duration: {session_duration} minutes
+- Available Equipment: {', '.join(user_data.get('available_equipment') or []) or 'Any'}
+- Health Limitations: {user_data.get('health_limitations') or 'None'}
+- Exercises to Avoid: {user_data.get('exercises_to_avoid') or 'None'}
+
+EXISTING DAYS (keep the week balanced, do not repeat them): {existing_days}{catalog_text}{duration_text}
+
+Return ONLY the missing days as JSON: {{"workout_plan": {{"day_N": {{"day_name", "workout_type", "workout_duration": {session_duration}, "exercises": [{exercise_format}]}}}}}}
+Include warm-up and cool-down exercises for each day."""
+    
+    def create_roster_member_section(self, member_key: str, user_data: Dict) -> str:
+        """Compact profile of one roster member, without the name"""
+        return f"""
+{member_key}:
+- Age: {user_data['age']}, Gender: {user_data['gender']}, Weight: {user_data.get('weight', 'N/A')}, Height: {user_data.get('height', 'N/A')}
+- Fitness Level: {user_data['fitness_level']}, Goal: {user_data['goal']}
+- Training Days: {user_data['weekly_frequency']}, Session Duration: {user_data.get('session_duration', user_data['duration_per_session'])} minutes
+- Preferred Exercise Types: {', '.join(user_data.get('workout_preferences') or []) or 'Any'}
+- Available Equipment: {', '.join(user_data.get('available_equipment') or []) or 'Any'}
+- Target Areas: {', '.join(user_data.get('target_areas') or []) or 'Balanced'}
+- Health Limitations: {user_data.get('health_limitations') or 'None'}
+- Exercises to Avoid: {user_data.get('exercises_to_avoid') or 'None'}
+- Additional Notes: {user_data.get('additional_notes') or 'None'}
+"""
+    
+    def create_roster_prompt(self, members: List[Dict]) -> Tuple[str, List[str]]:
+        """
+        Create one prompt for several profiles: the shared instructions first, then one section per member.
+        
+        Returns:
+            Tuple of (prompt, member sections), the sections being the per-member part of the prompt
+        """
+        exercise_format = "{" + ", ".join(f'"{field}"' for field in EXERCISE_SCHEMA) + "}"
+        sections = [self.create_roster_member_section(f"member_{position}", user_data)
+                    for position, user_data in enumerate(members, start=1)]
+        
+        prompt = f"""Create a separate personalized workout plan for each member listed below, with exactly as many days as the member's Training Days.
+
+Return the response as JSON keyed by member, then by day:
+{{"roster": {{"member_1": {{"day_1": {{"day_name": "Day 1 - Monday", "workout_type": "Strength Training", "workout_duration": <session duration>, "exercises": [{exercise_format}]}}}}}}}}
+
+Guidelines:
+- Rep ranges by fitness level: Beginner 8-12 reps, lighter weights, more rest; Intermediate 10-15 reps; Advanced 12-20 reps or advanced techniques
+- Start each day with a Warm-up and end with a Cooldown exercise
+- Balance muscle groups across the week, matching the member's goal and preferred exercise types
+- Make the total duration of each day match the member's session duration
+- Use only the member's available equipment and never an exercise they avoid; respect health limitations
+- Include tempo for strength exercises, rest periods and breathing patterns
+- Focus on the member's target areas if specified
+
+MEMBERS:
+""" + "".join(sections)
+        return prompt, sections
+    
+    def create_edit_prompt(self, user_data: Dict, days_data: List[Dict], instruction: str) -> str:
+        """Create a prompt asking for a JSON Patch that applies an edit instruction to the compact plan"""
+        plan_text = json.dumps(compact_plan(days_data), separators=(',', ':'), ensure_ascii=False)
+        
+        return f"""Edit this workout plan as requested, changing as little as possible.
+
+PROFILE:
+- Fitness Level: {user_data['fitness_level']}, Goal: {user_data['goal']}
+- Session Duration: {user_data.get('session_duration', user_data['duration_per_session'])} minutes
+- Available Equipment: {', '.join(user_data.get('available_equipment') or []) or 'Any'}
+- Health Limitations: {user_data.get('health_limitations') or 'None'}
+- Exercises to Avoid: {user_data.get('exercises_to_avoid') or 'None'}
+
+PLAN:
+{plan_text}
+
+REQUEST: {instruction}
+
+Return ONLY an RFC 6902 JSON Patch against PLAN as {{"patch": [operations]}}, e.g.
+{{"patch": [{{"op": "replace", "path": "/day_1/exercises/2", "value": {{"exercise_name": "Step-Up", "exercise_type": "Compound", "equipment_required": "Bodyweight", "target_muscle_group": "Legs", "total_sets": 3, "reps": "10-12", "rest_time": "60s"}}}}]}}
+Exercise objects have exactly these fields: {', '.join(COMPACT_FIELDS)}. Keep the days; do not repeat unchanged exercises."""
+    
+    def _request_completion(self, prompt: str, request_type: str, predicted_tokens: int,
+                            model: str = DEFAULT_MODEL) -> str:
+        """Send a prompt to the given model in JSON mode, capped near its predicted output, and record usage"""
+        return self._complete_prompt(prompt, request_type, predicted_tokens, model)['content']
+    
+    def _complete_prompt(self, prompt: str, request_type: str, predicted_tokens: int,
+                         model: str = DEFAULT_MODEL) -> Dict:
+        """_request_completion returning the backend result: content, model, input_tokens, output_tokens"""
+        # Refuse calls that would overrun the session or daily spend budget before paying for them
+        check_budget(estimate_call_cost(SYSTEM_PROMPT + prompt, predicted_tokens, self.backend.resolve_model(model)))
+        # Abandoned generations stop before their next call, and streaming backends mid-response
+        cancel_token = current_token()
+        if cancel_token is not None:
+            cancel_token.raise_if_cancelled()
+        start_time = time.perf_counter()
+        try:
+            with log_stage('model_call', request_type=request_type) as stage:
+                result = self.backend.complete(
+                    [
+                        {
+                            "role": "system",
+                            "content": SYSTEM_PROMPT
+                        },
+                        {
+                            "role": "user",
+                            "content": prompt
+                        }
+                    ],
+                    model=model,
+                    max_tokens=max_tokens_for(predicted_tokens),
+                    cancel_token=cancel_token,
+                )
+                model = result['model']
+                # Extract token usage information
+                input_tokens = result['input_tokens']
+                output_tokens = result['output_tokens']
+                get_model_router().record_latency(model, time.perf_counter() - start_time, output_tokens)
+                stage.update(model=model, input_tokens=input_tokens, output_tokens=output_tokens,
+                             predicted_output_tokens=predicted_tokens, finish_reason=result.get('finish_reason'))
+        except GenerationCancelled as e:
+            # Tokens generated before the stream was closed are still billed
+            self._record_cancellation(e, request_type, time.perf_counter() - start_time)
+            self._record_usage(e.input_tokens, e.output_tokens, f"{request_type} (cancelled)", e.model)
+            raise
+        log_event('model_response', request_type=request_type, response_chars=len(result['content']),
+                  payload=lambda: {'response': result['content']})
+        record_prediction(request_type, predicted_tokens, output_tokens, result.get('finish_reason'))
+        self._record_usage(input_tokens, output_tokens, request_type, model)
+        # A response that arrived in full is paid for and returned even if the token flipped meanwhile
+        return result
+    
+    def _record_usage(self, input_tokens: int, output_tokens: int, request_type: str, model: str):
+        """Add a call's tokens to the current usage meter, the session usage and the shared ledger"""
+        meter_usage(input_tokens, output_tokens)
+        costs = calculate_token_costs(input_tokens, output_tokens, model)
+        
+        # Add to the ledger shared by all replicas (first: session state access raises once the session is stopping)
+        record_usage(model, request_type, input_tokens, output_tokens, costs['total_cost'])
+        
+        # Outside a browser session (API workers, warm pool) session_state is one process-wide dict
+        if get_script_run_ctx(suppress_warning=True) is None:
+            return
+        
+        # Update session usage tracking
+        update_session_usage(input_tokens, output_tokens, request_type, model)
+        
+        # Store latest usage in session state for display
+        st.session_state.latest_usage = {
+            'model': model,
+            'input_tokens': input_tokens,
+            'output_tokens': output_tokens,
+            'total_tokens': input_tokens + output_tokens,
+            'costs': costs
+        }
+    
+    def _record_cancellation(self, cancelled: GenerationCancelled, request_type: str, occupied_seconds: float):
+        """Track the spend and worker time lost to a cancelled call"""
+        wasted_tokens = cancelled.input_tokens + cancelled.output_tokens
+        wasted_cost = calculate_token_costs(cancelled.input_tokens, cancelled.output_tokens,
+                                            cancelled.model or DEFAULT_MODEL)['total_cost']
+        record_cancellation(cancelled.reason, wasted_tokens, wasted_cost, occupied_seconds)
+        log_event('generation_cancelled', reason=cancelled.reason, request_type=request_type,
+                  wasted_tokens=wasted_tokens, wasted_cost=round(wasted_cost, 6),
+                  occupied_seconds=round(occupied_seconds, 3))
+    
     def generate_workout_plan(self, user_data: Dict) -> str:
-        """Generate workout plan using OpenAI GPT-4o with JSON output"""
+        """Generate workout plan with the routed model, falling back to the default model on schema failure"""
         try:
-            prompt = self.create_prompt(user_data)
-            print(prompt)
-            
-            response = openai.chat.completions.create(
-                model="gpt-4o",
-                messages=[
-                    {
-                        "role": "system",
-                        "content": "You are a certified personal trainer and exercise physiologist with over 15 years of experience in creating personalized workout plans. You specialize in strength training, cardiovascular fitness, functional movement, and injury prevention. Always provide specific exercise parameters including sets, reps, tempo, and rest periods. Always respond in valid JSON format."
-                    },
-                    {
-                        "role": "user",
-                        "content": prompt
-                    }
-                ],
-                response_format={"type": "json_object"},
-            )
-            print(response)
-            # Extract token usage information
-            usage = response.usage
-            input_tokens = usage.prompt_tokens
-            output_tokens = usage.completion_tokens
+            prompt = self.build_generation_prompt(user_data)
+            # Sampled payloads are re-rendered from the redacted profile, never the real one
+            log_event('prompt_built', mode=user_data.get('generation_mode') or 'detailed', prompt_chars=len(prompt),
+                      payload=lambda: {'prompt': self.build_generation_prompt(redact_profile(user_data))})
             
-            # Update session usage tracking
-            update_session_usage(input_tokens, output_tokens, "Workout Plan Generation")
+            model = self.backend.resolve_model(get_model_router().choose_model(user_data))
+            predicted_tokens = predict_output_tokens(user_data)
+            workout_plan_json = self._request_completion(prompt, "Workout Plan Generation", predicted_tokens, model)
             
-            # Store latest usage in session state for display
-            st.session_state.latest_usage = {
-                'input_tokens': input_tokens,
-                'output_tokens': output_tokens,
-                'total_tokens': input_tokens + output_tokens,
-                'costs': calculate_token_costs(input_tokens, output_tokens)   
-            }
+            if model != self.backend.resolve_model(DEFAULT_MODEL):
+                expected_days = range(1, int(user_data['weekly_frequency']) + 1)
+                _, missing_days = salvage_plan(workout_plan_json, expected_days)
+                if missing_days:
+                    workout_plan_json = self._request_completion(prompt, "Workout Plan Generation (fallback)",
+                                                                 predicted_tokens, DEFAULT_MODEL)
             
-            return response.choices[0].message.content
+            return workout_plan_json
         
+        except (BudgetExceededError, GenerationCancelled):
+            raise
         except Exception as e:
             raise Exception(f"Error generating workout plan: {str(e)}")
     
-    def parse_workout_plan(self, workout_plan_json: str) -> List[Dict]:
-        """Parse the JSON workout plan into structured daily workout data"""
+    def repair_workout_plan(self, user_data: Dict, days_data: List[Dict], missing_days: List[int],
+                            missed_durations: Optional[Dict[int, float]] = None) -> List[Dict]:
+        """Re-request only the missing or invalid days (or those that missed the session duration) and splice them in"""
         try:
-            # Parse JSON response
-            workout_data = json.loads(workout_plan_json)
+            prompt = self.create_repair_prompt(user_data, days_data, missing_days, missed_durations)
+            log_event('prompt_built', mode='repair', missing_days=missing_days, prompt_chars=len(prompt),
+                      payload=lambda: {'prompt': self.create_repair_prompt(redact_profile(user_data), days_data,
+                                                                           missing_days, missed_durations)})
+            repair_json = self._request_completion(prompt, "Workout Plan Repair",
+                                                   predict_output_tokens(user_data, len(missing_days)))
+        except GenerationCancelled:
+            raise
+        except Exception as e:
+            raise Exception(f"Error repairing workout plan: {str(e)}")
+        
+        repaired_days, _ = salvage_plan(repair_json, missing_days, user_data.get('weight'))
+        return splice_days(days_data, repaired_days)
+    
+    def fit_workout_durations(self, days_data: List[Dict], user_data: Dict) -> List[Dict]:
+        """Fit each day to the session duration locally, re-requesting only days that cannot be fitted"""
+        unfit_days = fit_plan_durations(days_data, user_data)
+        log_event('duration_fit', unfit_days=unfit_days)
+        if not unfit_days:
+            return days_data
+        
+        kept_days = [day for day in days_data if day['day'] not in unfit_days]
+        # Tell the model how far off each day was, a blind retry has no reason to fit better
+        fitted = {day['day']: day for day in days_data if day['day'] in unfit_days}
+        missed_durations = {day_number: day_duration(day) for day_number, day in fitted.items()}
+        try:
+            refitted = self.repair_workout_plan(user_data, kept_days, unfit_days, missed_durations)
+        except GenerationCancelled:
+            raise
+        except Exception as e:
+            st.warning(f"⚠️ Some days may not match your session duration. {str(e)}")
+            return days_data
+        
+        # Give the regenerated days one local pass, but never loop back to the model
+        regenerated = [day for day in refitted if day['day'] in unfit_days]
+        substitute_exercises(regenerated, user_data)
+        fit_plan_durations(regenerated, user_data)
+        # Keep the locally fitted version of days the model failed to return or did not bring closer
+        target_minutes = user_data.get('session_duration', user_data['duration_per_session'])
+        refitted = [
+            day for day in refitted
+            if day['day'] not in fitted
+            or abs(day_duration(day) - target_minutes) < abs(missed_durations[day['day']] - target_minutes)
+        ]
+        return splice_days(refitted, days_data)
+    
+    def parse_and_repair_workout_plan(self, workout_plan_json: str, user_data: Dict) -> List[Dict]:
+        """Parse a workout plan, salvaging complete days and repairing only the broken ones"""
+        expected_days = range(1, int(user_data['weekly_frequency']) + 1)
+        with log_stage('salvage') as stage:
+            days_data, missing_days = salvage_plan(workout_plan_json, expected_days, user_data.get('weight'))
+            stage.update(recovered_days=len(days_data), missing_days=missing_days)
+        
+        if missing_days:
+            try:
+                days_data = self.repair_workout_plan(user_data, days_data, missing_days)
+            except GenerationCancelled:
+                raise
+            except Exception as e:
+                if not days_data:
+                    raise
+                st.warning(f"⚠️ Showing {len(days_data)} recovered days. {str(e)}")
+        
+        return days_data
+    
+    def prepare_workout_plan(self, workout_plan_json: str, user_data: Dict) -> List[Dict]:
+        """Turn a model response into display-ready days: salvage, substitute locally, fit durations"""
+        # Salvage complete days and re-request only missing ones instead of a full retry
+        days_data = self.parse_and_repair_workout_plan(workout_plan_json, user_data)
+        
+        # Swap exercises that break the equipment or avoid list locally instead of regenerating
+        substitute_exercises(days_data, user_data)
+        
+        # Fit each day to the session duration, only unfixable days go back to the model
+        return self.fit_workout_durations(days_data, user_data)
+    
+    def find_stored_plan(self, user_data: Dict, plan_key: str, personal: Dict) -> Optional[Tuple[str, List[Dict]]]:
+        """A cached, pre-generated or similar profile's plan for user_data, recording the lookup; None on a miss"""
+        cached = get_cached_plan(plan_key)
+        if cached is not None:
+            record_cache_lookup('plan_cache')
+            log_event('plan_lookup', source='plan_cache', plan_key=plan_key)
+            return cached['workout_plan'], personalize_calories(cached['days'], personal['weight'])
+        # Pre-generated plans only need the requester's calories computed
+        warm = find_warm_plan(user_data)
+        if warm is not None:
+            record_cache_lookup('warm_pool')
+            log_event('plan_lookup', source='warm_pool', plan_key=plan_key)
+            return warm
+        # A stored plan of a close enough profile is adapted locally instead of generated
+        similar = find_similar_plan(user_data)
+        if similar is not None:
+            workout_plan_json, days_data, match = similar
+            record_cache_lookup('similar_plan')
+            log_event('plan_lookup', source='similar_plan', plan_key=plan_key, **match)
+            # Repeats of this profile become plain cache hits; adapted plans are not indexed themselves
+            cache_plan(plan_key, workout_plan_json, days_data)
+            return workout_plan_json, days_data
+        return None
+    
+    def create_workout_plan(self, user_data: Dict) -> Tuple[str, List[Dict]]:
+        """Return (model response, display-ready days), reusing a plan cached or in flight on any replica"""
+        with request_context(user_data):
+            track_request(user_data)
+            # Profiles that differ only in banded or personal fields share one cached plan
+            plan_key, personal = profile_cache_key(user_data)
+            stored = self.find_stored_plan(user_data, plan_key, personal)
+            if stored is not None:
+                return stored
             
-            # Extract workout plan data
-            if "workout_plan" in workout_data:
-                plan_data = workout_data["workout_plan"]
-            else:
-                plan_data = workout_data
+            claimed = claim_generation(plan_key)
+            if not claimed:
+                # An equivalent request is already generating, wait for its result
+                cancel_token = current_token()
+                cached = wait_for_plan(plan_key, cancel_token.is_cancelled if cancel_token else None)
+                if cancel_token is not None:
+                    cancel_token.raise_if_cancelled()
+                if cached is not None:
+                    record_cache_lookup('shared_inflight')
+                    log_event('plan_lookup', source='shared_inflight', plan_key=plan_key)
+                    return cached['workout_plan'], personalize_calories(cached['days'], personal['weight'])
             
-            days_data = []
+            record_cache_lookup('miss')
+            log_event('plan_lookup', source='miss', plan_key=plan_key)
             
-            # Process each day
-            for day_key in sorted(plan_data.keys()):
-                day_info = plan_data[day_key]
-                
-                # Extract day number from key
-                day_number = int(re.findall(r'\d+', day_key)[0]) if re.findall(r'\d+', day_key) else len(days_data) + 1
-                
-                day_data = {
-                    'day': day_number,
-                    'title': day_info.get('day_name', f'Day {day_number}'),
-                    'workout_type': day_info.get('workout_type', 'Workout'),
-                    'workout_duration': day_info.get('workout_duration', 0),
-                    'exercises': []
-                }
-                
-                # Process exercises for this day
-                # Inside the exercise loop in parse_workout_plan method
-                for exercise in day_info.get('exercises', []):
-                    # Calculate estimated duration for this exercise
-                    est_duration = estimate_exercise_duration(
-                        exercise.get('total_sets', 1),
-                        exercise.get('reps', '10'),
-                        exercise.get('rest_time', '60s')
-                    )
-                    
-                    # Calculate calories burned (if user weight is available)
-                    calories_burned = 0.0
-                    if 'form_data' in st.session_state and st.session_state.form_data.get('weight'):
-                        weight_kg = st.session_state.form_data['weight']
-                        calories_burned = calculate_calories_burned(
-                            exercise.get('exercise_name', ''),
-                            weight_kg,
-                            est_duration,
-                            exercise.get('exercise_type', '')
-                        )
-                    
-                    exercise_data = {
-                        'exercise_name': exercise.get('exercise_name', ''),
-                        'exercise_type': exercise.get('exercise_type', ''),
-                        'equipment_required': exercise.get('equipment_required', ''),
-                        'target_muscle_group': exercise.get('target_muscle_group', ''),
-                        'total_sets': exercise.get('total_sets', 1),
-                        'reps': exercise.get('reps', ''),
-                        'tempo': exercise.get('tempo', ''),
-                        'rest_time': exercise.get('rest_time', ''),
-                        'weight': exercise.get('weight', ''),
-                        'speed_level': exercise.get('speed_level', ''),
-                        'breathing_pattern': exercise.get('breathing_pattern', ''),
-                        'superset_indicator': exercise.get('superset_indicator', 'None'),
-                        'estimated_duration': est_duration,
-                        'calories_burned': calories_burned
-                    }
-
-                    
-                    # Only add exercise if it has required data
-                    if exercise_data['exercise_name']:
-                        day_data['exercises'].append(exercise_data)
-                
-                # Only add day if it has exercises
-                if day_data['exercises']:
-                    days_data.append(day_data)
+            try:
+                with log_stage('generate', days=int(user_data['weekly_frequency'])):
+                    workout_plan_json = self.generate_workout_plan(user_data)
+                try:
+                    with log_stage('prepare') as stage:
+                        days_data = self.prepare_workout_plan(workout_plan_json, user_data)
+                        stage.update(days=len(days_data))
+                except GenerationCancelled:
+                    # The response is paid for: keep it if it stands without further model calls
+                    self.store_local_plan(plan_key, workout_plan_json, user_data)
+                    raise
+                # Only complete plans are shared, partial ones are regenerated next time
+                if len(days_data) == int(user_data['weekly_frequency']):
+                    self.store_plan(plan_key, workout_plan_json, days_data, user_data)
+            finally:
+                if claimed:
+                    release_generation(plan_key)
+            # Stop for a cancellation that came in after the last call, once the plan is stored for the rerun
+            cancel_token = current_token()
+            if cancel_token is not None:
+                cancel_token.raise_if_cancelled()
+            return workout_plan_json, days_data
+    
+    def store_plan(self, plan_key: str, workout_plan_json: str, days_data: List[Dict], user_data: Dict):
+        """Share a complete plan through the cache and the similarity index"""
+        cache_plan(plan_key, workout_plan_json, days_data, canonicalize_profile(user_data)[0])
+        index_plan(plan_key, user_data)
+    
+    def store_local_plan(self, plan_key: str, workout_plan_json: str, user_data: Dict):
+        """Store a response prepared without the model, if it is complete and every day fits the session"""
+        expected_days = range(1, int(user_data['weekly_frequency']) + 1)
+        days_data, missing_days = salvage_plan(workout_plan_json, expected_days, user_data.get('weight'))
+        if missing_days:
+            return
+        substitute_exercises(days_data, user_data)
+        if not fit_plan_durations(days_data, user_data):
+            self.store_plan(plan_key, workout_plan_json, days_data, user_data)
+    
+    def roster_batches(self, members: List[Dict]) -> List[List[int]]:
+        """Split members (as positions) into rosters of at most ROSTER_MAX_MEMBERS whose output fits MAX_TOKENS_CEILING"""
+        output_limit = MAX_TOKENS_CEILING / MAX_TOKENS_HEADROOM
+        batches = []
+        batch, batch_tokens = [], 0
+        for position, user_data in enumerate(members):
+            predicted_tokens = predict_output_tokens(dict(user_data, generation_mode='detailed'))
+            if batch and (len(batch) >= ROSTER_MAX_MEMBERS or batch_tokens + predicted_tokens > output_limit):
+                batches.append(batch)
+                batch, batch_tokens = [], 0
+            batch.append(position)
+            batch_tokens += predicted_tokens
+        if batch:
+            batches.append(batch)
+        return batches
+    
+    def generate_roster_plans(self, members: List[Dict]) -> Tuple[List[str], List[Dict]]:
+        """
+        Generate plans for several profiles in one model call.
+        
+        Returns:
+            Tuple of (each member's plan text for salvage_plan, each member's share of the call's usage):
+            input tokens split as an equal share of the instructions plus the member's own section,
+            output tokens in proportion to the member's part of the response
+        """
+        # Roster plans are always detailed exercise objects
+        prompt, sections = self.create_roster_prompt(members)
+        predicted_tokens = sum(predict_output_tokens(dict(user_data, generation_mode='detailed'))
+                               for user_data in members)
+        log_event('prompt_built', mode='roster', members=len(members), prompt_chars=len(prompt),
+                  payload=lambda: {'prompt': self.create_roster_prompt([redact_profile(user_data)
+                                                                        for user_data in members])[0]})
+        try:
+            result = self._complete_prompt(prompt, "Roster Plan Generation", predicted_tokens)
+        except (BudgetExceededError, GenerationCancelled):
+            raise
+        except Exception as e:
+            raise Exception(f"Error generating roster plans: {str(e)}")
+        
+        member_keys = [f"member_{position}" for position in range(1, len(members) + 1)]
+        plans = split_roster(result['content'], member_keys)
+        member_plans = [plans[member_key] for member_key in member_keys]
+        
+        prompt_chars = len(SYSTEM_PROMPT) + len(prompt)
+        shared_chars = prompt_chars - sum(len(section) for section in sections)
+        plan_chars = sum(len(plan) for plan in member_plans)
+        usage = []
+        for section, plan in zip(sections, member_plans):
+            input_share = (shared_chars / len(members) + len(section)) / prompt_chars
+            output_share = len(plan) / plan_chars if plan_chars else 1 / len(members)
+            input_tokens = round(result['input_tokens'] * input_share)
+            output_tokens = round(result['output_tokens'] * output_share)
+            usage.append({
+                'model': result['model'],
+                'input_tokens': input_tokens,
+                'output_tokens': output_tokens,
+                'costs': calculate_token_costs(input_tokens, output_tokens, result['model']),
+            })
+        return member_plans, usage
+    
+    def create_roster_plans(self, members: List[Dict]) -> List[Dict]:
+        """
+        Plans for several profiles, generating the ones without a stored plan together in roster calls.
+        
+        Args:
+            members: Form data of each profile
+        
+        Returns:
+            One result per member, in order: {'workout_plan', 'days', 'source', 'usage'}, usage being
+            the member's share of its roster call (None when the plan was not generated by one)
+        """
+        results = [None] * len(members)
+        # Plan key -> positions of the members sharing it, each distinct plan is generated once
+        pending = {}
+        inflight = []
+        claimed = []
+        try:
+            for position, user_data in enumerate(members):
+                track_request(user_data)
+                plan_key, personal = profile_cache_key(user_data)
+                if plan_key in pending:
+                    pending[plan_key].append(position)
+                    continue
+                with request_context(user_data):
+                    stored = self.find_stored_plan(user_data, plan_key, personal)
+                if stored is not None:
+                    results[position] = {'workout_plan': stored[0], 'days': stored[1], 'source': 'stored', 'usage': None}
+                elif claim_generation(plan_key):
+                    claimed.append(plan_key)
+                    pending[plan_key] = [position]
+                else:
+                    # Generating on another request, create_workout_plan waits for it
+                    inflight.append(position)
             
-            return days_data
+            generate_keys = list(pending)
+            representatives = [members[pending[plan_key][0]] for plan_key in generate_keys]
+            for batch_positions in self.roster_batches(representatives):
+                batch_keys = [generate_keys[position] for position in batch_positions]
+                batch = [representatives[position] for position in batch_positions]
+                with request_context(batch[0]):
+                    for plan_key in batch_keys:
+                        record_cache_lookup('miss')
+                        log_event('plan_lookup', source='miss', plan_key=plan_key)
+                    with log_stage('generate_roster', members=len(batch)):
+                        member_plans, usage = self.generate_roster_plans(batch)
+                    for plan_key, user_data, workout_plan_json, member_usage in zip(batch_keys, batch, member_plans, usage):
+                        log_event('roster_member', plan_key=plan_key, input_tokens=member_usage['input_tokens'],
+                                  output_tokens=member_usage['output_tokens'])
+                        # Missing or broken days of a member are repaired on their own
+                        days_data = self.prepare_workout_plan(workout_plan_json, user_data)
+                        if len(days_data) == int(user_data['weekly_frequency']):
+                            self.store_plan(plan_key, workout_plan_json, days_data, user_data)
+                        first, *repeats = pending[plan_key]
+                        results[first] = {'workout_plan': workout_plan_json, 'days': days_data,
+                                          'source': 'roster', 'usage': member_usage}
+                        # Members sharing the plan get their own copy with their calories
+                        for position in repeats:
+                            results[position] = {
+                                'workout_plan': workout_plan_json,
+                                'days': personalize_calories(copy.deepcopy(days_data), members[position].get('weight')),
+                                'source': 'roster',
+                                'usage': None,
+                            }
+        finally:
+            for plan_key in claimed:
+                release_generation(plan_key)
+        
+        for position in inflight:
+            workout_plan_json, days_data = self.create_workout_plan(members[position])
+            results[position] = {'workout_plan': workout_plan_json, 'days': days_data, 'source': 'shared_inflight',
+                                 'usage': None}
+        return results
+    
+    def edit_workout_plan(self, user_data: Dict, days_data: List[Dict], instruction: str) -> Tuple[List[Dict], Dict]:
+        """
+        Apply a free-text edit ("swap lunges for something knee-friendly") without regenerating the plan.
+        
+        Args:
+            user_data: Form data of the plan
+            days_data: Current display-ready days, left unchanged
+            instruction: The requested change
+        
+        Returns:
+            Tuple of (edited days, summary with the patch's operations and touched exercises)
+        """
+        instruction = instruction.strip()
+        if not instruction:
+            raise ValueError("Describe the change to make")
+        if len(instruction) > EDIT_MAX_INSTRUCTION_CHARS:
+            raise ValueError(f"Edit requests are limited to {EDIT_MAX_INSTRUCTION_CHARS} characters")
+        
+        with request_context(user_data):
+            prompt = self.create_edit_prompt(user_data, days_data, instruction)
+            log_event('prompt_built', mode='edit', prompt_chars=len(prompt),
+                      payload=lambda: {'prompt': self.create_edit_prompt(redact_profile(user_data), days_data,
+                                                                         instruction)})
+            try:
+                patch_json = self._request_completion(prompt, "Workout Plan Edit", EDIT_OUTPUT_TOKENS)
+            except (BudgetExceededError, GenerationCancelled):
+                raise
+            except Exception as e:
+                raise Exception(f"Error editing workout plan: {str(e)}")
+            
+            # Raises PatchError when the patch is malformed or leaves an invalid plan; days_data is kept
+            edited_days, summary = apply_plan_edit(days_data, parse_patch(patch_json), user_data)
+            log_event('plan_edit', operations=summary['operations'], touched=len(summary['touched']))
+            return edited_days, summary
+    
+    def parse_workout_plan(self, workout_plan_json: str, weight_kg: Optional[float] = None) -> List[Dict]:
+        """Parse the JSON workout plan into structured daily workout data, with calories for weight_kg"""
+        try:
+            return parse_plan(workout_plan_json, weight_kg)
             
         except json.JSONDecodeError as e:
             st.error(f"Error parsing JSON response: {str(e)}")
@@ -0,0 +1,110 @@
+import re
+import copy
+from typing import Dict, List, Optional
+from config import PROGRESSION_SETTINGS
+from utils import TIMED_REPS_PATTERN, calculate_calories_burned, estimate_exercise_duration
+from duration_fit import day_duration, fit_day_duration, is_within_tolerance
+
+NUMBER_PATTERN = re.compile(r'\d+')
+NON_PROGRESSING_TYPES = ('warm', 'cool', 'stretch', 'mobility')
+
+
+def get_week_phase(week_number: int, fitness_level: str) -> str:
+    """Return 'Deload' for deload weeks and 'Build' otherwise"""
+    settings = PROGRESSION_SETTINGS.get(fitness_level, PROGRESSION_SETTINGS["Beginner"])
+    return "Deload" if week_number % settings['deload_every'] == 0 else "Build"
+
+
+def count_build_weeks(week_number: int, fitness_level: str) -> int:
+    """Number of build weeks completed before the given week"""
+    return sum(1 for week in range(1, week_number) if get_week_phase(week, fitness_level) == "Build")
+
+
+def progress_reps(reps: str, increase: int) -> str:
+    """Add to every rep count in a reps string, e.g. '8-12' + 2 -> '10-14'"""
+    if not increase or TIMED_REPS_PATTERN.search(str(reps)):
+        return reps
+    return NUMBER_PATTERN.sub(lambda match: str(int(match.group()) + increase), str(reps))
+
+
+def progress_exercise(exercise: Dict, fitness_level: str, week_number: int,
+                      weight_kg: Optional[float] = None) -> Dict:
+    """
+    Derive an exercise for a later week using double progression.
+
+    Reps rise by rep_step each build week up to max_rep_increase, then a set is
+    added and reps reset. Deload weeks cut sets to deload_volume of the base week.
+    Warm-up, cooldown and mobility work is carried over unchanged.
+    """
+    settings = PROGRESSION_SETTINGS.get(fitness_level, PROGRESSION_SETTINGS["Beginner"])
+    progressed = dict(exercise)
+    exercise_type = str(exercise.get('exercise_type', '')).lower()
+    if week_number <= 1 or any(kind in exercise_type for kind in NON_PROGRESSING_TYPES):
+        return progressed
+
+    base_sets = exercise.get('total_sets', 1) or 1
+    if get_week_phase(week_number, fitness_level) == "Deload":
+        progressed['total_sets'] = max(1, round(base_sets * settings['deload_volume']))
+    else:
+        steps = count_build_weeks(week_number, fitness_level)
+        steps_per_set = settings['max_rep_increase'] // settings['rep_step'] + 1
+        added_sets = steps // steps_per_set
+        rep_increase = (steps % steps_per_set) * settings['rep_step']
+
+        total_sets = max(base_sets, min(base_sets + added_sets, settings['max_sets']))
+        if total_sets - base_sets < added_sets:
+            # Set cap reached, keep ramping reps up to the cap instead
+            rep_increase = settings['max_rep_increase']
+        progressed['total_sets'] = total_sets
+        progressed['reps'] = progress_reps(exercise.get('reps', ''), rep_increase)
+
+    progressed['estimated_duration'] = estimate_exercise_duration(
+        progressed['total_sets'],
+        progressed.get('reps') or '10',
+        progressed.get('rest_time') or '60s'
+    )
+    progressed['calories_burned'] = calculate_calories_burned(
+        progressed.get('exercise_name', ''),
+        weight_kg,
+        progressed['estimated_duration'],
+        progressed.get('exercise_type', '')
+    ) if weight_kg else exercise.get('calories_burned', 0.0)
+    return progressed
+
+
+def build_week(days_data: List[Dict], fitness_level: str, week_number: int,
+               weight_kg: Optional[float] = None, session_duration: Optional[float] = None) -> Dict:
+    """
+    Derive one week of a program from the generated base week.
+
+    With session_duration, days the progression made too long are fitted back to it
+    (rest is tightened before sets are dropped). Derived days report their estimated workout_duration.
+    """
+    days = []
+    for day_data in days_data:
+        day = copy.copy(day_data)
+        day['exercises'] = [
+            progress_exercise(exercise, fitness_level, week_number, weight_kg)
+            for exercise in day_data['exercises']
+        ]
+        if week_number > 1:
+            duration = day_duration(day)
+            if session_duration and duration > session_duration and not is_within_tolerance(duration, session_duration):
+                fit_day_duration(day, session_duration, fitness_level, weight_kg)
+            day['workout_duration'] = round(day_duration(day))
+        days.append(day)
+
+    return {
+        'week': week_number,
+        'phase': get_week_phase(week_number, fitness_level),
+        'days': days
+    }
+
+
+def build_program(days_data: List[Dict], fitness_level: str, num_weeks: int,
+                  weight_kg: Optional[float] = None, session_duration: Optional[float] = None) -> List[Dict]:
+    """Derive a multi-week program locally from a single generated week"""
+    return [
+        build_week(days_data, fitness_level, week_number, weight_kg, session_duration)
+        for week_number in range(1, num_weeks + 1)
+    ]
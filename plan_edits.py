@@ -0,0 +1,234 @@
+"""
+Targeted plan edits through JSON Patch (RFC 6902) responses.
+
+For a change like "swap lunges for something knee-friendly" the model gets the plan
+in compact form (one {"day_N": {"workout_type", "exercises"}} document with the
+COMPACT_FIELDS of each exercise) and the instruction, and returns only a patch
+against that document. The patch is applied locally: exercises it left alone, or
+only moved, keep their objects, and only the exercises it touched are validated,
+completed from the exercise library, checked against the equipment and avoid list
+and given calories again.
+"""
+import copy
+import json
+from typing import Any, Dict, List, Tuple
+from exercise_library import DEFAULT_TEMPOS, get_exercise_library, normalize_name, substitute_exercises
+from plan_parser import PlanValidationError, validate_exercise, personalize_calories
+
+# Exercise fields sent to and editable by the model, the others are filled in locally
+COMPACT_FIELDS = ['exercise_name', 'exercise_type', 'equipment_required', 'target_muscle_group',
+                  'total_sets', 'reps', 'rest_time']
+PATCH_OPERATIONS = {'add', 'remove', 'replace', 'move', 'copy', 'test'}
+# Catalog fields that describe an exercise rather than its prescription
+CATALOG_FIELDS = ['exercise_name', 'exercise_type', 'equipment_required', 'target_muscle_group', 'breathing_pattern']
+
+
+class PatchError(ValueError):
+    """Raised when a patch is malformed, cannot be applied or leaves an invalid plan"""
+
+
+def compact_exercise(exercise: Dict) -> Dict:
+    return {field: exercise.get(field) for field in COMPACT_FIELDS}
+
+
+def compact_plan(days_data: List[Dict]) -> Dict:
+    """The document edit patches apply to: day key -> workout type and compact exercises"""
+    return {
+        f"day_{day_data['day']}": {
+            'workout_type': day_data['workout_type'],
+            'exercises': [compact_exercise(exercise) for exercise in day_data['exercises']],
+        }
+        for day_data in days_data
+    }
+
+
+def parse_patch(text) -> List[Dict]:
+    """Decode a model response holding a patch, as a bare array or {"patch": [...]}"""
+    try:
+        patch = json.loads(text) if isinstance(text, (str, bytes)) else text
+    except ValueError as e:
+        raise PatchError(f"Patch is not valid JSON: {e}")
+    if isinstance(patch, dict):
+        patch = patch.get('patch', patch.get('operations'))
+    if not isinstance(patch, list):
+        raise PatchError("Patch must be a list of operations")
+    for operation in patch:
+        if not isinstance(operation, dict) or operation.get('op') not in PATCH_OPERATIONS:
+            raise PatchError(f"Unsupported patch operation: {operation!r}")
+        if not isinstance(operation.get('path'), str):
+            raise PatchError(f"Patch operation without a path: {operation!r}")
+        if operation['op'] in ('move', 'copy') and not isinstance(operation.get('from'), str):
+            raise PatchError(f"'{operation['op']}' operation without 'from': {operation!r}")
+        if operation['op'] in ('add', 'replace', 'test') and 'value' not in operation:
+            raise PatchError(f"'{operation['op']}' operation without 'value': {operation!r}")
+    return patch
+
+
+def _pointer_tokens(pointer: str) -> List[str]:
+    """Reference tokens of a JSON Pointer (RFC 6901)"""
+    if not pointer.startswith('/'):
+        raise PatchError(f"Invalid path '{pointer}'")
+    return [token.replace('~1', '/').replace('~0', '~') for token in pointer.split('/')[1:]]
+
+
+def _list_index(container: List, token: str, allow_end: bool = False) -> int:
+    if token == '-' and allow_end:
+        return len(container)
+    if not token.isdigit() or (len(token) > 1 and token.startswith('0')):
+        raise PatchError(f"Invalid list index '{token}'")
+    index = int(token)
+    if index > len(container) or (index == len(container) and not allow_end):
+        raise PatchError(f"List index {index} out of range")
+    return index
+
+
+def _parent(document: Any, pointer: str) -> Tuple[Any, str]:
+    """Container holding the value a pointer refers to, and the last reference token"""
+    tokens = _pointer_tokens(pointer)
+    container = document
+    for token in tokens[:-1]:
+        if isinstance(container, dict) and token in container:
+            container = container[token]
+        elif isinstance(container, list):
+            container = container[_list_index(container, token)]
+        else:
+            raise PatchError(f"Path '{pointer}' does not exist")
+    return container, tokens[-1]
+
+
+def _get(document: Any, pointer: str) -> Any:
+    container, token = _parent(document, pointer)
+    if isinstance(container, dict):
+        if token not in container:
+            raise PatchError(f"Path '{pointer}' does not exist")
+        return container[token]
+    if isinstance(container, list):
+        return container[_list_index(container, token)]
+    raise PatchError(f"Path '{pointer}' does not exist")
+
+
+def _add(document: Any, pointer: str, value: Any):
+    container, token = _parent(document, pointer)
+    if isinstance(container, dict):
+        container[token] = value
+    elif isinstance(container, list):
+        container.insert(_list_index(container, token, allow_end=True), value)
+    else:
+        raise PatchError(f"Path '{pointer}' does not exist")
+
+
+def _remove(document: Any, pointer: str) -> Any:
+    container, token = _parent(document, pointer)
+    if isinstance(container, dict):
+        if token not in container:
+            raise PatchError(f"Path '{pointer}' does not exist")
+        return container.pop(token)
+    if isinstance(container, list):
+        return container.pop(_list_index(container, token))
+    raise PatchError(f"Path '{pointer}' does not exist")
+
+
+def apply_patch(document: Dict, patch: List[Dict]) -> Dict:
+    """Apply a JSON Patch to a copy of document, all operations or none"""
+    document = copy.deepcopy(document)
+    for operation in patch:
+        op, path = operation['op'], operation['path']
+        if path == '':
+            raise PatchError("A patch may not replace the whole plan")
+        if op == 'add':
+            _add(document, path, copy.deepcopy(operation['value']))
+        elif op == 'remove':
+            _remove(document, path)
+        elif op == 'replace':
+            _remove(document, path)
+            _add(document, path, copy.deepcopy(operation['value']))
+        elif op == 'move':
+            if path.startswith(operation['from'] + '/'):
+                raise PatchError(f"Cannot move '{operation['from']}' into itself")
+            _add(document, path, _remove(document, operation['from']))
+        elif op == 'copy':
+            _add(document, path, copy.deepcopy(_get(document, operation['from'])))
+        elif _get(document, path) != operation['value']:
+            raise PatchError(f"Test failed at '{path}'")
+    return document
+
+
+def enrich_exercise(compact: Dict, previous: Dict, weight_kg) -> Dict:
+    """
+    Build a display exercise from an edited compact exercise.
+
+    A changed prescription of the same exercise keeps its other fields (tempo, cues);
+    a new exercise found in the library gets the catalog's description and default tempo.
+    """
+    if not isinstance(compact, dict):
+        raise PatchError("Exercises must be JSON objects")
+    name = compact.get('exercise_name') or ''
+    same_exercise = previous is not None and normalize_name(previous['exercise_name']) == normalize_name(str(name))
+    exercise = dict(previous) if same_exercise else {}
+    exercise.update({field: compact[field] for field in COMPACT_FIELDS if compact.get(field) not in (None, '')})
+
+    entry = None if same_exercise else get_exercise_library().find(str(name))
+    if entry is not None:
+        exercise.update({field: entry[field] for field in CATALOG_FIELDS})
+        exercise.setdefault('tempo', DEFAULT_TEMPOS.get(entry['exercise_type'], ''))
+
+    try:
+        exercise_data = validate_exercise(exercise)
+    except PlanValidationError as e:
+        raise PatchError(str(e))
+    if not exercise_data['exercise_name']:
+        raise PatchError("Edited exercises need an exercise_name")
+    return personalize_calories([{'exercises': [exercise_data]}], weight_kg)[0]['exercises'][0]
+
+
+def apply_plan_edit(days_data: List[Dict], patch: List[Dict], user_data: Dict) -> Tuple[List[Dict], Dict]:
+    """
+    Apply an edit patch (against compact_plan(days_data)) to a plan.
+
+    Args:
+        days_data: Current display-ready days, left unchanged
+        patch: JSON Patch operations
+        user_data: Form data, for equipment, avoid list and weight
+
+    Returns:
+        Tuple of (edited days, summary with the patch's operations and the touched exercises)
+    """
+    document = compact_plan(days_data)
+    patched = apply_patch(document, patch)
+    if set(patched) != set(document):
+        raise PatchError("Edits must keep the plan's days")
+
+    edited_days = []
+    touched = []
+    for day_data in days_data:
+        day_info = patched[f"day_{day_data['day']}"]
+        if not isinstance(day_info, dict) or not isinstance(day_info.get('exercises'), list):
+            raise PatchError(f"Day {day_data['day']} must keep its list of exercises")
+
+        # Exercises the patch did not change, or only moved, keep their objects
+        unchanged = {}
+        for exercise in day_data['exercises']:
+            unchanged.setdefault(json.dumps(compact_exercise(exercise), sort_keys=True), []).append(exercise)
+
+        exercises = []
+        edited = []
+        for index, compact in enumerate(day_info['exercises']):
+            kept = unchanged.get(json.dumps(compact, sort_keys=True)) if isinstance(compact, dict) else None
+            if kept:
+                exercises.append(kept.pop(0))
+                continue
+            previous = day_data['exercises'][index] if index < len(day_data['exercises']) else None
+            exercises.append(enrich_exercise(compact, previous, user_data.get('weight')))
+            edited.append(index)
+
+        edited_day = dict(day_data, workout_type=str(day_info.get('workout_type') or day_data['workout_type']),
+                          exercises=exercises)
+        if edited:
+            # Touched exercises that break the equipment or avoid list are swapped as in a generated plan,
+            # never for an exercise the rest of the day already has
+            substitute_exercises([edited_day], user_data, indices=edited)
+            touched.extend({'day': day_data['day'], 'index': index, 'exercise_name': exercises[index]['exercise_name']}
+                           for index in edited)
+        edited_days.append(edited_day)
+
+    return edited_days, {'operations': len(patch), 'touched': touched}
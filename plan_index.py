@@ -0,0 +1,242 @@
+"""
+Nearest-neighbour reuse of stored plans for similar profiles.
+
+Canonical profiles are encoded as weighted vectors: one-hot multiselect and gender
+options, and thermometer-coded session duration, age, weight and height bands so
+that neighbouring bands stay similar. The in-memory index is partitioned by the
+fields a plan cannot be adapted across (level, goal, training days, generation mode,
+limitations and notes). When the closest stored profile is at least
+PLAN_REUSE_SIMILARITY cosine-similar, its plan is adapted locally (equipment and
+avoid-list substitutions, duration fitting, calories) instead of calling the model.
+
+Compare latency saved with plan fit on recorded traffic with:
+    python benchmarks/bench_plan_reuse.py traffic.jsonl
+"""
+import os
+import math
+import time
+import heapq
+import threading
+from functools import lru_cache
+from typing import Dict, List, Optional, Tuple
+from canonical_profile import canonicalize_profile, normalize_text, age_band
+from duration_fit import fit_plan_durations
+from exercise_library import (
+    get_exercise_library, get_available_equipment, parse_avoid_terms, substitute_exercises, violates_constraints
+)
+from plan_parser import personalize_calories
+from shared_state import get_cached_plan, register_indexed_plan, get_indexed_plan_keys
+from config import (
+    PLAN_REUSE_SIMILARITY, PLAN_REUSE_CANDIDATES, PLAN_INDEX_WEIGHTS, PLAN_INDEX_SYNC_INTERVAL,
+    EQUIPMENT_OPTIONS, TARGET_AREA_OPTIONS, PREFERENCE_OPTIONS, GENDER_OPTIONS, DURATION_OPTIONS,
+    AGE_BANDS, WEIGHT_BAND_KG, HEIGHT_BAND_CM
+)
+
+# Canonical fields a stored plan must match exactly to be reused
+PARTITION_FIELDS = ['fitness_level', 'goal', 'training_days_per_week', 'generation_mode',
+                    'health_limitations', 'additional_notes']
+MULTISELECT_OPTIONS = {
+    'available_equipment': EQUIPMENT_OPTIONS,
+    'target_areas': TARGET_AREA_OPTIONS,
+    'workout_preferences': PREFERENCE_OPTIONS,
+}
+AGE_BAND_LABELS = [age_band(AGE_BANDS[0] - 1)] + [age_band(lower) for lower in AGE_BANDS]
+# Thermometer ranges for the body measurement bands: lowest band start and number of bands
+WEIGHT_BANDS = (40, 8)
+HEIGHT_BANDS = (125, 4)
+
+
+def _thermometer(position: int, size: int) -> List[float]:
+    """Ordinal encoding with the first position + 1 slots set, so adjacent buckets overlap"""
+    position = max(0, min(size - 1, position))
+    return [1.0] * (position + 1) + [0.0] * (size - position - 1)
+
+
+def _band_position(band_label: Optional[str], start: int, width: int) -> int:
+    if not band_label:
+        return 0
+    return (int(band_label.split('-')[0]) - start) // width
+
+
+def _weighted(values: List[float], weight: float) -> List[float]:
+    """Scale a feature group to squared norm weight, so identical groups add weight to the dot product"""
+    norm = math.sqrt(sum(value * value for value in values))
+    return [value * math.sqrt(weight) / norm for value in values] if norm else values
+
+
+def encode_profile(canonical: Dict) -> List[float]:
+    """Similarity vector of a canonical profile (see canonicalize_profile)"""
+    groups = {}
+    for field, options in MULTISELECT_OPTIONS.items():
+        selected = set(canonical.get(field) or [])
+        groups[field] = [float(normalize_text(option) in selected) for option in options]
+    groups['gender'] = [float(normalize_text(option) == canonical.get('gender')) for option in GENDER_OPTIONS]
+    duration = canonical['session_duration']
+    groups['session_duration'] = _thermometer(sum(option <= duration for option in DURATION_OPTIONS) - 1,
+                                              len(DURATION_OPTIONS))
+    age = canonical.get('age')
+    groups['age'] = _thermometer(AGE_BAND_LABELS.index(age) if age in AGE_BAND_LABELS else 0,
+                                 len(AGE_BAND_LABELS))
+    groups['weight'] = _thermometer(_band_position(canonical.get('weight'), WEIGHT_BANDS[0], WEIGHT_BAND_KG),
+                                    WEIGHT_BANDS[1])
+    groups['height'] = _thermometer(_band_position(canonical.get('height'), HEIGHT_BANDS[0], HEIGHT_BAND_CM),
+                                    HEIGHT_BANDS[1])
+
+    vector = []
+    for field, values in groups.items():
+        vector.extend(_weighted(values, PLAN_INDEX_WEIGHTS.get(field, 1.0)))
+    return vector
+
+
+def partition_key(canonical: Dict) -> Tuple:
+    return tuple(str(canonical.get(field)) for field in PARTITION_FIELDS)
+
+
+def cosine_similarity(vector: List[float], norm: float, other: List[float], other_norm: float) -> float:
+    if not norm or not other_norm:
+        return 0.0
+    return sum(a * b for a, b in zip(vector, other)) / (norm * other_norm)
+
+
+class PlanIndex:
+    """In-memory similarity index of stored plans' profiles, with incremental inserts"""
+
+    def __init__(self):
+        # partition key -> {plan key: (vector, norm)}
+        self._partitions = {}
+        self._partition_of = {}
+        self._lock = threading.Lock()
+        self._synced_at = 0.0
+
+    def __len__(self) -> int:
+        return len(self._partition_of)
+
+    def __contains__(self, plan_key: str) -> bool:
+        return plan_key in self._partition_of
+
+    def insert(self, plan_key: str, canonical: Dict):
+        vector = encode_profile(canonical)
+        norm = math.sqrt(sum(value * value for value in vector))
+        partition = partition_key(canonical)
+        with self._lock:
+            self._partitions.setdefault(partition, {})[plan_key] = (vector, norm)
+            self._partition_of[plan_key] = partition
+
+    def remove(self, plan_key: str):
+        with self._lock:
+            partition = self._partition_of.pop(plan_key, None)
+            if partition is not None:
+                self._partitions[partition].pop(plan_key, None)
+
+    def nearest(self, canonical: Dict, count: int = 1) -> List[Tuple[str, float]]:
+        """Closest stored profiles in the same partition as (plan key, similarity), most similar first"""
+        vector = encode_profile(canonical)
+        norm = math.sqrt(sum(value * value for value in vector))
+        with self._lock:
+            candidates = list(self._partitions.get(partition_key(canonical), {}).items())
+        scored = ((plan_key, cosine_similarity(vector, norm, other, other_norm))
+                  for plan_key, (other, other_norm) in candidates)
+        return heapq.nlargest(count, scored, key=lambda item: item[1])
+
+    def sync(self, force: bool = False) -> int:
+        """Insert plans indexed by other replicas since the last sync, returning how many were added"""
+        now = time.monotonic()
+        if not force and now - self._synced_at < PLAN_INDEX_SYNC_INTERVAL:
+            return 0
+        self._synced_at = now
+        added = 0
+        for plan_key in get_indexed_plan_keys():
+            if plan_key in self:
+                continue
+            cached = get_cached_plan(plan_key)
+            if cached is not None and cached.get('profile'):
+                self.insert(plan_key, cached['profile'])
+                added += 1
+        return added
+
+
+@lru_cache(maxsize=None)
+def get_plan_index() -> PlanIndex:
+    """Process-wide plan index, built from the stored plans on first use"""
+    index = PlanIndex()
+    index.sync(force=True)
+    return index
+
+
+def reuse_threshold() -> float:
+    return float(os.getenv('PLAN_REUSE_SIMILARITY', PLAN_REUSE_SIMILARITY))
+
+
+def index_plan(plan_key: str, user_data: Dict):
+    """Make a freshly generated and cached plan available for reuse by similar profiles"""
+    canonical, _ = canonicalize_profile(user_data)
+    register_indexed_plan(plan_key)
+    get_plan_index().insert(plan_key, canonical)
+
+
+def count_violations(days_data: List[Dict], user_data: Dict) -> int:
+    """Exercises that still use unavailable equipment or are on the avoid list"""
+    library = get_exercise_library()
+    available_equipment = get_available_equipment(user_data)
+    avoid_terms = parse_avoid_terms(user_data.get('exercises_to_avoid', ''))
+    return sum(
+        violates_constraints(exercise, library.find(exercise.get('exercise_name', '')), available_equipment, avoid_terms)
+        for day_data in days_data for exercise in day_data['exercises']
+    )
+
+
+def adapt_plan(days_data: List[Dict], user_data: Dict) -> Optional[Dict]:
+    """
+    Adapt another profile's days to user_data locally, updating them in place.
+
+    Returns:
+        Adaptation summary with swaps, exercises and plan_fit (share of exercises kept),
+        or None when the plan breaks a constraint or a day cannot be fitted to the session duration
+    """
+    swaps = substitute_exercises(days_data, user_data)
+    if count_violations(days_data, user_data) or fit_plan_durations(days_data, user_data):
+        return None
+    personalize_calories(days_data, user_data.get('weight'))
+    exercises = sum(len(day_data['exercises']) for day_data in days_data)
+    return {
+        'swaps': len(swaps),
+        'exercises': exercises,
+        'plan_fit': round(1 - len(swaps) / exercises, 4) if exercises else 0.0,
+    }
+
+
+def find_similar_plan(user_data: Dict, index: Optional[PlanIndex] = None,
+                      threshold: Optional[float] = None) -> Optional[Tuple[str, List[Dict], Dict]]:
+    """
+    Find the closest stored plan of a similar profile and adapt it to user_data.
+
+    Args:
+        user_data: Form data of the request
+        index: Index to search, defaults to the process-wide one
+        threshold: Minimum similarity, defaults to PLAN_REUSE_SIMILARITY
+
+    Returns:
+        Tuple of (neighbour's model response, adapted days, match summary with neighbour_key and
+        similarity), or None when no neighbour is similar enough or none could be adapted
+    """
+    threshold = reuse_threshold() if threshold is None else threshold
+    if threshold > 1:
+        return None
+    if index is None:
+        index = get_plan_index()
+        index.sync()
+
+    canonical, _ = canonicalize_profile(user_data)
+    for neighbour_key, similarity in index.nearest(canonical, PLAN_REUSE_CANDIDATES):
+        if similarity < threshold:
+            break
+        cached = get_cached_plan(neighbour_key)
+        if cached is None:
+            # Expired from the plan cache
+            index.remove(neighbour_key)
+            continue
+        adaptation = adapt_plan(cached['days'], user_data)
+        if adaptation is not None:
+            adaptation.update(neighbour_key=neighbour_key, similarity=round(similarity, 4))
+            return cached['workout_plan'], cached['days'], adaptation
+    return None
@@ -0,0 +1,288 @@
+import re
+import json
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+from utils import calculate_calories_burned, estimate_exercise_duration
+from exercise_library import expand_catalog_exercise
+
+# Prefer orjson for decoding model responses, fall back to the stdlib decoder
+try:
+    import orjson
+
+    def _loads(raw):
+        return orjson.loads(raw)
+except ImportError:
+    orjson = None
+
+    def _loads(raw):
+        return json.loads(raw)
+
+DAY_NUMBER_PATTERN = re.compile(r'\d+')
+DAY_KEY_PATTERN = re.compile(r'"(day[\s_-]*(\d+))"\s*:\s*\{', re.IGNORECASE)
+LINE_COMMENT_PATTERN = re.compile(r'^\s*//.*$', re.MULTILINE)
+TRAILING_COMMA_PATTERN = re.compile(r',(\s*[}\]])')
+MEMBER_KEY_PATTERN = re.compile(r'"(member_\d+)"\s*:\s*\{', re.IGNORECASE)
+
+# Exercise schema: field name -> (expected type, default value)
+EXERCISE_SCHEMA = {
+    'exercise_name': (str, ''),
+    'exercise_type': (str, ''),
+    'equipment_required': (str, ''),
+    'target_muscle_group': (str, ''),
+    'total_sets': (int, 1),
+    'reps': (str, ''),
+    'tempo': (str, ''),
+    'rest_time': (str, ''),
+    'weight': (str, ''),
+    'speed_level': (str, ''),
+    'breathing_pattern': (str, ''),
+    'superset_indicator': (str, 'None'),
+}
+
+
+class PlanValidationError(ValueError):
+    """Raised when a decoded workout plan does not match the expected schema"""
+
+
+def decode_plan(workout_plan_json) -> Dict:
+    """Decode a model response and return the mapping of day keys to day objects"""
+    workout_data = _loads(workout_plan_json)
+    if not isinstance(workout_data, dict):
+        raise PlanValidationError("Workout plan must be a JSON object")
+
+    plan_data = workout_data.get("workout_plan", workout_data)
+    if not isinstance(plan_data, dict):
+        raise PlanValidationError("'workout_plan' must be a JSON object")
+    return plan_data
+
+
+def sorted_day_items(plan_data: Dict) -> List[Tuple[Optional[int], str, Any]]:
+    """Return (day number, key, day object) sorted numerically by day number"""
+    numbered = []
+    unnumbered = []
+    for day_key, day_info in plan_data.items():
+        match = DAY_NUMBER_PATTERN.search(day_key)
+        if match:
+            numbered.append((int(match.group()), day_key, day_info))
+        else:
+            unnumbered.append((None, day_key, day_info))
+
+    numbered.sort(key=lambda item: item[0])
+    return numbered + unnumbered
+
+
+def _coerce(value, expected_type, default):
+    """Coerce a scalar field to its schema type, falling back to the default"""
+    if value is None:
+        return default
+    if expected_type is int:
+        if isinstance(value, bool):
+            return default
+        if isinstance(value, int):
+            return value
+        try:
+            return int(float(value))
+        except (TypeError, ValueError):
+            return default
+    if isinstance(value, str):
+        return value
+    if isinstance(value, (int, float)):
+        return str(value)
+    return default
+
+
+def validate_exercise(exercise: Dict) -> Dict:
+    """Validate one exercise object and build its display record, without personal data"""
+    # Catalog-ID mode responses reference exercises as [id, sets, reps, rest]
+    if isinstance(exercise, list) or (isinstance(exercise, dict) and 'id' in exercise and 'exercise_name' not in exercise):
+        exercise = expand_catalog_exercise(exercise)
+    if not isinstance(exercise, dict):
+        raise PlanValidationError(f"Exercise must be a JSON object, got {type(exercise).__name__}")
+
+    exercise_data = {}
+    for field, (expected_type, default) in EXERCISE_SCHEMA.items():
+        value = exercise.get(field, default)
+        # Values already of the schema type skip coercion
+        if type(value) is not expected_type:
+            value = _coerce(value, expected_type, default)
+        exercise_data[field] = value
+
+    # Missing reps/rest fall back to typical values for the duration estimate only
+    est_duration = estimate_exercise_duration(
+        exercise_data['total_sets'],
+        exercise_data['reps'] or '10',
+        exercise_data['rest_time'] or '60s'
+    )
+
+    exercise_data['estimated_duration'] = est_duration
+    # Filled in by personalize_calories once the user's weight is known
+    exercise_data['calories_burned'] = 0.0
+    return exercise_data
+
+
+def validate_day(day_number: int, day_info: Dict) -> Dict:
+    """Validate one day object and build its display record, without personal data"""
+    if not isinstance(day_info, dict):
+        raise PlanValidationError(f"Day {day_number} must be a JSON object")
+
+    exercises = day_info.get('exercises') or []
+    if not isinstance(exercises, list):
+        raise PlanValidationError(f"Day {day_number} 'exercises' must be a list")
+
+    workout_duration = day_info.get('workout_duration', 0)
+    if isinstance(workout_duration, bool) or not isinstance(workout_duration, (int, float)):
+        workout_duration = _coerce(workout_duration, int, 0)
+
+    day_data = {
+        'day': day_number,
+        'title': _coerce(day_info.get('day_name'), str, f'Day {day_number}'),
+        'workout_type': _coerce(day_info.get('workout_type'), str, 'Workout'),
+        'workout_duration': workout_duration,
+        'exercises': []
+    }
+
+    for exercise in exercises:
+        exercise_data = validate_exercise(exercise)
+        # Only add exercise if it has required data
+        if exercise_data['exercise_name']:
+            day_data['exercises'].append(exercise_data)
+
+    return day_data
+
+
+def personalize_calories(days_data: List[Dict], weight_kg: Optional[float]) -> List[Dict]:
+    """Set calories burned for every exercise from the user's weight, updating the days in place"""
+    for day in days_data:
+        for exercise in day['exercises']:
+            exercise['calories_burned'] = calculate_calories_burned(
+                exercise['exercise_name'],
+                weight_kg,
+                exercise['estimated_duration'],
+                exercise['exercise_type']
+            ) if weight_kg else 0.0
+    return days_data
+
+
+def parse_plan(workout_plan_json, weight_kg: Optional[float] = None) -> List[Dict]:
+    """Decode and validate a workout plan, returning days sorted numerically with calories for weight_kg"""
+    plan_data = decode_plan(workout_plan_json)
+
+    days_data = []
+    for day_number, _, day_info in sorted_day_items(plan_data):
+        if day_number is None:
+            day_number = len(days_data) + 1
+        day_data = validate_day(day_number, day_info)
+        # Only add day if it has exercises
+        if day_data['exercises']:
+            days_data.append(day_data)
+
+    return personalize_calories(days_data, weight_kg)
+
+
+def _clean_json(text: str) -> str:
+    """Strip the // comments and trailing commas models copy from the prompt template"""
+    text = LINE_COMMENT_PATTERN.sub('', text)
+    return TRAILING_COMMA_PATTERN.sub(r'\1', text)
+
+
+def _scan_days(text: str) -> Dict[int, Any]:
+    """Recover every complete day object from a truncated or malformed document"""
+    decoder = json.JSONDecoder()
+    recovered = {}
+    for match in DAY_KEY_PATTERN.finditer(text):
+        day_number = int(match.group(2))
+        if day_number in recovered:
+            continue
+        try:
+            day_info, _ = decoder.raw_decode(text, match.end() - 1)
+        except json.JSONDecodeError:
+            # Truncated or broken day, leave it to be re-requested
+            continue
+        recovered[day_number] = day_info
+    return recovered
+
+
+def salvage_plan(workout_plan_json, expected_days: Iterable[int],
+                 weight_kg: Optional[float] = None) -> Tuple[List[Dict], List[int]]:
+    """
+    Recover all valid days from a possibly broken model response.
+
+    Args:
+        workout_plan_json: Raw model response
+        expected_days: Day numbers the plan should contain
+        weight_kg: User's weight in kilograms, used for calories burned
+
+    Returns:
+        Tuple of (valid days sorted by day number, missing or invalid day numbers)
+    """
+    if isinstance(workout_plan_json, bytes):
+        workout_plan_json = workout_plan_json.decode('utf-8', errors='replace')
+    text = workout_plan_json or ''
+
+    raw_days = {}
+    for candidate in (text, _clean_json(text)):
+        try:
+            plan_data = decode_plan(candidate)
+        except ValueError:
+            continue
+        for position, (day_number, _, day_info) in enumerate(sorted_day_items(plan_data), start=1):
+            raw_days.setdefault(day_number if day_number is not None else position, day_info)
+        break
+    else:
+        raw_days = _scan_days(_clean_json(text))
+
+    days_data = []
+    for day_number in sorted(raw_days):
+        try:
+            day_data = validate_day(day_number, raw_days[day_number])
+        except PlanValidationError:
+            continue
+        if day_data['exercises']:
+            days_data.append(day_data)
+
+    recovered = {day['day'] for day in days_data}
+    missing_days = sorted(set(expected_days) - recovered)
+    return personalize_calories(days_data, weight_kg), missing_days
+
+
+def split_roster(roster_json, member_keys: Iterable[str]) -> Dict[str, str]:
+    """
+    Split a roster response ({"roster": {"member_1": {day keys...}, ...}}) into one plan per member.
+
+    Args:
+        roster_json: Raw model response for a roster prompt
+        member_keys: Member keys the roster should contain
+
+    Returns:
+        Member key -> plan text for salvage_plan; a member the model left out gets '',
+        and a broken document is cut at the member keys so complete days can still be salvaged
+    """
+    if isinstance(roster_json, bytes):
+        roster_json = roster_json.decode('utf-8', errors='replace')
+    text = roster_json or ''
+    member_keys = list(member_keys)
+
+    for candidate in (text, _clean_json(text)):
+        try:
+            roster_data = _loads(candidate)
+        except ValueError:
+            continue
+        if isinstance(roster_data, dict) and isinstance(roster_data.get('roster', roster_data), dict):
+            roster_data = roster_data.get('roster', roster_data)
+            return {member_key: json.dumps({'workout_plan': roster_data[member_key]})
+                    if isinstance(roster_data.get(member_key), dict) else '' for member_key in member_keys}
+
+    # Truncated or malformed: each member's slice runs to the next member key
+    matches = list(MEMBER_KEY_PATTERN.finditer(text))
+    slices = {}
+    for position, match in enumerate(matches):
+        end = matches[position + 1].start() if position + 1 < len(matches) else len(text)
+        slices.setdefault(match.group(1).lower(), text[match.end() - 1:end])
+    return {member_key: slices.get(member_key, '') for member_key in member_keys}
+
+
+def splice_days(days_data: List[Dict], repaired_days: List[Dict]) -> List[Dict]:
+    """Merge repaired days into a salvaged plan, keeping days sorted by number"""
+    merged = {day['day']: day for day in days_data}
+    for day in repaired_days:
+        merged.setdefault(day['day'], day)
+    return [merged[day_number] for day_number in sorted(merged)]
@@ -0,0 +1,332 @@
+"""
+Shared state for running several replicas behind a load balancer.
+
+Plan cache, usage ledger, job status and the in-flight request registry live in
+a StateStore: Redis (or any Redis-protocol server) when STATE_BACKEND=redis,
+otherwise an in-process store with the same behaviour for single replicas.
+"""
+import os
+import json
+import time
+import uuid
+import threading
+from abc import ABC, abstractmethod
+from datetime import date, timedelta
+from functools import lru_cache
+from typing import Callable, Dict, List, Optional
+from config import (
+    DEFAULT_STATE_BACKEND, STATE_KEY_PREFIX, PLAN_CACHE_TTL, JOB_TTL, JOB_CLAIM_TTL, INFLIGHT_TTL,
+    INFLIGHT_POLL_INTERVAL, USAGE_LEDGER_TTL, WARM_POOL_LOOKBACK_DAYS, WARM_POOL_TTL, WARM_POOL_CHECK_INTERVAL
+)
+
+# Optional Redis client, only needed for STATE_BACKEND=redis
+try:
+    import redis
+except ImportError:
+    redis = None
+
+# Identifies this process in job and in-flight records
+REPLICA_ID = f"{os.uname().nodename if hasattr(os, 'uname') else 'replica'}-{os.getpid()}"
+
+
+class StateStore(ABC):
+    """Key-value store of JSON values and float counters with optional expiry"""
+
+    @abstractmethod
+    def get_json(self, key: str):
+        """Decoded value of a key, None when missing or expired"""
+
+    @abstractmethod
+    def set_json(self, key: str, value, ttl: Optional[int] = None):
+        """Store a JSON-serializable value, expiring after ttl seconds if given"""
+
+    @abstractmethod
+    def add_json(self, key: str, value, ttl: Optional[int] = None) -> bool:
+        """Set the key only if it does not exist, returning whether it was set"""
+
+    @abstractmethod
+    def delete(self, key: str):
+        """Remove a key if present"""
+
+    @abstractmethod
+    def incr_fields(self, key: str, amounts: Dict[str, float], ttl: Optional[int] = None):
+        """Add to float counters stored under a key"""
+
+    @abstractmethod
+    def get_fields(self, key: str) -> Dict[str, float]:
+        """Counters stored under a key, empty when missing"""
+
+
+class LocalStateStore(StateStore):
+    """In-process fallback store, shared by all sessions of one replica"""
+
+    def __init__(self):
+        self._data = {}
+        self._expires = {}
+        self._lock = threading.Lock()
+
+    def _get(self, key: str, default=None):
+        expires_at = self._expires.get(key)
+        if expires_at is not None and expires_at <= time.time():
+            self._data.pop(key, None)
+            self._expires.pop(key, None)
+        return self._data.get(key, default)
+
+    def _set(self, key: str, value, ttl: Optional[int]):
+        self._data[key] = value
+        if ttl:
+            self._expires[key] = time.time() + ttl
+        else:
+            self._expires.pop(key, None)
+
+    def get_json(self, key: str):
+        with self._lock:
+            value = self._get(key)
+        return json.loads(value) if value is not None else None
+
+    def set_json(self, key: str, value, ttl: Optional[int] = None):
+        # Store serialized copies so callers never share mutable state, as with Redis
+        with self._lock:
+            self._set(key, json.dumps(value), ttl)
+
+    def add_json(self, key: str, value, ttl: Optional[int] = None) -> bool:
+        with self._lock:
+            if self._get(key) is not None:
+                return False
+            self._set(key, json.dumps(value), ttl)
+            return True
+
+    def delete(self, key: str):
+        with self._lock:
+            self._data.pop(key, None)
+            self._expires.pop(key, None)
+
+    def incr_fields(self, key: str, amounts: Dict[str, float], ttl: Optional[int] = None):
+        with self._lock:
+            fields = self._get(key, {})
+            for field, amount in amounts.items():
+                fields[field] = fields.get(field, 0.0) + amount
+            self._set(key, fields, ttl or None)
+
+    def get_fields(self, key: str) -> Dict[str, float]:
+        with self._lock:
+            return dict(self._get(key, {}))
+
+
+class RedisStateStore(StateStore):
+    """Store backed by a Redis-protocol server, shared by every replica"""
+
+    def __init__(self, url: str):
+        if redis is None:
+            raise ImportError("STATE_BACKEND=redis requires the 'redis' package")
+        self.url = url
+        self.client = redis.Redis.from_url(url, decode_responses=True)
+
+    def get_json(self, key: str):
+        value = self.client.get(key)
+        return json.loads(value) if value is not None else None
+
+    def set_json(self, key: str, value, ttl: Optional[int] = None):
+        self.client.set(key, json.dumps(value), ex=ttl)
+
+    def add_json(self, key: str, value, ttl: Optional[int] = None) -> bool:
+        return bool(self.client.set(key, json.dumps(value), ex=ttl, nx=True))
+
+    def delete(self, key: str):
+        self.client.delete(key)
+
+    def incr_fields(self, key: str, amounts: Dict[str, float], ttl: Optional[int] = None):
+        pipeline = self.client.pipeline()
+        for field, amount in amounts.items():
+            pipeline.hincrbyfloat(key, field, amount)
+        if ttl:
+            pipeline.expire(key, ttl)
+        pipeline.execute()
+
+    def get_fields(self, key: str) -> Dict[str, float]:
+        return {field: float(value) for field, value in self.client.hgetall(key).items()}
+
+
+@lru_cache(maxsize=None)
+def get_state_store() -> StateStore:
+    """Shared store for the process, chosen by the STATE_BACKEND environment variable"""
+    backend = os.getenv('STATE_BACKEND', DEFAULT_STATE_BACKEND).lower()
+    if backend == 'redis':
+        return RedisStateStore(os.getenv('REDIS_URL', 'redis://localhost:6379/0'))
+    if backend == 'local':
+        return LocalStateStore()
+    raise ValueError(f"Unknown state backend '{backend}', expected 'local' or 'redis'")
+
+
+def _key(*parts) -> str:
+    return ":".join((STATE_KEY_PREFIX,) + tuple(str(part) for part in parts))
+
+
+def get_cached_plan(plan_key: str) -> Optional[Dict]:
+    """Cached plan as {'workout_plan': raw response, 'days': days_data, 'profile': canonical profile}, or None"""
+    return get_state_store().get_json(_key('plan', plan_key))
+
+
+def cache_plan(plan_key: str, workout_plan_json: str, days_data: List[Dict], profile: Optional[Dict] = None):
+    get_state_store().set_json(_key('plan', plan_key),
+                               {'workout_plan': workout_plan_json, 'days': days_data, 'profile': profile},
+                               PLAN_CACHE_TTL)
+
+
+def register_indexed_plan(plan_key: str):
+    """Add a cached plan to the set every replica's similarity index is built from"""
+    get_state_store().incr_fields(_key('plan_index'), {plan_key: 1}, PLAN_CACHE_TTL)
+
+
+def get_indexed_plan_keys() -> List[str]:
+    """Keys of plans registered for similarity search, some may have expired from the cache"""
+    return list(get_state_store().get_fields(_key('plan_index')))
+
+
+def claim_generation(plan_key: str) -> bool:
+    """Register this replica as generating a plan, False if another request already is"""
+    return get_state_store().add_json(_key('inflight', plan_key),
+                                      {'replica': REPLICA_ID, 'started_at': time.time()},
+                                      INFLIGHT_TTL)
+
+
+def release_generation(plan_key: str):
+    get_state_store().delete(_key('inflight', plan_key))
+
+
+def wait_for_plan(plan_key: str, is_cancelled: Optional[Callable[[], bool]] = None) -> Optional[Dict]:
+    """Wait while another request generates the same plan, returning it once cached (or None if cancelled)"""
+    store = get_state_store()
+    while store.get_json(_key('inflight', plan_key)) is not None:
+        if is_cancelled is not None and is_cancelled():
+            return None
+        time.sleep(INFLIGHT_POLL_INTERVAL)
+    return get_cached_plan(plan_key)
+
+
+def record_usage(model: str, request_type: str, input_tokens: int, output_tokens: int, total_cost: float):
+    """Add one model call to today's ledger, totals per model and overall"""
+    store = get_state_store()
+    ledger_key = _key('usage', date.today().isoformat())
+    amounts = {
+        'requests': 1,
+        'input_tokens': input_tokens,
+        'output_tokens': output_tokens,
+        'total_cost': total_cost,
+        f'{model}:requests': 1,
+        f'{model}:total_cost': total_cost,
+        f'{request_type}:requests': 1,
+    }
+    store.incr_fields(ledger_key, amounts, USAGE_LEDGER_TTL)
+
+
+def record_token_prediction(request_type: str, predicted_tokens: int, actual_tokens: int, truncated: bool):
+    """Add one call's predicted and actual output tokens to today's ledger, for tuning the predictor"""
+    amounts = {
+        f'prediction:{request_type}:calls': 1,
+        f'prediction:{request_type}:predicted_tokens': predicted_tokens,
+        f'prediction:{request_type}:actual_tokens': actual_tokens,
+        f'prediction:{request_type}:truncated': int(truncated),
+    }
+    get_state_store().incr_fields(_key('usage', date.today().isoformat()), amounts, USAGE_LEDGER_TTL)
+
+
+def record_cancellation(reason: str, wasted_tokens: int, wasted_cost: float, occupied_seconds: float):
+    """Add a cancelled model call to today's ledger: tokens and cost spent on it, seconds it held a worker"""
+    amounts = {
+        'cancelled:requests': 1,
+        f'cancelled:{reason}': 1,
+        'cancelled:wasted_tokens': wasted_tokens,
+        'cancelled:wasted_cost': wasted_cost,
+        'cancelled:occupied_seconds': occupied_seconds,
+    }
+    get_state_store().incr_fields(_key('usage', date.today().isoformat()), amounts, USAGE_LEDGER_TTL)
+
+
+def record_cache_lookup(source: str):
+    """Count where a plan request was served from: plan_cache, warm_pool, similar_plan, shared_inflight or miss"""
+    get_state_store().incr_fields(_key('usage', date.today().isoformat()), {f'cache:{source}': 1}, USAGE_LEDGER_TTL)
+
+
+def get_usage_totals(day: Optional[str] = None) -> Dict[str, float]:
+    """Ledger totals for a day (ISO date, defaults to today) across all replicas"""
+    return get_state_store().get_fields(_key('usage', day or date.today().isoformat()))
+
+
+def record_demand(combination_id: str):
+    """Count one request for a base combination in today's demand tally"""
+    get_state_store().incr_fields(_key('demand', date.today().isoformat()), {combination_id: 1},
+                                  (WARM_POOL_LOOKBACK_DAYS + 1) * 24 * 3600)
+
+
+def get_demand(lookback_days: int = WARM_POOL_LOOKBACK_DAYS) -> Dict[str, float]:
+    """Request counts per base combination over the last lookback_days days"""
+    store = get_state_store()
+    totals = {}
+    for offset in range(lookback_days):
+        day = (date.today() - timedelta(days=offset)).isoformat()
+        for combination_id, count in store.get_fields(_key('demand', day)).items():
+            totals[combination_id] = totals.get(combination_id, 0) + count
+    return totals
+
+
+def get_warm_plan(combination_id: str) -> Optional[Dict]:
+    """Pre-generated plan as {'workout_plan': raw response, 'days': days_data}, or None"""
+    return get_state_store().get_json(_key('warm', combination_id))
+
+
+def store_warm_plan(combination_id: str, workout_plan_json: str, days_data: List[Dict]):
+    get_state_store().set_json(_key('warm', combination_id),
+                               {'workout_plan': workout_plan_json, 'days': days_data, 'created_at': time.time()},
+                               WARM_POOL_TTL)
+
+
+def claim_warm_pool_run() -> bool:
+    """Let only one replica fill the warm pool at a time"""
+    return get_state_store().add_json(_key('warm_pool_run'), {'replica': REPLICA_ID, 'started_at': time.time()},
+                                      WARM_POOL_CHECK_INTERVAL)
+
+
+def release_warm_pool_run():
+    get_state_store().delete(_key('warm_pool_run'))
+
+
+def create_job(payload: Optional[Dict] = None) -> str:
+    job_id = uuid.uuid4().hex
+    job = {'job_id': job_id, 'status': 'queued', 'created_at': time.time(), 'replica': REPLICA_ID}
+    job.update(payload or {})
+    get_state_store().set_json(_key('job', job_id), job, JOB_TTL)
+    return job_id
+
+
+def update_job(job_id: str, **fields):
+    """Merge fields into a job record; each job is only written by the replica running it"""
+    store = get_state_store()
+    job = store.get_json(_key('job', job_id))
+    if job is not None:
+        job.update(fields)
+        store.set_json(_key('job', job_id), job, JOB_TTL)
+
+
+def get_job(job_id: str) -> Optional[Dict]:
+    return get_state_store().get_json(_key('job', job_id))
+
+
+def claim_job(job_id: str) -> bool:
+    """Make this replica the one running a job, False while another replica holds a live claim"""
+    return get_state_store().add_json(_key('job_claim', job_id), {'replica': REPLICA_ID, 'claimed_at': time.time()},
+                                      JOB_CLAIM_TTL)
+
+
+def renew_job_claim(job_id: str) -> bool:
+    """Extend this replica's claim on a job, False if another replica has taken it over"""
+    store = get_state_store()
+    claim = store.get_json(_key('job_claim', job_id))
+    if claim is not None and claim['replica'] != REPLICA_ID:
+        return False
+    store.set_json(_key('job_claim', job_id), {'replica': REPLICA_ID, 'claimed_at': time.time()}, JOB_CLAIM_TTL)
+    return True
+
+
+def release_job_claim(job_id: str):
+    get_state_store().delete(_key('job_claim', job_id))
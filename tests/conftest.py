@@ -0,0 +1,27 @@
+import os
+import sys
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+sys.path.insert(0, os.path.join(ROOT, 'benchmarks'))
+
+import shared_state
+import mock_llm_server
+from shared_state import LocalStateStore
+
+
+@pytest.fixture
+def store(monkeypatch):
+    """Fresh in-process state store in place of the process-wide one"""
+    store = LocalStateStore()
+    monkeypatch.setattr(shared_state, 'get_state_store', lambda: store)
+    return store
+
+
+@pytest.fixture(scope='session')
+def mock_llm_url():
+    """Base URL of the stand-in OpenAI-compatible server from benchmarks/mock_llm_server.py"""
+    server = mock_llm_server.start_server(0)
+    yield f"http://127.0.0.1:{server.server_address[1]}/v1"
+    server.shutdown()
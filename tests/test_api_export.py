@@ -0,0 +1,61 @@
+import json
+import asyncio
+import pytest
+import api
+import warm_pool
+
+
+def export(payload):
+    async def body():
+        return payload
+    return asyncio.run(api.export({'body': body}))
+
+
+def call_app(method, path, body=b''):
+    """Run one HTTP request through the ASGI app and return (status, decoded body)"""
+    messages = [{'type': 'http.request', 'body': body, 'more_body': False}]
+    sent = []
+
+    async def receive():
+        return messages.pop(0) if messages else {'type': 'http.disconnect'}
+
+    async def send(message):
+        sent.append(message)
+
+    scope = {'type': 'http', 'method': method, 'path': path, 'query_string': b'', 'headers': []}
+    asyncio.run(api.app(scope, receive, send))
+    status = next(message['status'] for message in sent if message['type'] == 'http.response.start')
+    content = b''.join(message.get('body', b'') for message in sent if message['type'] == 'http.response.body')
+    return status, json.loads(content)
+
+
+PROFILE = warm_pool.base_profile('Advanced|Muscle Gain|3|60')
+
+
+def test_program_export_coerces_days_through_the_parser():
+    days = [{'day': 1, 'exercises': [{'exercise_name': 'Back Squat', 'total_sets': '3', 'reps': '8-10'}]}]
+    status, content, _ = export({'format': 'json', 'profile': PROFILE, 'days': days, 'weeks': 4})
+    program = json.loads(content)['workout_plan']['program']
+    assert status == 200
+    assert len(program) == 4
+    assert program[0]['days'][0]['exercises'][0]['parameters']['total_sets'] == 3
+
+
+def test_export_rejects_days_without_named_exercises():
+    with pytest.raises(api.RequestValidationError) as error:
+        export({'format': 'json', 'profile': PROFILE, 'days': [{'day': 1, 'exercises': [{}]}]})
+    assert error.value.errors == ["days[0]: no exercise has an 'exercise_name'"]
+
+
+def test_unhandled_errors_are_logged(monkeypatch):
+    logged = []
+    monkeypatch.setattr(api, 'log_event', lambda event, *args, **fields: logged.append((event, fields)))
+
+    async def broken(request):
+        raise RuntimeError("boom")
+    monkeypatch.setitem(api.ROUTES, ('GET', ('v1', 'broken')), broken)
+
+    status, body = call_app('GET', '/v1/broken')
+    assert status == 500 and body == {'error': 'Internal server error'}
+    assert logged[0][0] == 'request_failed'
+    assert 'RuntimeError: boom' in logged[0][1]['traceback']
@@ -0,0 +1,55 @@
+import time
+import asyncio
+import threading
+import pytest
+import api
+import shared_state
+from shared_state import create_job, get_job, claim_job
+
+
+@pytest.fixture
+def generations(monkeypatch):
+    """Count generations, each held until the test releases it"""
+    calls = []
+    done = threading.Event()
+
+    def generate_plan(profile):
+        calls.append(profile)
+        done.wait(5)
+        return {'days': [], 'generation_time': 0.0}
+
+    monkeypatch.setattr(api, 'generate_plan', generate_plan)
+    yield calls, done
+    done.set()
+
+
+def poll(job_id):
+    return asyncio.run(api.get_job({}, job_id))[1]
+
+
+def test_job_of_a_dead_replica_is_resumed_once(store, generations):
+    calls, done = generations
+    # Left queued by a replica that stopped without releasing or renewing a claim
+    job_id = create_job({'profile': {'name': 'a'}, 'updated_at': time.time()})
+
+    for _ in range(5):
+        poll(job_id)
+    time.sleep(0.1)
+    assert len(calls) == 1
+
+    done.set()
+    for _ in range(50):
+        if poll(job_id)['status'] == 'succeeded':
+            break
+        time.sleep(0.02)
+    assert get_job(job_id)['status'] == 'succeeded'
+
+
+def test_job_claimed_by_a_live_replica_is_left_alone(store, generations):
+    calls, _ = generations
+    job_id = create_job({'profile': {'name': 'a'}, 'updated_at': time.time() - 3600})
+    assert claim_job(job_id)
+    store.set_json(shared_state._key('job_claim', job_id), {'replica': 'other', 'claimed_at': time.time()})
+
+    assert poll(job_id)['status'] == 'queued'
+    assert calls == []
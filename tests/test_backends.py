@@ -0,0 +1,45 @@
+import json
+import pytest
+import warm_pool
+import mock_llm_server
+from backends import CassetteBackend, CassetteMissError, GenerationBackend, LocalOpenAICompatibleBackend
+from models import WorkoutPlanGenerator
+
+
+def messages(prompt):
+    return [{'role': 'system', 'content': 'You are a trainer.'}, {'role': 'user', 'content': prompt}]
+
+
+def test_backend_must_implement_complete():
+    with pytest.raises(TypeError):
+        GenerationBackend()
+
+
+def test_cassette_replays_recorded_completions(tmp_path, mock_llm_url):
+    path = str(tmp_path / 'plans.jsonl')
+    recorder = CassetteBackend(path, 'record', LocalOpenAICompatibleBackend(mock_llm_url, 'local-model'))
+    recorded = [recorder.complete(messages(f"Create a {days}-day plan"), 'local') for days in (2, 3)]
+
+    player = CassetteBackend(path, 'replay')
+    for days, result in zip((2, 3), recorded):
+        replayed = player.complete(messages(f"Create a {days}-day plan"), 'local')
+        assert replayed['content'] == result['content']
+        assert (replayed['input_tokens'], replayed['output_tokens']) == (result['input_tokens'], result['output_tokens'])
+        assert len(json.loads(replayed['content'])['workout_plan']) == days
+    with pytest.raises(CassetteMissError):
+        player.complete(messages("Create a 4-day plan"), 'local')
+
+
+@pytest.mark.usefixtures('store')
+def test_truncated_plan_is_salvaged_and_only_missing_days_repaired(mock_llm_url):
+    profile = warm_pool.base_profile('Beginner|Muscle Gain|3|30')
+    generator = WorkoutPlanGenerator(backend=LocalOpenAICompatibleBackend(mock_llm_url, 'local-model'))
+    full_plan = mock_llm_server.build_plan("Create a 3-day plan")
+    # Cut off inside day 3, as a response hitting max_tokens would be
+    truncated = full_plan[:full_plan.index('"day_3"') + 60]
+
+    requests_before = mock_llm_server.MockLLMHandler.request_count
+    days_data = generator.parse_and_repair_workout_plan(truncated, profile)
+    assert [day['day'] for day in days_data] == [1, 2, 3]
+    assert all(day['exercises'] for day in days_data)
+    assert mock_llm_server.MockLLMHandler.request_count - requests_before == 1
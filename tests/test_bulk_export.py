@@ -0,0 +1,63 @@
+import csv
+import json
+import pytest
+import bulk_export
+import warm_pool
+
+PROFILE = dict(warm_pool.base_profile('Advanced|Muscle Gain|3|60'), weight=80)
+
+
+def write_plans(path, records):
+    path.write_text(''.join(json.dumps(record) + '\n' for record in records), encoding='utf-8')
+    return str(path)
+
+
+def plan_record(total_sets):
+    return {'profile': PROFILE, 'days': [{
+        'day': 1, 'title': 'Day 1 - Lower Body', 'workout_type': 'Strength',
+        'exercises': [
+            {'exercise_name': 'Back Squat', 'total_sets': total_sets, 'reps': '8-10', 'rest_time': '90s',
+             'substituted_for': 'Barbell Squat'},
+            {'exercise_name': '', 'total_sets': 3},
+        ]
+    }]}
+
+
+def test_file_records_are_coerced_and_invalid_ones_skipped(tmp_path, capsys):
+    plans = write_plans(tmp_path / 'plans.jsonl', [
+        plan_record('4'),
+        {'profile': PROFILE, 'days': 'not a list'},
+        plan_record(3),
+    ])
+    output = str(tmp_path / 'plans.csv')
+
+    summary = bulk_export.export_plans(bulk_export.iter_plan_files([plans]), output, 'csv', batch_rows=1)
+
+    with open(output, encoding='utf-8', newline='') as exported:
+        rows = list(csv.DictReader(exported))
+    assert summary == {'plans': 2, 'rows': 2}
+    assert [row['sets'] for row in rows] == ['4', '3']
+    assert rows[0]['day_title'] == 'Day 1 - Lower Body'
+    assert rows[0]['substituted_for'] == 'Barbell Squat'
+    assert float(rows[0]['calories_burned']) > 0
+    assert 'plans.jsonl:2' in capsys.readouterr().err
+
+
+@pytest.mark.skipif(bulk_export.pa is None, reason="pyarrow is not installed")
+@pytest.mark.parametrize('export_format', ['parquet', 'arrow'])
+def test_string_sets_stream_into_columnar_files(tmp_path, export_format):
+    plans = write_plans(tmp_path / 'plans.jsonl', [plan_record(3), plan_record('4')])
+    output = str(tmp_path / f'plans.{export_format}')
+
+    bulk_export.export_plans(bulk_export.iter_plan_files([plans]), output, export_format, batch_rows=1)
+
+    if export_format == 'parquet':
+        table = bulk_export.pq.read_table(output)
+    else:
+        table = bulk_export.pa.ipc.open_file(output).read_all()
+    assert table.column('sets').to_pylist() == [3, 4]
+
+
+def test_row_writer_is_abstract():
+    with pytest.raises(TypeError):
+        bulk_export.RowWriter()
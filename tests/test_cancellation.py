@@ -0,0 +1,57 @@
+import pytest
+import warm_pool
+from backends import GenerationBackend, estimate_tokens
+from cancellation import CancelToken, GenerationCancelled, cancellation_scope
+from models import WorkoutPlanGenerator
+from shared_state import get_cached_plan
+from canonical_profile import profile_cache_key
+from mock_llm_server import build_plan
+
+pytestmark = pytest.mark.usefixtures('store')
+
+
+class CannedBackend(GenerationBackend):
+    """Answers with the mock server's canned plans, running on_complete once a response is ready"""
+
+    name = "canned"
+    requires_api_key = False
+
+    def __init__(self, on_complete=None):
+        super().__init__()
+        self.on_complete = on_complete
+        self.calls = 0
+
+    def complete(self, messages, model=None, **options):
+        self.calls += 1
+        content = build_plan(messages[-1]['content'])
+        if self.on_complete is not None:
+            self.on_complete()
+        return {'content': content, 'model': model, 'input_tokens': estimate_tokens(messages[-1]['content']),
+                'output_tokens': estimate_tokens(content), 'finish_reason': 'stop'}
+
+
+def test_cancelled_after_the_response_arrived_keeps_the_plan():
+    profile = warm_pool.base_profile('Beginner|Muscle Gain|3|30')
+    token = CancelToken()
+    backend = CannedBackend(on_complete=lambda: token.cancel('interrupted'))
+    generator = WorkoutPlanGenerator(backend=backend)
+
+    with cancellation_scope(token), pytest.raises(GenerationCancelled):
+        generator.create_workout_plan(profile)
+    assert get_cached_plan(profile_cache_key(profile)[0]) is not None
+
+    # The rerun is served from the cache instead of paying for the plan again
+    _, days_data = generator.create_workout_plan(profile)
+    assert len(days_data) == 3
+    assert backend.calls == 1
+
+
+def test_cancelled_before_the_call_spends_nothing():
+    profile = warm_pool.base_profile('Beginner|Muscle Gain|3|30')
+    token = CancelToken()
+    token.cancel('interrupted')
+    backend = CannedBackend()
+
+    with cancellation_scope(token), pytest.raises(GenerationCancelled):
+        WorkoutPlanGenerator(backend=backend).create_workout_plan(profile)
+    assert backend.calls == 0
@@ -0,0 +1,61 @@
+import copy
+from utils import estimate_exercise_duration, parse_work_seconds
+from plan_parser import validate_day
+from duration_fit import day_duration, fit_day_duration, fit_plan_durations
+
+
+def exercise(name, exercise_type, sets, reps, rest):
+    return {'exercise_name': name, 'exercise_type': exercise_type, 'total_sets': sets, 'reps': reps, 'rest_time': rest}
+
+
+def timed_day(main_sets: int, main_rest: str) -> dict:
+    """A typical session: timed warm-up, five lifts, a timed plank and a timed cooldown"""
+    return validate_day(1, {'exercises': [
+        exercise('Dynamic Warm-up', 'Warm-up', 1, '5 minutes', '0s'),
+        exercise('Back Squat', 'Compound', main_sets, '8-10', main_rest),
+        exercise('Bench Press', 'Compound', main_sets, '8-10', main_rest),
+        exercise('Barbell Row', 'Compound', main_sets, '8-10', main_rest),
+        exercise('Romanian Deadlift', 'Compound', main_sets, '10-12', main_rest),
+        exercise('Overhead Press', 'Compound', main_sets, '8-10', main_rest),
+        exercise('Plank', 'Core', 3, '30 seconds', '60s'),
+        exercise('Static Stretching', 'Cooldown', 1, '5 min', '0s'),
+    ]})
+
+
+def test_timed_reps_count_as_work_time():
+    assert parse_work_seconds('30 seconds') == 30
+    assert parse_work_seconds('30-45s') == 37.5
+    assert parse_work_seconds('5 minutes') == 300
+    assert parse_work_seconds('8-12') is None
+    assert estimate_exercise_duration(1, '5 minutes', '0s') == 5.0
+    assert estimate_exercise_duration(3, '30 seconds', '60s') == 4.5
+    assert estimate_exercise_duration(3, '10', '60s') == 4.5
+
+
+def test_timed_day_estimate_matches_session():
+    day = timed_day(4, '90s')
+    assert 50 <= day_duration(day) <= 60
+
+
+def test_fitting_leaves_a_realistic_plan_alone():
+    day = timed_day(4, '90s')
+    original = copy.deepcopy(day)
+    assert fit_day_duration(day, 60, 'Intermediate')
+    assert [(e['total_sets'], e['rest_time']) for e in day['exercises']] == \
+        [(e['total_sets'], e['rest_time']) for e in original['exercises']]
+
+
+def test_advanced_long_session_stays_within_bounds():
+    day = timed_day(5, '120s')
+    assert fit_plan_durations([day], {'session_duration': 90, 'fitness_level': 'Advanced'}) == []
+    # Within tolerance already, so the lifts keep their prescription instead of being pushed to max_sets
+    assert [e['total_sets'] for e in day['exercises'] if e['exercise_type'] == 'Compound'] == [5] * 5
+
+
+def test_fitting_refreshes_stale_estimates():
+    day = timed_day(4, '90s')
+    for e in day['exercises']:
+        e['estimated_duration'] = 0.25
+    fit_day_duration(day, 60, 'Intermediate')
+    assert day['exercises'][0]['estimated_duration'] == 5.0
+    assert day['exercises'][6]['estimated_duration'] == 4.5
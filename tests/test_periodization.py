@@ -0,0 +1,34 @@
+from plan_parser import validate_day
+from periodization import build_program
+from duration_fit import day_duration, is_within_tolerance
+
+
+def base_day() -> dict:
+    lifts = [{'exercise_name': name, 'exercise_type': 'Compound', 'total_sets': 4, 'reps': '8-10', 'rest_time': '90s'}
+             for name in ('Back Squat', 'Bench Press', 'Barbell Row', 'Romanian Deadlift', 'Overhead Press')]
+    day = validate_day(1, {'workout_duration': 60, 'exercises': [
+        {'exercise_name': 'Dynamic Warm-up', 'exercise_type': 'Warm-up', 'total_sets': 1, 'reps': '5 minutes',
+         'rest_time': '0s'},
+        *lifts,
+        {'exercise_name': 'Static Stretching', 'exercise_type': 'Cooldown', 'total_sets': 1, 'reps': '5 min',
+         'rest_time': '0s'},
+    ]})
+    return day
+
+
+def test_progressed_weeks_stay_within_the_session():
+    base = base_day()
+    program = build_program([base], 'Advanced', 12, 80.0, 60)
+    for week in program[1:]:
+        day = week['days'][0]
+        assert day_duration(day) <= 60 or is_within_tolerance(day_duration(day), 60)
+        assert day['workout_duration'] == round(day_duration(day))
+    # Progression still adds volume, paid for with shorter rest
+    assert program[-2]['days'][0]['exercises'][1]['total_sets'] > base['exercises'][1]['total_sets']
+    assert any(exercise['rest_time'] != '90s' for exercise in program[-2]['days'][0]['exercises'][1:6])
+    assert base['exercises'][1]['rest_time'] == '90s'
+
+
+def test_without_a_session_duration_weeks_only_progress():
+    program = build_program([base_day()], 'Advanced', 12, 80.0)
+    assert day_duration(program[-2]['days'][0]) > 60 * 1.15
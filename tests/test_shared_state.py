@@ -0,0 +1,80 @@
+import time
+import threading
+import pytest
+import shared_state
+import mock_redis_server
+from shared_state import (
+    StateStore, LocalStateStore, RedisStateStore, claim_generation, release_generation, wait_for_plan, cache_plan
+)
+
+
+@pytest.fixture(scope='module')
+def redis_url():
+    """URL of the Redis-protocol stand-in from benchmarks/mock_redis_server.py"""
+    server = mock_redis_server.start_server(0)
+    yield f"redis://127.0.0.1:{server.server_address[1]}/0"
+    server.shutdown()
+
+
+@pytest.fixture(params=['local', 'redis'])
+def any_store(request, monkeypatch):
+    """Each StateStore implementation, installed as the process-wide store"""
+    if request.param == 'redis':
+        store = RedisStateStore(request.getfixturevalue('redis_url'))
+        store.client.flushdb()
+    else:
+        store = LocalStateStore()
+    monkeypatch.setattr(shared_state, 'get_state_store', lambda: store)
+    return store
+
+
+def test_state_store_is_abstract():
+    with pytest.raises(TypeError):
+        StateStore()
+
+
+def test_add_json_only_sets_missing_keys(any_store):
+    assert any_store.add_json('key', {'n': 1}, 60)
+    assert not any_store.add_json('key', {'n': 2}, 60)
+    assert any_store.get_json('key') == {'n': 1}
+    any_store.delete('key')
+    assert any_store.get_json('key') is None
+
+
+def test_values_expire(any_store):
+    any_store.set_json('key', [1], 1)
+    assert any_store.get_json('key') == [1]
+    time.sleep(1.1)
+    assert any_store.get_json('key') is None
+
+
+def test_counters_add_up(any_store):
+    any_store.incr_fields('usage', {'tokens': 10, 'cost': 0.5})
+    any_store.incr_fields('usage', {'tokens': 5})
+    assert any_store.get_fields('usage') == {'tokens': 15.0, 'cost': 0.5}
+
+
+def test_only_one_request_claims_a_generation(any_store):
+    assert claim_generation('plan')
+    assert not claim_generation('plan')
+    release_generation('plan')
+    assert claim_generation('plan')
+
+
+def test_waiting_request_gets_the_plan_once_released(any_store, monkeypatch):
+    monkeypatch.setattr(shared_state, 'INFLIGHT_POLL_INTERVAL', 0.01)
+    assert claim_generation('plan')
+
+    def finish():
+        time.sleep(0.1)
+        cache_plan('plan', '{}', [{'day': 1, 'exercises': []}])
+        release_generation('plan')
+
+    threading.Thread(target=finish).start()
+    cached = wait_for_plan('plan')
+    assert cached['days'] == [{'day': 1, 'exercises': []}]
+
+
+def test_waiting_stops_when_cancelled(any_store):
+    assert claim_generation('plan')
+    assert wait_for_plan('plan', is_cancelled=lambda: True) is None
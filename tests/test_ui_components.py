@@ -0,0 +1,12 @@
+from streamlit.testing.v1 import AppTest
+
+
+def render_empty_plan():
+    from ui_components import display_professional_workout_plan
+    display_professional_workout_plan([])
+
+
+def test_empty_plan_shows_a_message_instead_of_failing():
+    app = AppTest.from_function(render_empty_plan).run()
+    assert not app.exception
+    assert app.info[0].value == "This plan has no workout days to show."
@@ -0,0 +1,184 @@
+"""
+Output-token prediction and spend budgets for model calls.
+
+Each call gets a max_tokens derived from what it asks for (days x exercises per day
+x exercise schema fields) plus headroom, and is refused before it is sent when its
+estimated cost would overrun the session or daily budget. Predicted and actual
+output tokens go to the usage ledger; check how well the predictor fits with:
+    python token_budget.py [--days 7]
+Batch runs with a token budget of their own (the warm pool) count their calls'
+tokens with track_usage, since the generator is shared between sessions.
+"""
+import os
+import math
+import argparse
+import contextvars
+from contextlib import contextmanager
+from datetime import date, timedelta
+from typing import Dict, Optional
+import streamlit as st
+from streamlit.runtime.scriptrunner import get_script_run_ctx
+from utils import calculate_token_costs
+from backends import estimate_tokens
+from plan_parser import EXERCISE_SCHEMA
+from shared_state import get_usage_totals, record_token_prediction
+from config import (
+    OUTPUT_TOKENS_PER_FIELD, CATALOG_EXERCISE_FIELDS, OUTPUT_TOKENS_PER_DAY, OUTPUT_TOKENS_PER_PLAN,
+    MINUTES_PER_EXERCISE, WARMUP_COOLDOWN_EXERCISES, MAX_TOKENS_HEADROOM, MAX_TOKENS_FLOOR, MAX_TOKENS_CEILING,
+    SESSION_SPEND_BUDGET, DAILY_SPEND_BUDGET
+)
+
+PREDICTION_PREFIX = 'prediction:'
+
+_usage_meter = contextvars.ContextVar('usage_meter', default=None)
+
+
+class BudgetExceededError(Exception):
+    """A model call was refused because it would overrun a spend budget"""
+
+
+def exercises_per_day(session_duration) -> int:
+    """Expected exercises in a session: one per MINUTES_PER_EXERCISE plus warm-up and cool-down"""
+    return WARMUP_COOLDOWN_EXERCISES + math.ceil(int(session_duration) / MINUTES_PER_EXERCISE)
+
+
+def predict_output_tokens(user_data: Dict, days: Optional[int] = None) -> int:
+    """
+    Estimate the output tokens of a plan response from its days, session duration and exercise schema.
+
+    Args:
+        user_data: Form data of the plan
+        days: Number of days requested, defaults to the whole week (repairs ask for fewer)
+
+    Returns:
+        Predicted output tokens
+    """
+    mode = 'catalog' if user_data.get('generation_mode') == 'catalog' else 'detailed'
+    fields = CATALOG_EXERCISE_FIELDS if mode == 'catalog' else len(EXERCISE_SCHEMA)
+    session_duration = user_data.get('session_duration', user_data.get('duration_per_session'))
+    if days is None:
+        days = user_data.get('training_days_per_week', user_data.get('weekly_frequency'))
+    per_day = OUTPUT_TOKENS_PER_DAY + exercises_per_day(session_duration) * fields * OUTPUT_TOKENS_PER_FIELD[mode]
+    return OUTPUT_TOKENS_PER_PLAN + int(days) * per_day
+
+
+def max_tokens_for(predicted_tokens: int) -> int:
+    """max_tokens for a call: the prediction with headroom, within the floor and ceiling"""
+    return max(MAX_TOKENS_FLOOR, min(MAX_TOKENS_CEILING, int(predicted_tokens * MAX_TOKENS_HEADROOM)))
+
+
+def estimate_call_cost(prompt_text: str, predicted_tokens: int, model: str) -> float:
+    """Expected cost of a call from its prompt size and predicted output"""
+    return calculate_token_costs(estimate_tokens(prompt_text), predicted_tokens, model)['total_cost']
+
+
+def _budget(name: str, default: float) -> float:
+    return float(os.getenv(name, default))
+
+
+def session_spend() -> Optional[float]:
+    """Spend of the current browser session, None outside one (API workers, warm pool)"""
+    if get_script_run_ctx(suppress_warning=True) is None or 'session_usage' not in st.session_state:
+        return None
+    usage = st.session_state.session_usage
+    return usage['total_input_cost'] + usage['total_output_cost']
+
+
+def budget_status() -> Dict:
+    """Spent, budget and remaining USD for this session and today, remaining is None when unlimited"""
+    session_budget = _budget('SESSION_SPEND_BUDGET', SESSION_SPEND_BUDGET)
+    daily_budget = _budget('DAILY_SPEND_BUDGET', DAILY_SPEND_BUDGET)
+    session_spent = session_spend()
+    daily_spent = get_usage_totals().get('total_cost', 0.0)
+    return {
+        'session_spent': session_spent,
+        'session_budget': session_budget,
+        'session_remaining': max(0.0, session_budget - session_spent)
+        if session_budget and session_spent is not None else None,
+        'daily_spent': daily_spent,
+        'daily_budget': daily_budget,
+        'daily_remaining': max(0.0, daily_budget - daily_spent) if daily_budget else None,
+    }
+
+
+def check_budget(estimated_cost: float):
+    """Raise BudgetExceededError if a call of estimated_cost would overrun the session or daily budget"""
+    status = budget_status()
+    if status['session_remaining'] is not None and estimated_cost > status['session_remaining']:
+        raise BudgetExceededError(
+            f"Session spend budget of ${status['session_budget']:.2f} reached "
+            f"(${status['session_spent']:.4f} spent). Start a new session to continue."
+        )
+    if status['daily_remaining'] is not None and estimated_cost > status['daily_remaining']:
+        raise BudgetExceededError(
+            f"Daily spend budget of ${status['daily_budget']:.2f} reached "
+            f"(${status['daily_spent']:.4f} spent). Please try again tomorrow."
+        )
+
+
+@contextmanager
+def track_usage():
+    """Count the input and output tokens of the model calls made inside on this thread"""
+    meter = {'input_tokens': 0, 'output_tokens': 0}
+    context_token = _usage_meter.set(meter)
+    try:
+        yield meter
+    finally:
+        _usage_meter.reset(context_token)
+
+
+def meter_usage(input_tokens: int, output_tokens: int):
+    """Add a call's tokens to the meter of the enclosing track_usage, if any"""
+    meter = _usage_meter.get()
+    if meter is not None:
+        meter['input_tokens'] += input_tokens
+        meter['output_tokens'] += output_tokens
+
+
+def record_prediction(request_type: str, predicted_tokens: int, actual_tokens: int,
+                      finish_reason: Optional[str] = None):
+    """Add predicted vs actual output tokens of a call to the usage ledger"""
+    record_token_prediction(request_type, predicted_tokens, actual_tokens, finish_reason == 'length')
+
+
+def prediction_report(days: int = 7) -> Dict[str, Dict]:
+    """Predicted vs actual output tokens per request type over the last days days"""
+    report = {}
+    for offset in range(days):
+        totals = get_usage_totals((date.today() - timedelta(days=offset)).isoformat())
+        for field, value in totals.items():
+            if not field.startswith(PREDICTION_PREFIX):
+                continue
+            request_type, metric = field[len(PREDICTION_PREFIX):].rsplit(':', 1)
+            entry = report.setdefault(request_type, {'calls': 0, 'predicted_tokens': 0,
+                                                     'actual_tokens': 0, 'truncated': 0})
+            entry[metric] += value
+    for entry in report.values():
+        entry['ratio'] = entry['actual_tokens'] / entry['predicted_tokens'] if entry['predicted_tokens'] else None
+    return report
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare predicted and actual output tokens")
+    parser.add_argument("--days", type=int, default=7, help="Days of usage ledger to include")
+    args = parser.parse_args()
+
+    report = prediction_report(args.days)
+    if not report:
+        print("No predictions recorded yet")
+        return
+    print(f"{'request type':<40} {'calls':>6} {'predicted':>10} {'actual':>10} {'ratio':>6} {'truncated':>9}")
+    for request_type, entry in sorted(report.items()):
+        calls = entry['calls'] or 1
+        print(f"{request_type:<40} {int(entry['calls']):>6} {entry['predicted_tokens'] / calls:>10.0f} "
+              f"{entry['actual_tokens'] / calls:>10.0f} {entry['ratio'] or 0:>6.2f} {int(entry['truncated']):>9}")
+    # A ratio far from 1 means OUTPUT_TOKENS_PER_FIELD should be scaled by it
+    predicted = sum(entry['predicted_tokens'] for entry in report.values())
+    actual = sum(entry['actual_tokens'] for entry in report.values())
+    if predicted:
+        print(f"Overall actual/predicted: {actual / predicted:.2f} "
+              f"(OUTPUT_TOKENS_PER_FIELD x {actual / predicted:.2f} to recalibrate)")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,11 +1,21 @@
+import time
 import streamlit as st
 from datetime import datetime
 from typing import Dict, List
+from streamlit.runtime import Runtime
+from streamlit.runtime.scriptrunner import get_script_run_ctx
 from config import (
     FITNESS_LEVELS, GOAL_OPTIONS, TRAINING_DAYS_OPTIONS, DURATION_OPTIONS,
-    TARGET_AREA_OPTIONS, EQUIPMENT_OPTIONS, PREFERENCE_OPTIONS, GENDER_OPTIONS
+    TARGET_AREA_OPTIONS, EQUIPMENT_OPTIONS, PREFERENCE_OPTIONS, GENDER_OPTIONS,
+    DEFAULT_MODEL, MODEL_REGISTRY, PROGRAM_WEEK_OPTIONS, EDIT_MAX_INSTRUCTION_CHARS
 )
+from cancellation import CancelToken
+from periodization import build_week, build_program
 from utils import create_workout_json_output, create_text_format
+from model_router import get_model_router
+from plan_parser import personalize_calories
+from canonical_profile import PERSONAL_FIELDS, profile_cache_key
+from token_budget import budget_status
 
 def load_css():
     """Load custom CSS for professional styling"""
@@ -291,8 +301,81 @@ def load_css():
     </style>
     """, unsafe_allow_html=True)
 
-def display_loading_animation():
-    """Display a modern, animated loading screen for workout generation"""
+@st.fragment
+def display_usage_panel():
+    """Display token usage and costs, rerunning on its own when the view changes"""
+    st.markdown("### 💰 Token Usage & Costs")
+    
+    # Token usage dropdown
+    usage_view = st.selectbox(
+        "📊 Usage Information",
+        options=["Latest Request", "Session Total", "Request History"],
+        help="View token usage and cost information"
+    )
+    
+    if usage_view == "Latest Request" and 'latest_usage' in st.session_state:
+        latest = st.session_state.latest_usage
+        st.metric("Model", MODEL_REGISTRY.get(latest.get('model'), {}).get('label', latest.get('model', DEFAULT_MODEL)))
+        st.metric("Input Tokens", f"{latest['input_tokens']:,}")
+        st.metric("Output Tokens", f"{latest['output_tokens']:,}")
+        st.metric("Total Tokens", f"{latest['total_tokens']:,}")
+        st.metric("Input Cost", f"${latest['costs']['input_cost']:.4f}")
+        st.metric("Output Cost", f"${latest['costs']['output_cost']:.4f}")
+        st.metric("Total Cost", f"${latest['costs']['total_cost']:.4f}")
+    
+    elif usage_view == "Session Total" and st.session_state.session_usage['total_requests'] > 0:
+        session = st.session_state.session_usage
+        # Requests may have been served by different models, so sum their individual costs
+        total_costs = {
+            'input_cost': session['total_input_cost'],
+            'output_cost': session['total_output_cost'],
+            'total_cost': session['total_input_cost'] + session['total_output_cost']
+        }
+        
+        st.metric("Total Requests", session['total_requests'])
+        st.metric("Total Input Tokens", f"{session['total_input_tokens']:,}")
+        st.metric("Total Output Tokens", f"{session['total_output_tokens']:,}")
+        st.metric("Total Tokens", f"{session['total_input_tokens'] + session['total_output_tokens']:,}")
+        st.metric("Session Input Cost", f"${total_costs['input_cost']:.4f}")
+        st.metric("Session Output Cost", f"${total_costs['output_cost']:.4f}")
+        st.metric("Session Total Cost", f"${total_costs['total_cost']:.4f}")
+    
+    elif usage_view == "Request History" and st.session_state.session_usage['requests']:
+        st.markdown("**Request History:**")
+        for i, req in enumerate(reversed(st.session_state.session_usage['requests'][-5:])):  # Show last 5
+            with st.expander(f"Request {len(st.session_state.session_usage['requests']) - i}"):
+                st.write(f"**Time:** {req['timestamp']}")
+                st.write(f"**Type:** {req['type']}")
+                st.write(f"**Model:** {req.get('model', DEFAULT_MODEL)}")
+                st.write(f"**Tokens:** {req['total_tokens']:,} ({req['input_tokens']:,} in + {req['output_tokens']:,} out)")
+                st.write(f"**Cost:** ${req['total_cost']:.4f}")
+    
+    elif st.session_state.session_usage['total_requests'] == 0:
+        st.info("No usage data yet. Generate a workout plan to see token usage and costs.")
+    
+    # Remaining spend budgets, new generations are refused once one runs out
+    budget = budget_status()
+    if budget['session_remaining'] is not None or budget['daily_remaining'] is not None:
+        st.markdown("---")
+        st.markdown("### 🧾 Spend Budget")
+        if budget['session_remaining'] is not None:
+            st.progress(min(1.0, budget['session_spent'] / budget['session_budget']),
+                        text=f"Session: ${budget['session_remaining']:.2f} of ${budget['session_budget']:.2f} left")
+        if budget['daily_remaining'] is not None:
+            st.progress(min(1.0, budget['daily_spent'] / budget['daily_budget']),
+                        text=f"Today (all users): ${budget['daily_remaining']:.2f} of ${budget['daily_budget']:.2f} left")
+    
+    # Pricing information
+    st.markdown("---")
+    st.markdown("### 💳 Model Pricing")
+    router = get_model_router()
+    for model, info in MODEL_REGISTRY.items():
+        latency = router.latency_stats(model)
+        latency_text = f" · p50 {latency['p50']:.1f}s" if latency['p50'] is not None else ""
+        st.write(f"**{info['label']}:** ${info['input_cost_per_million']}/1M in · ${info['output_cost_per_million']}/1M out{latency_text}")
+
+def display_loading_animation() -> bool:
+    """Display a modern, animated loading screen for workout generation, returning True when Cancel is clicked"""
     st.markdown("""
     <div class="loading-container">
         <div class="workout-animation">🏋️‍♂️</div>
@@ -300,77 +383,128 @@ def display_loading_animation():
         <div class="loading-subtitle">Our AI trainer is analyzing your fitness profile...</div>
     </div>
     """, unsafe_allow_html=True)
+    _, cancel_column, _ = st.columns([2, 1, 2])
+    with cancel_column:
+        return st.button("✖️ Cancel", key="cancel_generation", use_container_width=True)
+
+def generation_cancel_token(status) -> CancelToken:
+    """Cancel token for generating in this session: interrupted by reruns such as Cancel, or a closed session"""
+    start_time = time.perf_counter()
+    liveness = None
+    ctx = get_script_run_ctx(suppress_warning=True)
+    if ctx is not None and Runtime.exists():
+        runtime = Runtime.instance()
+        liveness = lambda: runtime.is_active_session(ctx.session_id)
+    # Updating the status is a Streamlit yield point, where a pending rerun or stop request surfaces
+    return CancelToken(liveness, poll=lambda: status.caption(f"⏱️ {time.perf_counter() - start_time:.0f}s"))
+
+EXERCISE_EMOJIS = {
+    'Compound': '🏋️‍♂️', 'Isolation': '💪', 'Warm-up': '🔥',
+    'Cooldown': '🧘‍♀️', 'Cardio': '🏃‍♂️', 'Flexibility': '🤸‍♀️'
+}
+
+def render_exercise_card(exercise: Dict) -> str:
+    """Build the HTML card for a single exercise"""
+    emoji = EXERCISE_EMOJIS.get(exercise['exercise_type'], '💪')
+    
+    # Build content HTML
+    content_parts = []
+    if exercise.get('target_muscle_group'):
+        content_parts.append(f"<p><strong>Target Muscles:</strong> {exercise['target_muscle_group']}</p>")
+    if exercise.get('equipment_required'):
+        content_parts.append(f"<p><strong>Equipment:</strong> {exercise['equipment_required']}</p>")
+    if exercise.get('tempo'):
+        content_parts.append(f"<p><strong>Tempo:</strong> {exercise['tempo']}</p>")
+    if exercise.get('breathing_pattern'):
+        content_parts.append(f"<p><strong>Breathing:</strong> {exercise['breathing_pattern']}</p>")
+    if exercise.get('superset_indicator') and exercise.get('superset_indicator') != 'None':
+        content_parts.append(f"<p><strong>Superset with:</strong> {exercise['superset_indicator']}</p>")
+    if exercise.get('substituted_for'):
+        content_parts.append(f"<p><strong>Replaces:</strong> {exercise['substituted_for']} (equipment or exercises to avoid)</p>")
+    
+    content_html = "".join(content_parts)
+    
+    # Build footer HTML dynamically with calories
+    footer_html = f"""
+    <div class="exercise-footer">
+        <div class="exercise-detail"><strong>{exercise['total_sets']}</strong><span>Total Sets</span></div>
+        <div class="exercise-detail"><strong>{exercise['reps']}</strong><span>Reps</span></div>
+        <div class="exercise-detail"><strong>{exercise['rest_time']}</strong><span>Rest</span></div>
+        <div class="exercise-detail"><strong>{exercise['weight']}</strong><span>Weight</span></div>
+    """
+    
+    # Add calories section if available
+    if exercise.get('calories_burned', 0) > 0:
+        footer_html += f"""<div class="exercise-detail"><strong style="display: block;">{exercise['calories_burned']}</strong><span style="display: block;">Calories</span></div>"""
+    
+    footer_html += "</div>"
+    
+    return f"""
+    <div class="exercise-card">
+        <div class="exercise-header">
+            <div>{emoji} <strong>{exercise['exercise_name']}</strong></div>  
+            <div class="exercise-type">{exercise['exercise_type']}</div>
+        </div>
+        <div class="exercise-content">
+            {content_html}
+        </div>
+        {footer_html}
+    </div>
+    """
+
+@st.cache_data(max_entries=256, show_spinner=False)
+def render_day_html(day_data: Dict) -> str:
+    """Build the HTML for one day, cached so revisiting a day does not rebuild its cards"""
+    header_html = f'<div class="day-header"><h2>🏋️ {day_data["title"]}</h2><p>Workout Type: {day_data["workout_type"]} | Duration: {day_data["workout_duration"]} minutes</p></div>'
+    cards_html = "".join(render_exercise_card(exercise) for exercise in day_data['exercises'])
+    return header_html + cards_html
 
 def display_professional_workout_plan(days_data: List[Dict]):
-    """Display the workout plan with professional styling"""
-    for day_data in days_data:
-        st.markdown(f'<div class="day-header"><h2>🏋️ {day_data["title"]}</h2><p>Workout Type: {day_data["workout_type"]} | Duration: {day_data["workout_duration"]} minutes</p></div>', 
-                   unsafe_allow_html=True)
-        
-        for exercise in day_data['exercises']:
-            exercise_emojis = {
-                'Compound': '🏋️‍♂️', 'Isolation': '💪', 'Warm-up': '🔥',
-                'Cooldown': '🧘‍♀️', 'Cardio': '🏃‍♂️', 'Flexibility': '🤸‍♀️'
-            }
-            emoji = exercise_emojis.get(exercise['exercise_type'], '💪')
-            
-            # Build content HTML
-            content_parts = []
-            if exercise.get('target_muscle_group'):
-                content_parts.append(f"<p><strong>Target Muscles:</strong> {exercise['target_muscle_group']}</p>")
-            if exercise.get('equipment_required'):
-                content_parts.append(f"<p><strong>Equipment:</strong> {exercise['equipment_required']}</p>")
-            if exercise.get('tempo'):
-                content_parts.append(f"<p><strong>Tempo:</strong> {exercise['tempo']}</p>")
-            if exercise.get('breathing_pattern'):
-                content_parts.append(f"<p><strong>Breathing:</strong> {exercise['breathing_pattern']}</p>")
-            if exercise.get('superset_indicator') and exercise.get('superset_indicator') != 'None':
-                content_parts.append(f"<p><strong>Superset with:</strong> {exercise['superset_indicator']}</p>")
-            
-            content_html = "".join(content_parts)
-            
-            # Build footer HTML dynamically with calories
-            footer_html = f"""
-            <div class="exercise-footer">
-                <div class="exercise-detail"><strong>{exercise['total_sets']}</strong><span>Total Sets</span></div>
-                <div class="exercise-detail"><strong>{exercise['reps']}</strong><span>Reps</span></div>
-                <div class="exercise-detail"><strong>{exercise['rest_time']}</strong><span>Rest</span></div>
-                <div class="exercise-detail"><strong>{exercise['weight']}</strong><span>Weight</span></div>
-            """
-            
-            # Add calories section if available
-            if exercise.get('calories_burned', 0) > 0:
-                footer_html += f"""<div class="exercise-detail"><strong style="display: block;">{exercise['calories_burned']}</strong><span style="display: block;">Calories</span></div>"""
-            
-            # footer_html += "</div>"
-            
-            # Render exercise card
-            st.markdown(f"""
-            <div class="exercise-card">
-                <div class="exercise-header">
-                    <div>{emoji} <strong>{exercise['exercise_name']}</strong></div>  
-                    <div class="exercise-type">{exercise['exercise_type']}</div>
-                </div>
-                <div class="exercise-content">
-                    {content_html}
-                </div>
-                {footer_html}
-            </div>
-            """, unsafe_allow_html=True)
-        
-        # Calculate and display total calories for the day
-        # day_calories = sum(ex.get('calories_burned', 0) for ex in day_data['exercises'])
-        
-        # if day_calories > 0:
-        #     st.markdown(f"""
-        #     <div style="background: linear-gradient(135deg, #f093fb 0%, #f5576c 100%); 
-        #                 padding: 1rem; border-radius: 15px; text-align: center; 
-        #                 color: white; margin: 1rem 0; box-shadow: 0 5px 20px rgba(240, 147, 251, 0.3);">
-        #         <h3 style="margin: 0;">🔥 Total Calories Burned: {day_calories:.1f} kcal</h3>
-        #     </div>
-        #     """, unsafe_allow_html=True)
-        
-        st.markdown("<br>", unsafe_allow_html=True)
+    """Display the workout plan one day at a time, building only the selected day"""
+    if not days_data:
+        st.info("This plan has no workout days to show.")
+        return
+    days_by_number = {day_data['day']: day_data for day_data in days_data}
+    
+    selected_day = st.radio(
+        "Workout Day",
+        options=list(days_by_number),
+        format_func=lambda day_number: f"Day {day_number}",
+        horizontal=True,
+        key="selected_day",
+        label_visibility="collapsed"
+    )
+    day_data = days_by_number.get(selected_day, days_data[0])
+    
+    # Render the whole day in a single element instead of one per exercise card
+    st.markdown(render_day_html(day_data), unsafe_allow_html=True)
+    st.markdown("<br>", unsafe_allow_html=True)
+
+def display_program_week(days_data: List[Dict], form_data: Dict):
+    """Display one week of a multi-week program derived locally from the generated week"""
+    num_weeks = st.selectbox(
+        "📆 Program Length",
+        options=PROGRAM_WEEK_OPTIONS,
+        format_func=lambda weeks: f"{weeks} week" if weeks == 1 else f"{weeks} weeks",
+        key="program_weeks"
+    )
+    
+    if num_weeks > 1:
+        # Shortening the program can leave the previously selected week out of range
+        if st.session_state.get('selected_week', 1) > num_weeks:
+            st.session_state.selected_week = num_weeks
+        week_number = st.select_slider(
+            "Program Week",
+            options=list(range(1, num_weeks + 1)),
+            format_func=lambda week: f"Week {week}",
+            key="selected_week"
+        )
+        week = build_week(days_data, form_data.get('fitness_level', ''), week_number, form_data.get('weight'),
+                          form_data.get('session_duration', form_data.get('duration_per_session')))
+        st.caption(f"Week {week['week']} of {num_weeks} · {week['phase']} week")
+        days_data = week['days']
+    
+    display_professional_workout_plan(days_data)
 
 def display_form(generator, is_edit=False):
     """Display the input form for workout plan generation with all additional fields"""
@@ -495,6 +629,12 @@ def display_form(generator, is_edit=False):
                                       placeholder="Any other information you'd like to share about your fitness goals, preferences, or circumstances...",
                                       help="Optional: Share any additional context that might help create a better workout plan")
         
+        fast_generation = st.toggle(
+            "⚡ Fast generation",
+            value=form_data.get('generation_mode') == 'catalog',
+            help="Build the plan from our exercise library. Much faster and cheaper, with exercise details filled in locally."
+        )
+        
         st.markdown('</div>', unsafe_allow_html=True)
         
         # Submit Button
@@ -505,7 +645,7 @@ def display_form(generator, is_edit=False):
             if not all([age, gender, weight, height, fitness_level, goal, training_days_per_week, session_duration]):
                 st.error("❌ Please fill in all required fields.")
             else:
-                st.session_state.form_data = {
+                new_form_data = {
                     'name': name,
                     'age': age,
                     'gender': gender.lower(),
@@ -521,15 +661,119 @@ def display_form(generator, is_edit=False):
                     'health_limitations': health_limitations,
                     'exercises_to_avoid': exercises_to_avoid,
                     'additional_notes': additional_notes,
+                    'generation_mode': 'catalog' if fast_generation else 'detailed',
                     # Keep compatibility with existing code
                     'weekly_frequency': training_days_per_week,
                     'duration_per_session': session_duration
                 }
                 
-                st.session_state.page = 'generating'
+                previous_form_data = st.session_state.get('form_data', {})
+                changed_fields = {field for field, value in new_form_data.items() if previous_form_data.get(field) != value}
+                st.session_state.form_data = new_form_data
+                # Resubmitting unchanged details regenerates on purpose; a weight in another band changes the plan
+                personal_only = (
+                    is_edit and st.session_state.get('days_data')
+                    and changed_fields and changed_fields <= set(PERSONAL_FIELDS)
+                    and profile_cache_key(previous_form_data)[0] == profile_cache_key(new_form_data)[0]
+                )
+                if personal_only:
+                    # Only personal details changed, update the existing plan instead of regenerating
+                    personalize_calories(st.session_state.days_data, weight)
+                    st.session_state.page = 'results'
+                else:
+                    st.session_state.page = 'generating'
                 st.rerun()
 
-def display_results():
+@st.fragment
+def display_download_controls():
+    """Download format picker, rerun on its own so choosing a format does not repaint the plan"""
+    timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+    
+    # Download dropdown with format selection
+    download_format = st.selectbox(
+        "📥 Download Plan",
+        options=[
+            "Select Format", 
+            "Text (.txt)", 
+            "JSON (.json)"
+        ],
+        key="download_format_select"
+    )
+    
+    if download_format != "Select Format" and 'days_data' in st.session_state and 'form_data' in st.session_state:
+        if download_format == "Text (.txt)":
+            filename = f"workout_plan_{timestamp}.txt"
+            text_content = create_text_format(
+                st.session_state.days_data, 
+                st.session_state.form_data
+            )
+            st.download_button(
+                label="⬇️ Download Text File",
+                data=text_content,
+                file_name=filename,
+                mime="text/plain",
+                use_container_width=True,
+                key="download_text_btn"
+            )
+        
+        elif download_format == "JSON (.json)":
+            filename = f"workout_plan_{timestamp}.json"
+            # A multi-week program exports every week, derived locally like the week view
+            num_weeks = st.session_state.get('program_weeks', 1)
+            program = build_program(
+                st.session_state.days_data,
+                st.session_state.form_data.get('fitness_level', ''),
+                num_weeks,
+                st.session_state.form_data.get('weight'),
+                st.session_state.form_data.get('session_duration', st.session_state.form_data.get('duration_per_session'))
+            ) if num_weeks > 1 else None
+            json_content = create_workout_json_output(
+                st.session_state.form_data,
+                st.session_state.days_data,
+                program
+            )
+            st.download_button(
+                label="⬇️ Download JSON File",
+                data=json_content,
+                file_name=filename,
+                mime="application/json",
+                use_container_width=True,
+                key="download_json_btn"
+            )
+
+def display_plan_edit(generator):
+    """Free-text change to the current plan, applied as a patch to the touched exercises instead of regenerating"""
+    with st.form("plan_edit_form", clear_on_submit=True):
+        instruction = st.text_input(
+            "✨ Adjust Your Plan",
+            max_chars=EDIT_MAX_INSTRUCTION_CHARS,
+            placeholder="e.g. Swap lunges for something knee-friendly"
+        )
+        submitted = st.form_submit_button("Apply Change", use_container_width=True)
+    
+    if submitted and instruction.strip():
+        try:
+            start_time = time.perf_counter()
+            with st.spinner("Updating your plan..."):
+                days_data, summary = generator.edit_workout_plan(
+                    st.session_state.form_data, st.session_state.days_data, instruction
+                )
+            st.session_state.days_data = days_data
+            st.session_state.last_edit = {
+                'instruction': instruction.strip(),
+                'touched': len(summary['touched']),
+                'seconds': time.perf_counter() - start_time,
+            }
+            st.rerun()
+        except Exception as e:
+            st.error(f"❌ Could not apply the change: {str(e)}")
+    
+    last_edit = st.session_state.get('last_edit')
+    if last_edit:
+        st.caption(f"Last change: \"{last_edit['instruction']}\" · {last_edit['touched']} exercises updated "
+                   f"in {last_edit['seconds']:.1f}s")
+
+def display_results(generator):
     """Display the generated workout plan with edit functionality and format options"""
     st.markdown("""
     <div class="results-header">
@@ -539,52 +783,10 @@ def display_results():
     """, unsafe_allow_html=True)
     
     # Action buttons with dropdown for download format
-    timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-    
     col1, col2, col3 = st.columns([1, 1, 1])
     
     with col1:
-        # Download dropdown with format selection
-        download_format = st.selectbox(
-            "📥 Download Plan",
-            options=[
-                "Select Format", 
-                "Text (.txt)", 
-                "JSON (.json)"
-            ],
-            key="download_format_select"
-        )
-        
-        if download_format != "Select Format" and 'days_data' in st.session_state and 'form_data' in st.session_state:
-            if download_format == "Text (.txt)":
-                filename = f"workout_plan_{timestamp}.txt"
-                text_content = create_text_format(
-                    st.session_state.days_data, 
-                    st.session_state.form_data
-                )
-                st.download_button(
-                    label="⬇️ Download Text File",
-                    data=text_content,
-                    file_name=filename,
-                    mime="text/plain",
-                    use_container_width=True,
-                    key="download_text_btn"
-                )
-            
-            elif download_format == "JSON (.json)":
-                filename = f"workout_plan_{timestamp}.json"
-                json_content = create_workout_json_output(
-                    st.session_state.form_data,
-                    st.session_state.days_data
-                )
-                st.download_button(
-                    label="⬇️ Download JSON File",
-                    data=json_content,
-                    file_name=filename,
-                    mime="application/json",
-                    use_container_width=True,
-                    key="download_json_btn"
-                )
+        display_download_controls()
     
     with col2:
         if st.button("✏️ Edit Profile", use_container_width=True):
@@ -594,7 +796,8 @@ def display_results():
     with col3:
         if st.button("🆕 New Plan", use_container_width=True):
             # Clear session state
-            for key in ['form_data', 'workout_plan', 'days_data', 'generation_time']:
+            for key in ['form_data', 'workout_plan', 'days_data', 'generation_time', 'selected_day', 'selected_week',
+                        'last_edit']:
                 if key in st.session_state:
                     del st.session_state[key]
             st.session_state.page = 'form'
@@ -622,7 +825,8 @@ def display_results():
     
     # Display workout plan
     if ('days_data' in st.session_state and st.session_state.days_data):
-        display_professional_workout_plan(st.session_state.days_data)    
+        display_program_week(st.session_state.days_data, st.session_state.get('form_data', {}))
+        display_plan_edit(generator)
         # Weekly Calorie Summary
         total_weekly_calories = sum(
             sum(ex.get('calories_burned', 0) for ex in day['exercises'])
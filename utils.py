@@ -2,13 +2,19 @@ import re
 import json
 import streamlit as st
 from datetime import datetime
-from typing import Dict, List
-from config import GPT4O_INPUT_COST_PER_MILLION, GPT4O_OUTPUT_COST_PER_MILLION, EXERCISE_MET_VALUES
+from functools import lru_cache
+from typing import Dict, List, Optional
+from config import DEFAULT_MODEL, MODEL_REGISTRY, EXERCISE_MET_VALUES
 
-def calculate_token_costs(input_tokens: int, output_tokens: int) -> Dict[str, float]:
-    """Calculate costs for GPT-4o token usage"""
-    input_cost = (input_tokens / 1_000_000) * GPT4O_INPUT_COST_PER_MILLION
-    output_cost = (output_tokens / 1_000_000) * GPT4O_OUTPUT_COST_PER_MILLION
+NUMBER_PATTERN = re.compile(r'\d+')
+# Reps given as a work time, like '30 seconds', '45s' or '5 min'
+TIMED_REPS_PATTERN = re.compile(r'sec|min|\d+\s*s\b', re.IGNORECASE)
+
+def calculate_token_costs(input_tokens: int, output_tokens: int, model: str = DEFAULT_MODEL) -> Dict[str, float]:
+    """Calculate costs for token usage with the given model's pricing"""
+    pricing = MODEL_REGISTRY.get(model, MODEL_REGISTRY[DEFAULT_MODEL])
+    input_cost = (input_tokens / 1_000_000) * pricing['input_cost_per_million']
+    output_cost = (output_tokens / 1_000_000) * pricing['output_cost_per_million']
     total_cost = input_cost + output_cost
     
     return {
@@ -24,10 +30,13 @@ def initialize_session_usage():
             'total_input_tokens': 0,
             'total_output_tokens': 0,
             'total_requests': 0,
+            'total_input_cost': 0.0,
+            'total_output_cost': 0.0,
             'requests': []
         }
 
-def update_session_usage(input_tokens: int, output_tokens: int, request_type: str = "Workout Generation"):
+def update_session_usage(input_tokens: int, output_tokens: int, request_type: str = "Workout Generation",
+                         model: str = DEFAULT_MODEL):
     """Update session token usage tracking"""
     initialize_session_usage()
     
@@ -36,11 +45,16 @@ def update_session_usage(input_tokens: int, output_tokens: int, request_type: st
     st.session_state.session_usage['total_output_tokens'] += output_tokens
     st.session_state.session_usage['total_requests'] += 1
     
+    # Price each request with the model that served it
+    costs = calculate_token_costs(input_tokens, output_tokens, model)
+    st.session_state.session_usage['total_input_cost'] += costs['input_cost']
+    st.session_state.session_usage['total_output_cost'] += costs['output_cost']
+    
     # Add individual request
-    costs = calculate_token_costs(input_tokens, output_tokens)
     st.session_state.session_usage['requests'].append({
         'timestamp': datetime.now().strftime('%Y-%m-%d %H:%M:%S'),
         'type': request_type,
+        'model': model,
         'input_tokens': input_tokens,
         'output_tokens': output_tokens,
         'total_tokens': input_tokens + output_tokens,
@@ -49,14 +63,8 @@ def update_session_usage(input_tokens: int, output_tokens: int, request_type: st
         'total_cost': costs['total_cost']
     })
     
-def create_workout_json_output(form_data: Dict, days_data: List[Dict]) -> str:
-    """Create comprehensive JSON output for workout plan"""
-    
-    # Calculate weekly stats
-    total_exercises = sum(len(day['exercises']) for day in days_data)
-    total_duration = sum(day.get('workout_duration', 0) for day in days_data)
-    
-    # Process days data
+def format_json_days(days_data: List[Dict]) -> List[Dict]:
+    """Days in the shape of the JSON download"""
     processed_days = []
     for day_data in days_data:
         day_exercises = []
@@ -87,6 +95,15 @@ def create_workout_json_output(form_data: Dict, days_data: List[Dict]) -> str:
             "total_exercises": len(day_exercises),
             "exercises": day_exercises
         })
+    return processed_days
+
+def create_workout_json_output(form_data: Dict, days_data: List[Dict],
+                               program: Optional[List[Dict]] = None) -> str:
+    """Create comprehensive JSON output for workout plan, with every week of a multi-week program if given"""
+    
+    # Calculate weekly stats
+    total_exercises = sum(len(day['exercises']) for day in days_data)
+    total_duration = sum(day.get('workout_duration', 0) for day in days_data)
     
     # Create the complete JSON structure
     workout_json = {
@@ -109,7 +126,7 @@ def create_workout_json_output(form_data: Dict, days_data: List[Dict]) -> str:
                 "exercises_to_avoid": form_data.get('exercises_to_avoid', ''),
                 "additional_notes": form_data.get('additional_notes', '')
             },
-            "days": processed_days,
+            "days": format_json_days(days_data),
             "weekly_summary": {
                 "total_workout_days": len(days_data),
                 "total_exercises": total_exercises,
@@ -124,6 +141,11 @@ def create_workout_json_output(form_data: Dict, days_data: List[Dict]) -> str:
             }
         }
     }
+    if program:
+        workout_json["workout_plan"]["program"] = [
+            {"week": week['week'], "phase": week['phase'], "days": format_json_days(week['days'])}
+            for week in program
+        ]
     
     return json.dumps(workout_json, indent=2, ensure_ascii=False)
 
@@ -214,25 +236,9 @@ def create_text_format(days_data: List[Dict], user_data: Dict) -> str:
     
     return "\n".join(text_content)
 
-def calculate_calories_burned(exercise_name: str, weight_kg: float, duration_minutes: float, 
-                             exercise_type: str = "") -> float:
-    """
-    Calculate calories burned for an exercise using MET values.
-    
-    Formula: Calories = METs x 3.5 x Weight(kg) / 200 x Duration(minutes)
-    
-    Args:
-        exercise_name: Name of the exercise
-        weight_kg: User's weight in kilograms
-        duration_minutes: Duration of exercise in minutes
-        exercise_type: Type of exercise (optional, helps with classification)
-    
-    Returns:
-        Estimated calories burned (rounded to 1 decimal)
-    """
-    if not weight_kg or weight_kg <= 0:
-        return 0.0
-    
+@lru_cache(maxsize=1024)
+def get_met_value(exercise_name: str, exercise_type: str = "") -> float:
+    """Look up the MET value for an exercise, cached since plans repeat exercise names"""
     # Convert exercise name to lowercase for matching
     exercise_lower = exercise_name.lower()
     
@@ -257,45 +263,81 @@ def calculate_calories_burned(exercise_name: str, weight_kg: float, duration_min
         elif "cool" in exercise_type_lower or "flexibility" in exercise_type_lower:
             met_value = 2.5
     
+    return met_value
+
+def calculate_calories_burned(exercise_name: str, weight_kg: float, duration_minutes: float, 
+                             exercise_type: str = "") -> float:
+    """
+    Calculate calories burned for an exercise using MET values.
+    
+    Formula: Calories = METs x 3.5 x Weight(kg) / 200 x Duration(minutes)
+    
+    Args:
+        exercise_name: Name of the exercise
+        weight_kg: User's weight in kilograms
+        duration_minutes: Duration of exercise in minutes
+        exercise_type: Type of exercise (optional, helps with classification)
+    
+    Returns:
+        Estimated calories burned (rounded to 1 decimal)
+    """
+    if not weight_kg or weight_kg <= 0:
+        return 0.0
+    
+    met_value = get_met_value(exercise_name, exercise_type)
+    
     # Calculate calories: METs x 3.5 x Weight(kg) / 200 x Duration(minutes)
     calories = met_value * 3.5 * weight_kg / 200 * duration_minutes
     
     return round(calories, 1)
 
 
+def parse_work_seconds(reps) -> Optional[float]:
+    """Work time of one set for timed reps like '30 seconds', '30-45s' or '5 min', None for rep counts"""
+    reps_str = str(reps).lower()
+    if not TIMED_REPS_PATTERN.search(reps_str):
+        return None
+    parts = NUMBER_PATTERN.findall(reps_str)
+    if not parts:
+        return None
+    value = sum(int(part) for part in parts) / len(parts) if '-' in reps_str else float(parts[0])
+    return value * 60 if 'min' in reps_str else value
+
 def estimate_exercise_duration(total_sets: int, reps: str, rest_time: str) -> float:
     """
     Estimate exercise duration in minutes based on sets, reps, and rest time.
     
     Args:
         total_sets: Number of sets
-        reps: Rep count (can be a number or range like "10-12")
+        reps: Rep count (can be a number or range like "10-12") or a work time ("30 seconds", "5 min")
         rest_time: Rest time between sets (e.g., "60s", "2min")
     
     Returns:
         Estimated duration in minutes
     """
+    work_seconds = parse_work_seconds(reps)
     # Parse reps - take average if it's a range
     try:
+        rep_parts = NUMBER_PATTERN.findall(str(reps))
         if '-' in str(reps):
-            rep_parts = re.findall(r'\d+', str(reps))
             avg_reps = sum(int(r) for r in rep_parts) / len(rep_parts) if rep_parts else 10
         else:
-            avg_reps = float(re.findall(r'\d+', str(reps))[0]) if re.findall(r'\d+', str(reps)) else 10
+            avg_reps = float(rep_parts[0]) if rep_parts else 10
     except:
         avg_reps = 10
     
-    # Estimate time per rep (3 seconds average)
-    time_per_set = (avg_reps * 3) / 60  # Convert to minutes
+    # Timed sets last their work time, counted sets about 3 seconds per rep
+    time_per_set = (work_seconds if work_seconds is not None else avg_reps * 3) / 60  # Convert to minutes
     
     # Parse rest time
     rest_minutes = 0
     try:
         rest_str = str(rest_time).lower()
+        rest_match = NUMBER_PATTERN.search(rest_str)
         if 'min' in rest_str:
-            rest_minutes = float(re.findall(r'\d+', rest_str)[0]) if re.findall(r'\d+', rest_str) else 1
+            rest_minutes = float(rest_match.group()) if rest_match else 1
         elif 's' in rest_str:
-            rest_seconds = float(re.findall(r'\d+', rest_str)[0]) if re.findall(r'\d+', rest_str) else 60
+            rest_seconds = float(rest_match.group()) if rest_match else 60
             rest_minutes = rest_seconds / 60
         else:
             rest_minutes = 1  # Default 1 minute
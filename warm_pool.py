@@ -0,0 +1,184 @@
+"""
+Off-peak pre-generation of plans for the most requested base combinations.
+
+A base combination is fitness level x goal x training days x session duration for a
+profile with no equipment, target area, preference or limitation constraints. Demand
+is counted per combination on every request; during off-peak hours the hottest
+combinations without a warm plan are generated under a token budget. Matching
+requests are then served from the pool with calories recomputed for their weight.
+
+Run once from cron with: python warm_pool.py [--force] [--budget TOKENS]
+"""
+import sys
+import time
+import argparse
+import threading
+from datetime import datetime
+from typing import Dict, List, Optional, Tuple
+from plan_parser import personalize_calories
+from event_log import log_event, request_context
+from token_budget import track_usage
+from shared_state import (
+    record_demand, get_demand, get_warm_plan, store_warm_plan, claim_warm_pool_run, release_warm_pool_run
+)
+from config import (
+    WARM_POOL_OFF_PEAK_HOURS, WARM_POOL_TOKEN_BUDGET, WARM_POOL_MAX_PLANS, WARM_POOL_MIN_REQUESTS,
+    WARM_POOL_CHECK_INTERVAL, WARM_POOL_BASE_PROFILE
+)
+
+# Profile fields that must be empty for a request to be served from the warm pool
+CONSTRAINT_FIELDS = ['target_areas', 'available_equipment', 'workout_preferences',
+                     'health_limitations', 'exercises_to_avoid', 'additional_notes']
+
+
+def combination_id(user_data: Dict) -> str:
+    """Base combination of a profile, e.g. 'Beginner|Weight Loss|3|45'"""
+    training_days = user_data.get('training_days_per_week', user_data.get('weekly_frequency'))
+    session_duration = user_data.get('session_duration', user_data.get('duration_per_session'))
+    return f"{user_data['fitness_level']}|{user_data['goal']}|{training_days}|{session_duration}"
+
+
+def is_base_profile(user_data: Dict) -> bool:
+    """Whether the profile adds nothing to its base combination beyond body measurements"""
+    return not any(user_data.get(field) for field in CONSTRAINT_FIELDS)
+
+
+def base_profile(combination: str) -> Dict:
+    """Form data for generating a combination's warm plan"""
+    fitness_level, goal, training_days, session_duration = combination.split('|')
+    profile = dict(WARM_POOL_BASE_PROFILE)
+    profile.update({
+        'fitness_level': fitness_level,
+        'goal': goal,
+        'training_days_per_week': int(training_days),
+        'session_duration': int(session_duration),
+        'weekly_frequency': int(training_days),
+        'duration_per_session': int(session_duration),
+        'generation_mode': 'detailed',
+    })
+    for field in CONSTRAINT_FIELDS:
+        profile[field] = '' if field in ('health_limitations', 'exercises_to_avoid', 'additional_notes') else []
+    return profile
+
+
+def track_request(user_data: Dict):
+    """Count demand for base profiles, the only ones the warm pool can serve"""
+    if is_base_profile(user_data):
+        record_demand(combination_id(user_data))
+
+
+def find_warm_plan(user_data: Dict) -> Optional[Tuple[str, List[Dict]]]:
+    """Serve a matching pre-generated plan, personalized with the requester's weight"""
+    if not is_base_profile(user_data):
+        return None
+    warm = get_warm_plan(combination_id(user_data))
+    if warm is None:
+        return None
+    return warm['workout_plan'], personalize_calories(warm['days'], user_data.get('weight'))
+
+
+def hottest_combinations(limit: int = WARM_POOL_MAX_PLANS,
+                         min_requests: int = WARM_POOL_MIN_REQUESTS) -> List[Tuple[str, float]]:
+    """Most requested combinations without a warm plan, hottest first"""
+    demand = sorted(get_demand().items(), key=lambda item: item[1], reverse=True)
+    return [
+        (combination, count) for combination, count in demand
+        if count >= min_requests and get_warm_plan(combination) is None
+    ][:limit]
+
+
+def is_off_peak(now: Optional[datetime] = None) -> bool:
+    start_hour, end_hour = WARM_POOL_OFF_PEAK_HOURS
+    return start_hour <= (now or datetime.now()).hour < end_hour
+
+
+def fill_warm_pool(generator, token_budget: int = WARM_POOL_TOKEN_BUDGET,
+                   limit: int = WARM_POOL_MAX_PLANS) -> Dict:
+    """
+    Generate warm plans for the hottest combinations until the token budget is spent.
+
+    Args:
+        generator: WorkoutPlanGenerator used for the model calls
+        token_budget: Maximum input + output tokens to spend in this run
+        limit: Maximum number of plans to generate
+
+    Returns:
+        Summary with the combinations warmed, failed and tokens used
+    """
+    summary = {'warmed': [], 'failed': [], 'tokens_used': 0}
+    if not claim_warm_pool_run():
+        return summary
+
+    try:
+        for combination, _ in hottest_combinations(limit):
+            profile = base_profile(combination)
+            # Stop before a plan whose predicted prompt and output would overrun the budget
+            if summary['tokens_used'] + generator.estimate_plan_tokens(profile) > token_budget:
+                break
+
+            try:
+                with track_usage() as usage, request_context(profile):
+                    workout_plan_json = generator.generate_workout_plan(profile)
+                    days_data = generator.prepare_workout_plan(workout_plan_json, profile)
+            except Exception as e:
+                summary['failed'].append((combination, str(e)))
+                continue
+            finally:
+                summary['tokens_used'] += usage['input_tokens'] + usage['output_tokens']
+
+            if len(days_data) == profile['weekly_frequency']:
+                store_warm_plan(combination, workout_plan_json, days_data)
+                summary['warmed'].append(combination)
+            else:
+                summary['failed'].append((combination, f"only {len(days_data)} days generated"))
+    finally:
+        release_warm_pool_run()
+    return summary
+
+
+class WarmPoolScheduler(threading.Thread):
+    """Background thread that fills the warm pool once per off-peak window"""
+
+    def __init__(self, generator, check_interval: int = WARM_POOL_CHECK_INTERVAL):
+        super().__init__(name="warm-pool", daemon=True)
+        self.generator = generator
+        self.check_interval = check_interval
+        self.last_run_date = None
+        self._stop_event = threading.Event()
+
+    def run(self):
+        while not self._stop_event.is_set():
+            now = datetime.now()
+            if is_off_peak(now) and self.last_run_date != now.date():
+                self.last_run_date = now.date()
+                summary = fill_warm_pool(self.generator)
+                log_event('warm_pool_run', warmed=len(summary['warmed']), failed=len(summary['failed']),
+                          tokens_used=summary['tokens_used'])
+            self._stop_event.wait(self.check_interval)
+
+    def stop(self):
+        self._stop_event.set()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Pre-generate plans for the most requested combinations")
+    parser.add_argument("--force", action="store_true", help="Run even outside off-peak hours")
+    parser.add_argument("--budget", type=int, default=WARM_POOL_TOKEN_BUDGET, help="Token budget for this run")
+    parser.add_argument("--limit", type=int, default=WARM_POOL_MAX_PLANS, help="Maximum plans to generate")
+    args = parser.parse_args()
+
+    if not args.force and not is_off_peak():
+        print("Not in off-peak hours, use --force to run anyway", file=sys.stderr)
+        return
+
+    from models import WorkoutPlanGenerator
+    start_time = time.perf_counter()
+    summary = fill_warm_pool(WorkoutPlanGenerator(), args.budget, args.limit)
+    print(f"Warmed {len(summary['warmed'])} combinations with {summary['tokens_used']} tokens "
+          f"in {time.perf_counter() - start_time:.1f}s")
+    for combination, error in summary['failed']:
+        print(f"  failed {combination}: {error}")
+
+
+if __name__ == "__main__":
+    main()